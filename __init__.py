@@ -1,13 +1,71 @@
 # Copyright Wuguyannian All Rights Reserved.
 
-import bpy
 import sys
 import importlib
 
-from . import properties, operators
-from .settings import tool_tips
-from .functions import scene, templates, utilities
-from .ui import view_3d, addon_preferences, exporter
+try:
+    import bpy
+except ImportError:
+    # the conversion kernel runs in worker processes without blender, which import this package but not the addon
+    bpy = None
+
+if bpy is not None:
+    # the submodules were just imported on the first enable, so they are only reloaded when the addon itself is
+    # reloaded. The modules only the conversion and the template tools need are imported the first time an operator
+    # or the panel uses them, so only the ones that were imported by then are reloaded, in dependency order.
+    if 'module_names' in locals():
+        for module_name in module_names:
+            module = sys.modules.get('{}.{}'.format(__name__, module_name))
+            if module:
+                importlib.reload(module)
+
+    from . import properties, operators
+    from .functions import handlers, profiling, utilities
+    from .ui import view_3d, addon_preferences
+
+    module_names = (
+        'functions.lazy',
+        'functions.profiling',
+        'settings.tool_tips',
+        'functions.packages',
+        'functions.kernel',
+        'functions.utilities',
+        'functions.adapter',
+        'functions.conversion_cache',
+        'functions.repository',
+        'functions.templates',
+        'functions.meshes',
+        'functions.history',
+        'functions.animation',
+        'functions.scene',
+        'functions.compatibility',
+        'functions.matching',
+        'functions.handlers',
+        'ui.exporter',
+        'ui.view_3d',
+        'ui.addon_preferences',
+        'operators',
+        'properties'
+    )
+
+    classes = (
+        operators.RemoveTemplateFolder,
+        operators.ConvertToEpicSkeleton,
+        operators.ConvertSelectedSkeletons,
+        operators.RestoreSkeleton,
+        operators.ScanTemplateCompatibility,
+        operators.GenerateTemplate,
+        operators.UseTemplate,
+        operators.CompareConversionTimings,
+        operators.DumpProfile,
+        operators.ClearProfile,
+        operators.ClearConversionCache,
+        operators.RefreshTemplateRepository,
+        operators.ExportSkeletonTemplate,
+        operators.ImportSkeletonTemplate,
+        addon_preferences.UESkeletonAddonPreferences,
+        view_3d.UE_SKELETON_PT_Panel
+    )
 
 
 bl_info = {
@@ -22,52 +80,24 @@ bl_info = {
 }
 
 
-modules = (
-    scene,
-    view_3d,
-    exporter,
-    tool_tips,
-    utilities,
-    operators,
-    templates,
-    properties,
-    addon_preferences
-)
-
-classes = (
-    operators.RemoveTemplateFolder,
-    operators.ConvertToEpicSkeleton,
-    operators.ExportSkeletonTemplate,
-    operators.ImportSkeletonTemplate,
-    addon_preferences.UESkeletonAddonPreferences,
-    view_3d.UE_SKELETON_PT_Panel
-)
-
-
 def register():
     """
     This function registers the addon classes when the addon is enabled.
     """
-    # add an index in the system path that will be swapped during the tools use to load metarigs
-    sys.path.insert(0, '')
-
-    # reload submodules
-    for module in modules:
-        importlib.reload(module)
-
     properties.register()
 
     for cls in classes:
         bpy.utils.register_class(cls)
 
+    handlers.register()
+    profiling.set_enabled(utilities.get_addon_preferences().enable_profiling)
+
 
 def unregister():
     """
     This function unregisters the addon classes when the addon is disabled.
     """
-
-     # remove the added system path
-    sys.path.pop(0)
+    handlers.unregister()
 
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
@@ -0,0 +1,252 @@
+# Copyright Wuguyannian All Rights Reserved.
+"""
+Command line entry point for converting skeletons without the user interface.
+
+Convert every armature named like 'SK_*' in a library of blend files with four background workers:
+
+    blender -b --python ueskeleton/cli.py -- convert characters/ --armature "SK_*" --template ueskeleton --workers 4 --output-dir converted/
+
+The input can be a directory, which is searched recursively for blend files, or a manifest file that lists one
+blend file per line.
+
+Export the converted characters of the same library to unreal ready fbx files, skipping the ones that did not change
+since the last export:
+
+    blender -b --python ueskeleton/cli.py -- export converted/ --armature "SK_*" --workers 4 --output-dir fbx/
+
+Write the index of a shared template repository folder after its templates changed, so it can also be served over
+http, for example with python -m http.server:
+
+    blender -b --python ueskeleton/cli.py -- repository-index //studio/share/skeleton_templates
+
+Benchmark the conversion of synthetic armatures and fail if any case got more than 25% slower than a baseline:
+
+    blender -b --factory-startup --python ueskeleton/cli.py -- benchmark --output results.json --baseline baseline.json --threshold 0.25
+"""
+
+import os
+import sys
+import json
+import argparse
+import importlib
+
+
+def get_addon_module(module_name):
+    """
+    This function imports a submodule of the addon package this script lives in.
+
+    :param str module_name: The dotted name of the submodule inside the addon package.
+    :return object: The imported module.
+    """
+    addon_path = os.path.dirname(os.path.abspath(__file__))
+    if os.path.dirname(addon_path) not in sys.path:
+        sys.path.insert(0, os.path.dirname(addon_path))
+
+    return importlib.import_module('{}.{}'.format(os.path.basename(addon_path), module_name))
+
+
+def register_properties():
+    """
+    This function registers the property groups of the addon in a background worker. Workers run with factory
+    settings and import the addon modules without enabling the addon, but the conversions are recorded in the
+    scene properties, which are saved with the converted file.
+    """
+    bpy = importlib.import_module('bpy')
+    if not hasattr(bpy.types.Scene, 'ueskeleton'):
+        get_addon_module('properties').register()
+
+
+def get_arguments():
+    """
+    This function parses the arguments that were passed after the -- separator of the Blender command line.
+
+    :return object: The parsed arguments.
+    """
+    arguments = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+
+    parser = argparse.ArgumentParser(prog='blender -b --python cli.py --')
+    commands = parser.add_subparsers(dest='command')
+
+    convert = commands.add_parser('convert', help='convert the armatures of many blend files')
+    convert.add_argument('input', help='a directory of blend files or a manifest file listing blend files')
+    convert.add_argument('--armature', default='*', help='a fnmatch pattern that selects the armatures to convert')
+    convert.add_argument('--template', required=True, help='the name of the skeleton template')
+    convert.add_argument('--templates-path', help='the skeleton templates directory')
+    convert.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='the number of Blender processes')
+    convert.add_argument('--output-dir', help='save the converted files to this directory')
+    convert.add_argument('--in-place', action='store_true', help='overwrite the source files')
+    convert.add_argument('--rebake-animation', action='store_true', help='re-bake the actions to the converted rest pose')
+    convert.add_argument('--cache-size', type=int, default=64, help='the conversion cache size in megabytes, 0 turns it off')
+    convert.add_argument('--blender', help='the Blender executable used for the workers')
+    convert.add_argument('--timeout', type=float, help='the number of seconds after which a worker is killed')
+    convert.add_argument('--report', help='write the summary report to this json file')
+
+    export = commands.add_parser('export', help='export the armatures of many blend files to fbx files')
+    export.add_argument('input', help='a directory of blend files or a manifest file listing blend files')
+    export.add_argument('--armature', default='*', help='a fnmatch pattern that selects the armatures to export')
+    export.add_argument('--output-dir', required=True, help='write the fbx files and the export manifest to this directory')
+    export.add_argument('--template', help='convert the armatures with this skeleton template before the export')
+    export.add_argument('--templates-path', help='the skeleton templates directory')
+    export.add_argument('--animation', action='store_true', help='export the actions as well')
+    export.add_argument('--force', action='store_true', help='export every character, even the unchanged ones')
+    export.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='the number of Blender processes')
+    export.add_argument('--cache-size', type=int, default=64, help='the conversion cache size in megabytes, 0 turns it off')
+    export.add_argument('--blender', help='the Blender executable used for the workers')
+    export.add_argument('--timeout', type=float, help='the number of seconds after which a worker is killed')
+    export.add_argument('--report', help='write the summary report to this json file')
+
+    repository_index = commands.add_parser('repository-index', help='write the index of a template repository folder')
+    repository_index.add_argument('repository', help='the template repository folder')
+
+    benchmark = commands.add_parser('benchmark', help='time the conversion of synthetic armatures')
+    benchmark.add_argument('--bone-counts', type=int, nargs='+', help='the bone counts of the synthetic armatures')
+    benchmark.add_argument('--repeats', type=int, default=3, help='how many times every case is timed')
+    benchmark.add_argument('--seed', type=int, default=0, help='the seed of the synthetic data')
+    benchmark.add_argument('--output', help='write the results to this json file')
+    benchmark.add_argument('--baseline', help='compare the results with this earlier results file')
+    benchmark.add_argument('--threshold', type=float, default=0.25, help='how much slower a case may get')
+
+    worker = commands.add_parser('worker', help='convert the blend file Blender was opened with')
+    worker.add_argument('--armature', default='*')
+    worker.add_argument('--template-path', required=True)
+    worker.add_argument('--output')
+    worker.add_argument('--rebake-animation', action='store_true')
+    worker.add_argument('--cache-size', type=int, default=0)
+
+    export_worker = commands.add_parser('export-worker', help='export the blend file Blender was opened with')
+    export_worker.add_argument('--armature', default='*')
+    export_worker.add_argument('--output-dir', required=True)
+    export_worker.add_argument('--hashes', default='{}')
+    export_worker.add_argument('--template-path')
+    export_worker.add_argument('--animation', action='store_true')
+    export_worker.add_argument('--cache-size', type=int, default=0)
+
+    return parser.parse_args(arguments)
+
+
+def run_benchmark(arguments):
+    """
+    This function runs the benchmark suite and exits with an error code if a case regressed.
+
+    :param object arguments: The parsed benchmark command line arguments.
+    """
+    benchmark = get_addon_module('functions.benchmark')
+
+    # the panel cases read the panel state from the window manager properties
+    register_properties()
+    report = benchmark.run_benchmarks(
+        bone_counts=tuple(arguments.bone_counts or benchmark.DEFAULT_BONE_COUNTS),
+        repeats=arguments.repeats,
+        seed=arguments.seed
+    )
+
+    regressions = []
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            regressions = benchmark.find_regressions(report, json.load(baseline_file), arguments.threshold)
+        report['regressions'] = regressions
+
+    print(benchmark.format_report(report, regressions))
+
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(report, output_file, indent=4)
+
+    if regressions:
+        sys.exit(1)
+
+
+def run_export(arguments):
+    """
+    This function exports the characters of many blend files to fbx files and exits with an error code if any
+    blend file failed.
+
+    :param object arguments: The parsed export command line arguments.
+    """
+    fbx_export = get_addon_module('functions.fbx_export')
+    batch = get_addon_module('functions.batch')
+
+    report = fbx_export.export_blend_files(
+        input_path=arguments.input,
+        armature_selector=arguments.armature,
+        output_folder=arguments.output_dir,
+        workers=arguments.workers,
+        script_path=os.path.abspath(__file__),
+        template_name=arguments.template,
+        templates_path=arguments.templates_path,
+        include_animation=arguments.animation,
+        cache_size=arguments.cache_size,
+        blender_path=arguments.blender,
+        timeout=arguments.timeout,
+        force=arguments.force
+    )
+    print(batch.format_report(report, 'exported'))
+
+    if arguments.report:
+        with open(arguments.report, 'w') as report_file:
+            json.dump(report, report_file, indent=4)
+
+    if report['failed']:
+        sys.exit(1)
+
+
+def main():
+    """
+    This function runs the command that was given on the command line.
+    """
+    arguments = get_arguments()
+    batch = get_addon_module('functions.batch')
+
+    if arguments.command == 'worker':
+        register_properties()
+        batch.run_worker(arguments)
+        return
+
+    if arguments.command == 'export-worker':
+        register_properties()
+        get_addon_module('functions.fbx_export').run_export_worker(arguments)
+        return
+
+    if arguments.command == 'benchmark':
+        run_benchmark(arguments)
+        return
+
+    if arguments.command == 'repository-index':
+        index = get_addon_module('functions.repository').write_repository_index(arguments.repository)
+        print('Indexed {} templates in {}'.format(len(index['templates']), arguments.repository))
+        return
+
+    if arguments.command == 'export':
+        run_export(arguments)
+        return
+
+    if arguments.command != 'convert':
+        print('Expected a command, run with -- --help for the usage.')
+        sys.exit(2)
+
+    report = batch.convert_blend_files(
+        input_path=arguments.input,
+        armature_selector=arguments.armature,
+        template_name=arguments.template,
+        workers=arguments.workers,
+        script_path=os.path.abspath(__file__),
+        templates_path=arguments.templates_path,
+        output_folder=arguments.output_dir,
+        in_place=arguments.in_place,
+        rebake_animation=arguments.rebake_animation,
+        cache_size=arguments.cache_size,
+        blender_path=arguments.blender,
+        timeout=arguments.timeout
+    )
+    print(batch.format_report(report))
+
+    if arguments.report:
+        with open(arguments.report, 'w') as report_file:
+            json.dump(report, report_file, indent=4)
+
+    if report['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+# Copyright Wuguyannian All Rights Reserved.
+"""
+The thin layer between blender and the conversion kernel. It turns compiled templates into kernel plans of plain
+values, reads the rest data of armatures into arrays and writes converted arrays back to edit bones.
+"""
+
+from . import lazy
+from . import kernel
+
+numpy = lazy.import_module('numpy')
+
+# the settings a created bone copies from its source bone, with the type and size of their values
+COPIED_BONE_PROPERTIES = (
+    ('layers', 'bool', 32),
+    ('use_deform', 'bool', 1),
+    ('use_inherit_rotation', 'bool', 1),
+    ('use_local_location', 'bool', 1),
+    ('bbone_segments', 'int32', 1),
+    ('bbone_easein', 'float32', 1),
+    ('bbone_easeout', 'float32', 1)
+)
+
+
+# -------------- functions that turn compiled templates into kernel plans --------------
+def get_kernel_orientations(orientations):
+    """
+    This function turns compiled orientation rules into plain tuples.
+
+    :param tuple orientations: The compiled orientation rules.
+    :return tuple: Tuples of the bone name, axis index, angle in radians, recursive depth and the roll to add.
+    """
+    return tuple(
+        (rule.name, rule.axis, rule.angle, rule.recursive, rule.roll_add)
+        for rule in orientations
+    )
+
+
+def get_kernel_creations(creations):
+    """
+    This function turns compiled creation rules into plain tuples, with arrays in place of the mathutils vectors and
+    matrices, so they can be sent to worker processes that have no mathutils.
+
+    :param tuple creations: The compiled creation rules.
+    :return tuple: Tuples of the bone name, source bone, parent bone, parent root flag, head, tail, matrix, end
+    bone, fraction and length.
+    """
+    def get_array(value):
+        return None if value is None else numpy.array(value, dtype=numpy.float64)
+
+    return tuple(
+        (
+            rule.name,
+            rule.source_bone,
+            rule.parent_bone,
+            rule.parent_root,
+            get_array(rule.head),
+            get_array(rule.tail),
+            get_array(rule.matrix),
+            rule.end_bone,
+            rule.fraction,
+            rule.length
+        )
+        for rule in creations
+    )
+
+
+def get_kernel_plan(plan):
+    """
+    This function turns a compiled template into the plan the conversion kernel applies. The rename rules are left
+    out, since they only change names and run on the blender data.
+
+    :param CompiledTemplate plan: The compiled template.
+    :return KernelPlan: The orientation and creation rules with plain values.
+    """
+    return kernel.KernelPlan(
+        orientations=get_kernel_orientations(plan.orientations),
+        creations=get_kernel_creations(plan.creations)
+    )
+
+
+# -------------- functions that read and write the blender data --------------
+def read_bone_arrays(obj):
+    """
+    This function reads the rest data of an armature object into arrays without entering edit mode. The rolls are
+    worked out from the rest matrices of the bones, the same way blender does when it enters edit mode.
+
+    :param object obj: The armature object.
+    :return BoneArrays: The bone names, heads, tails, rolls, parent indices and connected flags.
+    """
+    bones = obj.data.bones
+    names = [bone.name for bone in bones]
+    name_indices = {name: index for index, name in enumerate(names)}
+    count = len(names)
+
+    heads = numpy.empty(count * 3, dtype=numpy.float32)
+    tails = numpy.empty(count * 3, dtype=numpy.float32)
+    matrices = numpy.empty(count * 16, dtype=numpy.float32)
+    connected = numpy.empty(count, dtype=bool)
+    bones.foreach_get('head_local', heads)
+    bones.foreach_get('tail_local', tails)
+    bones.foreach_get('matrix_local', matrices)
+    bones.foreach_get('use_connect', connected)
+
+    # the matrices are read column by column
+    matrices = matrices.reshape(count, 4, 4).transpose(0, 2, 1)
+
+    return kernel.BoneArrays(
+        names=names,
+        heads=heads.reshape(count, 3).astype(numpy.float64),
+        tails=tails.reshape(count, 3).astype(numpy.float64),
+        rolls=kernel.mat3_to_vec_roll(matrices[:, :3, :3])[1],
+        parents=numpy.array([name_indices[bone.parent.name] if bone.parent else -1 for bone in bones], dtype=numpy.int64),
+        connected=connected
+    )
+
+
+def copy_bone_properties(edit_bones, positions, target_positions, source_positions):
+    """
+    This function copies the settings of source bones to target bones with one bulk read and one bulk write per
+    setting. Enum settings can not be accessed in bulk, so they are copied bone by bone.
+
+    :param object edit_bones: The edit bones collection of the armature.
+    :param dict positions: The position of every edit bone in the collection, by bone name.
+    :param list target_positions: The collection positions of the bones that copy the settings.
+    :param list source_positions: The collection positions of the bones the settings are copied from.
+    """
+    if not target_positions:
+        return
+
+    count = len(positions)
+    for name, dtype, size in COPIED_BONE_PROPERTIES:
+        values = numpy.empty(count * size, dtype=dtype)
+        try:
+            edit_bones.foreach_get(name, values)
+        except AttributeError:
+            # bone layers were replaced by bone collections in blender 4.0
+            continue
+
+        values = values.reshape(count, size)
+        values[target_positions] = values[source_positions]
+        edit_bones.foreach_set(name, values.ravel())
+
+    for target_position, source_position in zip(target_positions, source_positions):
+        edit_bones[target_position].inherit_scale = edit_bones[source_position].inherit_scale
+
+
+def write_bone_arrays(edit_bones, bone_arrays, creations):
+    """
+    This function writes converted bone arrays to edit bones. The bones of the creation rules are created and get
+    the parent the kernel worked out, then the settings of their source bones, the connected flags and the heads,
+    tails and rolls of every bone are written with bulk access. It must be called while the armature is in edit
+    mode.
+
+    :param object edit_bones: The edit bones collection of the armature that is being converted.
+    :param BoneArrays bone_arrays: The converted rest data of every edit bone, with the created bones at the end.
+    :param tuple creations: The compiled creation rules the created bones were made from.
+    :return list: The names of the created bones, which blender may have changed to keep them unique.
+    """
+    count = len(bone_arrays.names) - len(creations)
+    bones = {bone.name: bone for bone in edit_bones}
+    indexed_bones = [bones[name] for name in bone_arrays.names[:count]]
+    indexed_bones += [edit_bones.new(creation.name) for creation in creations]
+
+    # parents are pointers, which can only be set bone by bone
+    for bone, parent in zip(indexed_bones[count:], bone_arrays.parents[count:]):
+        bone.parent = indexed_bones[parent] if parent >= 0 else None
+
+    # the collection order can differ from the array order, so every edit bone looks up its row
+    positions = {bone.name: position for position, bone in enumerate(edit_bones)}
+    indices = {bone.name: index for index, bone in enumerate(indexed_bones)}
+    order = [indices[bone.name] for bone in edit_bones]
+
+    # the settings are copied in bulk, so a source bone that is created as well is followed back to the bone it
+    # copied, since its own settings are still the defaults of a new bone when they are read
+    name_indices = {name: index for index, name in enumerate(bone_arrays.names)}
+    sources = {}
+    copies = []
+    for index, (bone, creation) in enumerate(zip(indexed_bones[count:], creations), count):
+        source = name_indices[creation.source_bone] if creation.source_bone else None
+        if source is not None and source >= count:
+            source = sources.get(source)
+        sources[index] = source
+        if source is not None:
+            copies.append((positions[bone.name], positions[indexed_bones[source].name]))
+    copy_bone_properties(edit_bones, positions, [copy[0] for copy in copies], [copy[1] for copy in copies])
+
+    edit_bones.foreach_set('use_connect', bone_arrays.connected[order].astype(bool))
+    edit_bones.foreach_set('head', bone_arrays.heads[order].astype(numpy.float32).ravel())
+    edit_bones.foreach_set('tail', bone_arrays.tails[order].astype(numpy.float32).ravel())
+    edit_bones.foreach_set('roll', bone_arrays.rolls[order].astype(numpy.float32))
+    return [bone.name for bone in indexed_bones[count:]]
+
+
+def precompute_conversions(objects, plan, max_workers=None):
+    """
+    This function converts the rest data of many armature objects without changing them, in a pool of worker
+    processes. The results can be written with write_bone_arrays once the armatures are in edit mode.
+
+    :param list objects: The armature objects.
+    :param CompiledTemplate plan: The compiled template.
+    :param int max_workers: The number of worker processes, None for one per cpu and 1 to convert in this process.
+    :return dict: The converted rest data by armature object name.
+    """
+    kernel_plan = get_kernel_plan(plan)
+    bone_arrays_list = [read_bone_arrays(obj) for obj in objects]
+    converted = kernel.convert_many(bone_arrays_list, [kernel_plan] * len(bone_arrays_list), max_workers)
+    return {obj.name: bone_arrays for obj, bone_arrays in zip(objects, converted)}
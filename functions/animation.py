@@ -0,0 +1,258 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import re
+
+from . import lazy
+from . import kernel
+from . import profiling
+
+numpy = lazy.import_module('numpy')
+
+BONE_CHANNEL_PATTERN = re.compile(r'^pose\.bones\["((?:[^"\\]|\\.)*)"\]\.(location|rotation_quaternion|rotation_euler|scale)$')
+CHANNEL_DEFAULTS = {
+    'location': (0.0, 0.0, 0.0),
+    'rotation_quaternion': (1.0, 0.0, 0.0, 0.0),
+    'rotation_euler': (0.0, 0.0, 0.0),
+    'scale': (1.0, 1.0, 1.0)
+}
+
+
+# -------------- functions that re-bake the actions of a converted armature --------------
+def get_bone_curves(action, bone_names):
+    """
+    This function gets the transform f-curves of the given bones in an action.
+
+    :param object action: The action.
+    :param set bone_names: The names of the bones to get the f-curves of.
+    :return dict: The f-curves by bone name, then by property name, then by array index.
+    """
+    bone_curves = {}
+    for fcurve in action.fcurves:
+        match = BONE_CHANNEL_PATTERN.match(fcurve.data_path)
+        if not match:
+            continue
+
+        bone_name = match.group(1).replace('\\"', '"').replace('\\\\', '\\')
+        if bone_name in bone_names:
+            bone_curves.setdefault(bone_name, {}).setdefault(match.group(2), {})[fcurve.array_index] = fcurve
+    return bone_curves
+
+
+def get_armature_actions(obj):
+    """
+    This function gets the actions of the given armature object, which are its active action and the actions of
+    its nla strips, that animate at least one of its bones. Actions of other armatures that only share bone names
+    with it are left out.
+
+    :param object obj: The armature object.
+    :return list: The actions, in the order the object uses them.
+    """
+    animation_data = obj.animation_data
+    if not animation_data:
+        return []
+
+    candidates = [animation_data.action]
+    for track in animation_data.nla_tracks:
+        candidates.extend(strip.action for strip in track.strips)
+
+    bone_names = set(obj.data.bones.keys())
+    actions = []
+    for action in candidates:
+        if action and action not in actions and get_bone_curves(action, bone_names):
+            actions.append(action)
+    return actions
+
+
+def get_keyframes(fcurve):
+    """
+    This function reads the frames and values of all the keyframes of an f-curve with bulk access.
+
+    :param object fcurve: The f-curve.
+    :return tuple: The frames and the values.
+    """
+    co = numpy.empty(len(fcurve.keyframe_points) * 2, dtype=numpy.float32)
+    fcurve.keyframe_points.foreach_get('co', co)
+    return co[0::2].astype(numpy.float64), co[1::2].astype(numpy.float64)
+
+
+def read_channel(curves, property_name, frames):
+    """
+    This function gets the values of a transform property at the given frames. F-curves that are keyed on exactly
+    these frames are read in bulk, others are evaluated, and missing f-curves give the default value.
+
+    :param dict curves: The f-curves of the bone by property name and array index.
+    :param str property_name: The name of the transform property.
+    :param numpy.ndarray frames: The frames with the shape (n,).
+    :return numpy.ndarray: The values with the shape (n, size of the property).
+    """
+    defaults = CHANNEL_DEFAULTS[property_name]
+    values = numpy.tile(numpy.array(defaults, dtype=numpy.float64), (len(frames), 1))
+
+    for index, fcurve in curves.get(property_name, {}).items():
+        if index >= len(defaults):
+            continue
+
+        key_frames, key_values = get_keyframes(fcurve)
+        if len(key_frames) == len(frames) and numpy.allclose(key_frames, frames):
+            values[:, index] = key_values
+        else:
+            values[:, index] = [fcurve.evaluate(frame) for frame in frames]
+    return values
+
+
+def write_channel(action, curves, bone_name, property_name, frames, values):
+    """
+    This function writes the values of a transform property at the given frames. F-curves that are keyed on exactly
+    these frames keep their keys and handles, which are moved with the values. Other f-curves are rebuilt, and
+    missing f-curves are only created when the values differ from the default.
+
+    :param object action: The action.
+    :param dict curves: The f-curves of the bone by property name and array index.
+    :param str bone_name: The bone name.
+    :param str property_name: The name of the transform property.
+    :param numpy.ndarray frames: The frames with the shape (n,).
+    :param numpy.ndarray values: The values with the shape (n, size of the property).
+    """
+    data_path = 'pose.bones["{}"].{}'.format(bone_name.replace('\\', '\\\\').replace('"', '\\"'), property_name)
+    property_curves = curves.get(property_name, {})
+
+    for index, default in enumerate(CHANNEL_DEFAULTS[property_name]):
+        fcurve = property_curves.get(index)
+        channel_values = values[:, index]
+
+        co = numpy.empty(len(frames) * 2, dtype=numpy.float32)
+        co[0::2] = frames
+        co[1::2] = channel_values
+
+        if fcurve is None:
+            if numpy.allclose(channel_values, default, atol=1e-6):
+                continue
+            fcurve = action.fcurves.new(data_path, index=index, action_group=bone_name)
+        else:
+            key_frames, key_values = get_keyframes(fcurve)
+            if len(key_frames) == len(frames) and numpy.allclose(key_frames, frames):
+                offsets = (channel_values - key_values).astype(numpy.float32)
+                for handle_name in ('handle_left', 'handle_right'):
+                    handles = numpy.empty(len(frames) * 2, dtype=numpy.float32)
+                    fcurve.keyframe_points.foreach_get(handle_name, handles)
+                    handles[1::2] += offsets
+                    fcurve.keyframe_points.foreach_set(handle_name, handles)
+
+                fcurve.keyframe_points.foreach_set('co', co)
+                fcurve.update()
+                continue
+
+            # the keys are not on the shared frames, so the f-curve is rebuilt on them
+            group_name = fcurve.group.name if fcurve.group else bone_name
+            action.fcurves.remove(fcurve)
+            fcurve = action.fcurves.new(data_path, index=index, action_group=group_name)
+
+        fcurve.keyframe_points.add(len(frames))
+        fcurve.keyframe_points.foreach_set('co', co)
+        fcurve.update()
+
+
+def rebake_action(action, deltas, rotation_modes):
+    """
+    This function rewrites the transform f-curves of an action so every bone deforms the same way on the converted
+    rest pose as it did on the original rest pose.
+
+    :param object action: The action.
+    :param dict deltas: The rotation and translation delta of every bone whose rest pose changed, by bone name.
+    :param dict rotation_modes: The rotation mode of every pose bone, by bone name.
+    :return list: The names of the bones that were skipped because their rotation mode is not supported.
+    """
+    skipped_bone_names = []
+    for bone_name, curves in get_bone_curves(action, set(deltas)).items():
+        rotation_mode = rotation_modes.get(bone_name, 'QUATERNION')
+        if rotation_mode == 'AXIS_ANGLE':
+            skipped_bone_names.append(bone_name)
+            continue
+
+        rotation_name = 'rotation_quaternion' if rotation_mode == 'QUATERNION' else 'rotation_euler'
+        frames = numpy.unique(numpy.concatenate([
+            get_keyframes(fcurve)[0]
+            for property_name in ('location', rotation_name, 'scale')
+            for fcurve in curves.get(property_name, {}).values()
+        ] or [numpy.empty(0)]))
+        if not frames.size:
+            continue
+
+        rotation_delta, translation_delta = deltas[bone_name]
+        locations = read_channel(curves, 'location', frames)
+        rotations = read_channel(curves, rotation_name, frames)
+        scales = read_channel(curves, 'scale', frames)
+
+        if rotation_mode == 'QUATERNION':
+            rotation_matrices = kernel.quaternion_to_matrix(rotations)
+        else:
+            rotation_matrices = kernel.euler_to_matrix(rotations, rotation_mode)
+
+        new_locations, new_rotation_matrices = kernel.rebake_transforms(
+            rotation_delta, translation_delta, locations, rotation_matrices, scales
+        )
+
+        if rotation_mode == 'QUATERNION':
+            # conjugating the quaternions directly keeps the signs the animator keyed
+            delta_quaternion = kernel.matrix_to_quaternion(rotation_delta[None])[0]
+            inverse_delta_quaternion = delta_quaternion * numpy.array([1.0, -1.0, -1.0, -1.0])
+            new_rotations = kernel.quaternion_multiply(
+                kernel.quaternion_multiply(inverse_delta_quaternion, kernel.normalize(rotations)),
+                delta_quaternion
+            )
+        else:
+            new_rotations = kernel.matrix_to_euler(new_rotation_matrices, rotation_mode)
+
+        write_channel(action, curves, bone_name, 'location', frames, new_locations)
+        write_channel(action, curves, bone_name, rotation_name, frames, new_rotations)
+
+    return skipped_bone_names
+
+
+def get_rest_pose_deltas(original, converted):
+    """
+    This function gets the rest pose delta of every bone that moved between two sets of bone arrays.
+
+    :param BoneArrays original: The bone arrays before the conversion.
+    :param BoneArrays converted: The bone arrays after the conversion.
+    :return dict: The rotation and translation delta of every bone that moved, by bone name.
+    """
+    rotation_deltas, translation_deltas = kernel.get_rest_deltas(original, converted)
+    deltas = {}
+    for index, name in enumerate(original.names):
+        if not kernel.is_identity_delta(rotation_deltas[index], translation_deltas[index]):
+            deltas[name] = (rotation_deltas[index], translation_deltas[index])
+    return deltas
+
+
+def rebake_actions(obj, original, converted, rebaked_actions=None):
+    """
+    This function re-bakes every action of an armature object after its rest pose was converted. The rest pose
+    delta of every bone is computed once, then the actions are processed one at a time so memory stays flat.
+    Bone scale is kept as it is, which is exact for uniform scale.
+
+    :param object obj: The converted armature object.
+    :param BoneArrays original: The bone arrays before the conversion.
+    :param BoneArrays converted: The bone arrays after the conversion.
+    :param set rebaked_actions: The names of the actions that were already re-baked in the same batch, so an action
+    shared by several armatures is only re-baked once. The re-baked actions are added to it.
+    :return dict: The number of re-baked actions and the bones that were skipped.
+    """
+    deltas = get_rest_pose_deltas(original, converted)
+    summary = {'actions': 0, 'skipped_bones': []}
+    if not deltas:
+        return summary
+
+    rotation_modes = {pose_bone.name: pose_bone.rotation_mode for pose_bone in obj.pose.bones}
+    for action in get_armature_actions(obj):
+        if rebaked_actions is not None:
+            if action.name in rebaked_actions:
+                continue
+            rebaked_actions.add(action.name)
+
+        with profiling.record('rebake', action.name):
+            skipped_bone_names = rebake_action(action, deltas, rotation_modes)
+        summary['actions'] += 1
+        summary['skipped_bones'].extend(name for name in skipped_bone_names if name not in summary['skipped_bones'])
+
+    return summary
@@ -0,0 +1,264 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import os
+import sys
+import bpy
+import json
+import time
+import fnmatch
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from . import scene
+from . import templates
+
+RESULT_PREFIX = 'UESKELETON_RESULT '
+
+
+# -------------- functions that run inside a background worker --------------
+def get_addon_templates_path():
+    """
+    This function returns the skeleton templates directory that ships next to this module, which is used when
+    the addon is run from the command line instead of from the user's addons folder.
+
+    :return str: The full path to the skeleton templates directory.
+    """
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'resources', 'skeleton_templates')
+
+
+def select_armatures(armature_selector):
+    """
+    This function gets all the armature objects in the open file whose name matches the selector.
+
+    :param str armature_selector: A fnmatch style pattern, for example 'Armature' or 'SK_*'.
+    :return list: The matching armature objects sorted by name.
+    """
+    return sorted(
+        [obj for obj in bpy.data.objects if obj.type == 'ARMATURE' and fnmatch.fnmatchcase(obj.name, armature_selector)],
+        key=lambda obj: obj.name
+    )
+
+
+def convert_open_file(armature_selector, template_folder_path, output_path=None, rebake_animation=False, cache_size=None):
+    """
+    This function converts every matching armature in the open blend file and optionally saves the result.
+
+    :param str armature_selector: A fnmatch style pattern that selects the armatures to convert.
+    :param str template_folder_path: The full path to the template folder.
+    :param str output_path: Where to save the converted file. The file is not saved if this is not provided.
+    :param bool rebake_animation: Whether the actions of the armatures are re-baked to the converted rest pose.
+    :param int cache_size: The size limit of the conversion cache in bytes, or None to convert without the cache.
+    :return dict: The names of the converted armatures.
+    """
+    if not os.path.isdir(template_folder_path):
+        raise FileNotFoundError('The template folder "{}" does not exist'.format(template_folder_path))
+
+    armatures = select_armatures(armature_selector)
+    if not armatures:
+        raise LookupError('No armature matches "{}"'.format(armature_selector))
+
+    plan = templates.get_compiled_template(template_folder_path)
+    template_name = os.path.basename(os.path.normpath(template_folder_path))
+    for obj in armatures:
+        scene.convert_armature(obj, plan, rebake_animation, cache_size, template_name)
+
+    if output_path:
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        bpy.ops.wm.save_as_mainfile(filepath=output_path)
+
+    return {'armatures': [obj.name for obj in armatures]}
+
+
+def run_worker(arguments):
+    """
+    This function is the entry point of a background worker. It converts the blend file Blender was started with
+    and prints a single result line that the parent process collects.
+
+    :param object arguments: The parsed worker command line arguments.
+    """
+    result = {'file': bpy.data.filepath, 'status': 'FAILED'}
+    try:
+        result.update(convert_open_file(
+            arguments.armature,
+            arguments.template_path,
+            arguments.output,
+            arguments.rebake_animation,
+            arguments.cache_size * 1024 * 1024 if arguments.cache_size else None
+        ))
+        result['status'] = 'FINISHED'
+    except Exception as error:
+        result['error'] = '{}: {}'.format(type(error).__name__, error)
+
+    print(RESULT_PREFIX + json.dumps(result))
+    sys.stdout.flush()
+
+
+# -------------- functions that fan the work out over background workers --------------
+def get_blend_files(input_path):
+    """
+    This function gets the blend files to convert from a directory or from a manifest file that lists one blend
+    file per line. Relative manifest entries are resolved against the manifest's folder and lines starting with #
+    are ignored.
+
+    :param str input_path: The full path to a directory or a manifest file.
+    :return list: The full paths to the blend files.
+    """
+    if os.path.isdir(input_path):
+        blend_files = []
+        for root, directories, file_names in os.walk(input_path):
+            directories.sort()
+            for file_name in sorted(file_names):
+                if file_name.endswith('.blend'):
+                    blend_files.append(os.path.join(root, file_name))
+        return blend_files
+
+    manifest_folder = os.path.dirname(os.path.abspath(input_path))
+    blend_files = []
+    with open(input_path) as manifest_file:
+        for line in manifest_file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                blend_files.append(os.path.normpath(os.path.join(manifest_folder, line)))
+    return blend_files
+
+
+def get_output_path(blend_file, input_path, output_folder):
+    """
+    This function gets where a converted blend file is saved, mirroring the input folder structure in the output
+    folder.
+
+    :param str blend_file: The full path to the source blend file.
+    :param str input_path: The directory or manifest file the blend file was collected from.
+    :param str output_folder: The folder the converted files are saved to.
+    :return str: The full path to the converted blend file.
+    """
+    input_folder = input_path if os.path.isdir(input_path) else os.path.dirname(os.path.abspath(input_path))
+    relative_path = os.path.relpath(blend_file, input_folder)
+    if relative_path.startswith(os.pardir):
+        relative_path = os.path.basename(blend_file)
+    return os.path.join(output_folder, relative_path)
+
+
+def run_job(job, blender_path, timeout):
+    """
+    This function runs one job in a background Blender process and collects its result line.
+
+    :param dict job: The blend file to open and the command line arguments for the worker.
+    :param str blender_path: The full path to the Blender executable.
+    :param float timeout: The number of seconds after which the worker is killed.
+    :return dict: The worker result with the wall time of the job.
+    """
+    command = [
+        blender_path, '--background', '--factory-startup', job['file'],
+        '--python', job['script'], '--'
+    ] + job['arguments']
+
+    result = {'file': job['file'], 'status': 'FAILED'}
+    start = time.perf_counter()
+    try:
+        completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout, universal_newlines=True)
+        for line in completed.stdout.splitlines():
+            if line.startswith(RESULT_PREFIX):
+                result.update(json.loads(line[len(RESULT_PREFIX):]))
+                result['file'] = job['file']
+        if 'error' not in result and result['status'] != 'FINISHED':
+            result['error'] = 'The worker exited with code {} without a result'.format(completed.returncode)
+            result['log'] = completed.stdout[-2000:]
+    except subprocess.TimeoutExpired:
+        result['error'] = 'The worker timed out after {} seconds'.format(timeout)
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_jobs(jobs, workers, blender_path=None, timeout=None):
+    """
+    This function runs jobs across a pool of background Blender processes.
+
+    :param list jobs: The jobs to run.
+    :param int workers: The number of Blender processes that run at the same time.
+    :param str blender_path: The full path to the Blender executable. Defaults to the running Blender.
+    :param float timeout: The number of seconds after which a worker is killed.
+    :return dict: A summary report with the per file results, failures and throughput.
+    """
+    blender_path = blender_path or bpy.app.binary_path
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(lambda job: run_job(job, blender_path, timeout), jobs))
+    wall_seconds = time.perf_counter() - start
+
+    failed = [result for result in results if result['status'] != 'FINISHED']
+    return {
+        'files': len(results),
+        'succeeded': len(results) - len(failed),
+        'failed': len(failed),
+        'workers': workers,
+        'wall_seconds': wall_seconds,
+        'files_per_second': len(results) / wall_seconds if wall_seconds > 0 else 0.0,
+        'results': results,
+        'failures': [{'file': result['file'], 'error': result.get('error', '')} for result in failed]
+    }
+
+
+def convert_blend_files(input_path, armature_selector, template_name, workers, script_path, templates_path=None,
+                        output_folder=None, in_place=False, rebake_animation=False, cache_size=0, blender_path=None,
+                        timeout=None):
+    """
+    This function converts the armatures of many blend files across a pool of background Blender processes.
+
+    :param str input_path: A directory of blend files or a manifest file listing blend files.
+    :param str armature_selector: A fnmatch style pattern that selects the armatures to convert.
+    :param str template_name: The name of the skeleton template folder.
+    :param int workers: The number of Blender processes that run at the same time.
+    :param str script_path: The command line script the workers are started with.
+    :param str templates_path: The skeleton templates directory. Defaults to the one next to this module.
+    :param str output_folder: The folder converted files are saved to.
+    :param bool in_place: Whether converted files overwrite their source files.
+    :param bool rebake_animation: Whether the actions of the armatures are re-baked to the converted rest pose.
+    :param int cache_size: The size limit of the conversion cache the workers share in megabytes, 0 turns it off.
+    :param str blender_path: The full path to the Blender executable. Defaults to the running Blender.
+    :param float timeout: The number of seconds after which a worker is killed.
+    :return dict: A summary report with the per file results, failures and throughput.
+    """
+    template_path = os.path.join(templates_path or get_addon_templates_path(), template_name)
+
+    jobs = []
+    for blend_file in get_blend_files(input_path):
+        arguments = ['worker', '--armature', armature_selector, '--template-path', template_path]
+        if output_folder:
+            arguments += ['--output', get_output_path(blend_file, input_path, output_folder)]
+        elif in_place:
+            arguments += ['--output', blend_file]
+        if rebake_animation:
+            arguments.append('--rebake-animation')
+        if cache_size:
+            arguments += ['--cache-size', str(cache_size)]
+
+        jobs.append({'file': blend_file, 'script': script_path, 'arguments': arguments})
+
+    return run_jobs(jobs, workers, blender_path, timeout)
+
+
+def format_report(report, verb='converted'):
+    """
+    This function formats a summary report as human readable text.
+
+    :param dict report: The summary report returned by run_jobs.
+    :param str verb: What the workers did with the files, for the summary line.
+    :return str: The report text.
+    """
+    lines = []
+    for result in report['results']:
+        lines.append('{status:<9} {seconds:8.2f}s  {file}'.format(
+            status=result['status'],
+            seconds=result['seconds'],
+            file=result['file']
+        ))
+        if 'error' in result:
+            lines.append('          {}'.format(result['error']))
+
+    lines.append('')
+    lines.append('{succeeded}/{files} files {verb}, {skipped} unchanged, {failed} failed, {wall_seconds:.2f}s wall time, '
+                 '{files_per_second:.2f} files/s with {workers} workers'.format(verb=verb, **dict({'skipped': 0}, **report)))
+    return '\n'.join(lines)
@@ -0,0 +1,437 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import os
+import sys
+import bpy
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+import statistics
+import subprocess
+from types import SimpleNamespace
+
+from . import scene
+from . import kernel
+from . import adapter
+from . import handlers
+from . import templates
+from . import utilities
+
+DEFAULT_BONE_COUNTS = (100, 1000, 5000, 10000)
+CHAIN_LENGTH = 5
+KERNEL_ARMATURE_COUNT = 16
+PANEL_OBJECT_COUNT = 5000
+PANEL_UPDATE_COUNT = 100
+
+# enables the addon in a fresh blender and prints how long the import and register took
+REGISTER_SCRIPT = '''
+import sys, time, addon_utils
+sys.path.insert(0, {addon_directory!r})
+start = time.perf_counter()
+addon_utils.enable({addon_name!r}, default_set=True)
+print('register_seconds', time.perf_counter() - start)
+'''
+
+
+# -------------- functions that create the synthetic benchmark data --------------
+def create_synthetic_armature(bone_count, seed=0):
+    """
+    This function creates an armature object with chains of connected bones that branch off random earlier bones.
+    The same bone count and seed always create the same armature.
+
+    :param int bone_count: The number of bones.
+    :param int seed: The seed of the random generator.
+    :return object: The armature object.
+    """
+    generator = random.Random(seed)
+    name = 'benchmark_{}'.format(bone_count)
+    obj = bpy.data.objects.new(name, bpy.data.armatures.new(name))
+    bpy.context.scene.collection.objects.link(obj)
+
+    with utilities.edit_session(obj) as edit_bones:
+        bones = []
+        for index in range(bone_count):
+            bone = edit_bones.new('bone_{:05d}'.format(index))
+            if index == 0:
+                bone.head = (0.0, 0.0, 0.0)
+            elif index % CHAIN_LENGTH:
+                # continue the chain
+                bone.head = bones[-1].tail
+                bone.parent = bones[-1]
+                bone.use_connect = True
+            else:
+                # start a new chain on a random earlier bone
+                parent = bones[generator.randrange(len(bones))]
+                bone.head = parent.tail
+                bone.parent = parent
+
+            direction = [generator.uniform(-1.0, 1.0) for _ in range(3)]
+            bone.tail = [head + offset * 0.1 for head, offset in zip(bone.head, direction)]
+            bone.roll = generator.uniform(-3.0, 3.0)
+            bones.append(bone)
+
+    return obj
+
+
+def create_synthetic_template(template_folder_path, bone_count, seed=0):
+    """
+    This function writes an orientation and a creation template that match the synthetic armature with the same
+    bone count. Every 20th bone gets an orientation rule and every 100th bone gets an ik bone.
+
+    :param str template_folder_path: The full path to the template folder to create.
+    :param int bone_count: The number of bones of the matching synthetic armature.
+    :param int seed: The seed of the random generator.
+    """
+    generator = random.Random(seed)
+    os.makedirs(template_folder_path, exist_ok=True)
+
+    orientation_data = []
+    for index in range(0, bone_count, 20):
+        orientation = {
+            'name': 'bone_{:05d}'.format(index),
+            'axis': templates.AXIS_NAMES[index % 3],
+            'angle': generator.choice([-180.0, -90.0, 90.0, 180.0]),
+            'recursive': generator.randrange(3)
+        }
+        if index % 60 == 0:
+            orientation['roll_add'] = -90.0
+        orientation_data.append(orientation)
+
+    creation_data = [{
+        'name': 'ik_root',
+        'source_bone': 'bone_00000',
+        'head': [0, 0, 0],
+        'tail': [0, 24, 0],
+        'Matrix': [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]
+    }]
+    for index in range(0, bone_count, 100):
+        creation_data.append({
+            'name': 'ik_bone_{:05d}'.format(index),
+            'source_bone': 'bone_{:05d}'.format(index),
+            'parent_bone': 'ik_root'
+        })
+
+    for file_name, data in [('orientation.json', orientation_data), ('creation.json', creation_data)]:
+        with open(os.path.join(template_folder_path, file_name), 'w') as template_file:
+            json.dump(data, template_file, indent=4)
+
+
+# -------------- functions that time the benchmark cases --------------
+def measure(function, repeats, setup=None, teardown=None):
+    """
+    This function times a function several times. The setup and teardown are not timed.
+
+    :param callable function: The function to time. It gets the result of the setup.
+    :param int repeats: How many times the function is timed.
+    :param callable setup: An optional function that runs before every timing.
+    :param callable teardown: An optional function that runs after every timing with the result of the setup.
+    :return dict: The median, minimum and maximum time in seconds.
+    """
+    timings = []
+    for _ in range(repeats):
+        value = setup() if setup else None
+        try:
+            start = time.perf_counter()
+            function(value)
+            timings.append(time.perf_counter() - start)
+        finally:
+            if teardown:
+                teardown(value)
+
+    return get_timing(timings)
+
+
+def get_timing(timings):
+    """
+    This function sums up several timings of the same case.
+
+    :param list timings: The timings in seconds.
+    :return dict: The median, minimum and maximum time in seconds.
+    """
+    return {
+        'seconds': statistics.median(timings),
+        'min': min(timings),
+        'max': max(timings),
+        'repeats': len(timings)
+    }
+
+
+def benchmark_conversion(bone_count, template_folder_path, repeats, seed):
+    """
+    This function times the conversion of a synthetic armature.
+
+    :param int bone_count: The number of bones.
+    :param str template_folder_path: The full path to the matching template folder.
+    :param int repeats: How many times the conversion is timed.
+    :param int seed: The seed of the random generator.
+    :return dict: The timing of the conversion.
+    """
+    source_object = create_synthetic_armature(bone_count, seed)
+    plan = templates.get_compiled_template(template_folder_path)
+    try:
+        return measure(
+            lambda obj: scene.convert_armature(obj, plan),
+            repeats,
+            setup=lambda: utilities.copy_armature_object(source_object),
+            teardown=utilities.remove_armature_object
+        )
+    finally:
+        utilities.remove_armature_object(source_object)
+
+
+def benchmark_kernel(bone_count, template_folder_path, armature_count, repeats, seed):
+    """
+    This function times converting the rest data of many synthetic armatures with the kernel, once in this process
+    and once in a pool of worker processes. The time the pool takes to start is counted.
+
+    :param int bone_count: The number of bones of every armature.
+    :param str template_folder_path: The full path to the matching template folder.
+    :param int armature_count: The number of armatures that are converted together.
+    :param int repeats: How many times the conversions are timed.
+    :param int seed: The seed of the random generator.
+    :return tuple: The timings of the conversions in this process and in the pool.
+    """
+    source_object = create_synthetic_armature(bone_count, seed)
+    try:
+        bone_arrays_list = [adapter.read_bone_arrays(source_object)] * armature_count
+    finally:
+        utilities.remove_armature_object(source_object)
+
+    plans = [adapter.get_kernel_plan(templates.get_compiled_template(template_folder_path))] * armature_count
+    serial = measure(lambda value: kernel.convert_many(bone_arrays_list, plans, max_workers=1), repeats)
+    pool = measure(lambda value: kernel.convert_many(bone_arrays_list, plans), repeats)
+    return serial, pool
+
+
+def benchmark_template_loading(template_folder_path, repeats):
+    """
+    This function times reading and compiling a template, and getting it again from the compiled template cache.
+
+    :param str template_folder_path: The full path to the template folder.
+    :param int repeats: How many times the loading is timed.
+    :return tuple: The timings of a cold and a warm load.
+    """
+    cold = measure(
+        lambda value: templates.get_compiled_template(template_folder_path),
+        repeats,
+        setup=lambda: templates.invalidate_compiled_templates(template_folder_path)
+    )
+    warm = measure(lambda value: templates.get_compiled_template(template_folder_path), repeats)
+    return cold, warm
+
+
+def benchmark_template_enumeration(skeleton_templates_path, repeats):
+    """
+    This function times listing the template folders, and getting the list again from the enumeration cache.
+
+    :param str skeleton_templates_path: The full path to a skeleton templates directory.
+    :param int repeats: How many times the enumeration is timed.
+    :return tuple: The timings of a cold and a warm enumeration.
+    """
+    cold = measure(
+        lambda value: templates.enumerate_skeleton_templates(skeleton_templates_path),
+        repeats,
+        setup=templates.invalidate_template_enumeration
+    )
+    templates.enumerate_skeleton_templates(skeleton_templates_path)
+    warm = measure(lambda value: templates.enumerate_skeleton_templates(skeleton_templates_path), repeats)
+    templates.invalidate_template_enumeration()
+    return cold, warm
+
+
+def benchmark_panel_updates(object_count, update_count, repeats):
+    """
+    This function times what the depsgraph updates of a scene with many objects cost the panel. An update that
+    changes nothing the panel shows, like selecting an object, only runs the handler's checks, while the full
+    refresh of the panel state is what the panel used to run on every redraw.
+
+    :param int object_count: The number of objects in the scene.
+    :param int update_count: The number of updates and refreshes in one timing.
+    :param int repeats: How many times the updates and the refreshes are timed.
+    :return tuple: The timings of the ignored updates and of the refreshes.
+    """
+    scene = bpy.context.scene
+    objects = []
+    for index in range(object_count):
+        obj = bpy.data.objects.new('benchmark_object_{:05d}'.format(index), None)
+        scene.collection.objects.link(obj)
+        objects.append(obj)
+
+    try:
+        handlers.refresh_panel_state()
+
+        # selecting an object updates the scene and the object without moving it
+        depsgraph = SimpleNamespace(updates=[
+            SimpleNamespace(id=SimpleNamespace(original=scene), is_updated_transform=False, is_updated_geometry=False),
+            SimpleNamespace(id=SimpleNamespace(original=objects[0]), is_updated_transform=False, is_updated_geometry=False)
+        ])
+        ignored = measure(
+            lambda value: [handlers.on_depsgraph_update(scene, depsgraph) for _ in range(update_count)],
+            repeats
+        )
+        refreshed = measure(lambda value: [handlers.refresh_panel_state() for _ in range(update_count)], repeats)
+        return ignored, refreshed
+    finally:
+        for obj in objects:
+            bpy.data.objects.remove(obj)
+        utilities.remove_picker_object()
+
+
+def benchmark_register(repeats):
+    """
+    This function times importing and registering the addon in a fresh blender process, which is what enabling the
+    addon costs at startup. Only the time inside blender is counted, not the time blender itself takes to start.
+
+    :param int repeats: How many times the addon is enabled.
+    :return dict: The timing of the import and register.
+    """
+    addon_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = REGISTER_SCRIPT.format(addon_directory=os.path.dirname(addon_path), addon_name=os.path.basename(addon_path))
+
+    timings = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [bpy.app.binary_path, '-b', '--factory-startup', '--python-expr', script],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True
+        ).stdout
+        for line in output.splitlines():
+            if line.startswith('register_seconds '):
+                timings.append(float(line.split()[1]))
+
+    if not timings:
+        raise RuntimeError('the addon could not be enabled in a new blender process')
+    return get_timing(timings)
+
+
+def benchmark_zip(skeleton_templates_path, template_name, repeats):
+    """
+    This function times exporting a template to a zip file and importing it again.
+
+    :param str skeleton_templates_path: The full path to the skeleton templates directory with the template.
+    :param str template_name: The name of the template folder.
+    :param int repeats: How many times the export and import are timed.
+    :return tuple: The timings of the export and the import.
+    """
+    zip_folder = tempfile.mkdtemp(prefix='ueskeleton_zip_')
+    import_folder = tempfile.mkdtemp(prefix='ueskeleton_import_')
+    zip_file_path = os.path.join(zip_folder, template_name + '.zip')
+    try:
+        export_properties = SimpleNamespace(
+            skeleton_templates_path=skeleton_templates_path,
+            selected_export_template=template_name
+        )
+        import_properties = SimpleNamespace(skeleton_templates_path=import_folder)
+
+        export_timing = measure(lambda value: templates.export_zip(zip_file_path, export_properties), repeats)
+        import_timing = measure(
+            lambda value: templates.import_zip(zip_file_path, import_properties),
+            repeats,
+            teardown=lambda value: shutil.rmtree(os.path.join(import_folder, template_name), ignore_errors=True)
+        )
+        return export_timing, import_timing
+    finally:
+        shutil.rmtree(zip_folder, ignore_errors=True)
+        shutil.rmtree(import_folder, ignore_errors=True)
+
+
+def run_benchmarks(bone_counts=DEFAULT_BONE_COUNTS, repeats=3, template_count=300, seed=0):
+    """
+    This function times enabling the addon and runs every other benchmark case on synthetic data in a temporary
+    directory.
+
+    :param tuple bone_counts: The bone counts of the synthetic armatures.
+    :param int repeats: How many times every case is timed.
+    :param int template_count: The number of template folders the enumeration is timed with.
+    :param int seed: The seed of the random generator.
+    :return dict: The environment and the timing of every case.
+    """
+    results = {'register': benchmark_register(repeats)}
+    skeleton_templates_path = tempfile.mkdtemp(prefix='ueskeleton_benchmark_')
+    try:
+        for bone_count in bone_counts:
+            template_name = 'synthetic_{}'.format(bone_count)
+            template_folder_path = os.path.join(skeleton_templates_path, template_name)
+            create_synthetic_template(template_folder_path, bone_count, seed)
+
+            results['convert_{}'.format(bone_count)] = benchmark_conversion(bone_count, template_folder_path, repeats, seed)
+            cold, warm = benchmark_template_loading(template_folder_path, repeats)
+            results['template_load_cold_{}'.format(bone_count)] = cold
+            results['template_load_warm_{}'.format(bone_count)] = warm
+
+        serial, pool = benchmark_kernel(bone_counts[-1], template_folder_path, KERNEL_ARMATURE_COUNT, repeats, seed)
+        results['kernel_serial_{}x{}'.format(KERNEL_ARMATURE_COUNT, bone_counts[-1])] = serial
+        results['kernel_pool_{}x{}'.format(KERNEL_ARMATURE_COUNT, bone_counts[-1])] = pool
+
+        export_timing, import_timing = benchmark_zip(skeleton_templates_path, template_name, repeats)
+        results['zip_export_{}'.format(bone_counts[-1])] = export_timing
+        results['zip_import_{}'.format(bone_counts[-1])] = import_timing
+
+        for index in range(template_count - len(bone_counts)):
+            os.makedirs(os.path.join(skeleton_templates_path, 'empty_{:04d}'.format(index)))
+        cold, warm = benchmark_template_enumeration(skeleton_templates_path, repeats)
+        results['template_enumeration_cold_{}'.format(template_count)] = cold
+        results['template_enumeration_warm_{}'.format(template_count)] = warm
+
+        ignored, refreshed = benchmark_panel_updates(PANEL_OBJECT_COUNT, PANEL_UPDATE_COUNT, repeats)
+        results['panel_update_ignored_{}x{}'.format(PANEL_UPDATE_COUNT, PANEL_OBJECT_COUNT)] = ignored
+        results['panel_refresh_{}x{}'.format(PANEL_UPDATE_COUNT, PANEL_OBJECT_COUNT)] = refreshed
+    finally:
+        templates.invalidate_compiled_templates()
+        shutil.rmtree(skeleton_templates_path, ignore_errors=True)
+
+    return {
+        'blender': bpy.app.version_string,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seed': seed,
+        'results': results
+    }
+
+
+def find_regressions(report, baseline, threshold):
+    """
+    This function compares a benchmark report with a baseline report.
+
+    :param dict report: The benchmark report.
+    :param dict baseline: An earlier benchmark report.
+    :param float threshold: How much slower a case may get, 0.25 allows a case to take 25% longer.
+    :return list: The cases that got slower than the threshold allows.
+    """
+    regressions = []
+    for case, timing in sorted(report['results'].items()):
+        baseline_timing = baseline['results'].get(case)
+        if not baseline_timing:
+            continue
+
+        ratio = timing['seconds'] / baseline_timing['seconds'] if baseline_timing['seconds'] > 0 else 1.0
+        if ratio > 1.0 + threshold:
+            regressions.append({
+                'case': case,
+                'seconds': timing['seconds'],
+                'baseline_seconds': baseline_timing['seconds'],
+                'ratio': ratio
+            })
+    return regressions
+
+
+def format_report(report, regressions=None):
+    """
+    This function formats a benchmark report as human readable text.
+
+    :param dict report: The benchmark report.
+    :param list regressions: The regressions found against a baseline.
+    :return str: The report text.
+    """
+    lines = ['Blender {blender}, Python {python}, {platform}'.format(**report)]
+    for case, timing in sorted(report['results'].items()):
+        lines.append('{:<32} {:10.4f}s  (min {:.4f}s, max {:.4f}s)'.format(case, timing['seconds'], timing['min'], timing['max']))
+
+    for regression in regressions or []:
+        lines.append('REGRESSION {case}: {seconds:.4f}s against {baseline_seconds:.4f}s ({ratio:.2f}x)'.format(**regression))
+    return '\n'.join(lines)
@@ -0,0 +1,263 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import os
+import bpy
+import json
+import time
+
+from . import templates
+from . import profiling
+
+_template_index = {'path': None, 'checked': 0.0, 'templates': {}}
+_library_index = {}
+
+LIBRARY_INDEX_FILE_NAME = 'library_index.json'
+
+
+# -------------- functions that index the bone names the templates need --------------
+def get_required_bone_names(plan):
+    """
+    This function gets the names of the bones a compiled template needs the armature to have. Bones that an earlier
+    creation rule creates and the source bones of rename rules are not needed.
+
+    :param CompiledTemplate plan: The compiled template.
+    :return frozenset: The names of the needed bones.
+    """
+    required_bone_names = {orientation.name for orientation in plan.orientations}
+    created_bone_names = set()
+    for creation in plan.creations:
+        for bone_name in (creation.source_bone, creation.parent_bone, creation.end_bone):
+            if bone_name and bone_name not in created_bone_names:
+                required_bone_names.add(bone_name)
+        created_bone_names.add(creation.name)
+    return frozenset(required_bone_names)
+
+
+def get_template_index(skeleton_templates_path):
+    """
+    This function gets the needed bone names of every template in a skeleton templates directory. The index is
+    rebuilt at most once every TEMPLATE_ENUMERATION_CHECK_INTERVAL seconds, and templates that do not compile are
+    left out.
+
+    :param str skeleton_templates_path: The full path to the skeleton templates directory.
+    :return dict: The needed bone names by template name.
+    """
+    now = time.monotonic()
+    if _template_index['path'] == skeleton_templates_path:
+        if now - _template_index['checked'] < templates.TEMPLATE_ENUMERATION_CHECK_INTERVAL:
+            return _template_index['templates']
+
+    template_index = {}
+    for item in templates.enumerate_skeleton_templates(skeleton_templates_path):
+        template_name = item[0]
+        try:
+            plan = templates.get_compiled_template(os.path.join(skeleton_templates_path, template_name))
+        except (templates.TemplateError, OSError, ValueError):
+            continue
+        template_index[template_name] = get_required_bone_names(plan)
+
+    _template_index['path'] = skeleton_templates_path
+    _template_index['checked'] = now
+    _template_index['templates'] = template_index
+    return template_index
+
+
+def invalidate_template_index():
+    """
+    This function forces the template index to be rebuilt the next time it is requested.
+    """
+    _template_index['path'] = None
+
+
+# -------------- functions that score the templates against armatures --------------
+def score_templates(bone_names, template_index):
+    """
+    This function scores how much of every template an armature covers.
+
+    :param set bone_names: The bone names of the armature.
+    :param dict template_index: The needed bone names by template name.
+    :return list: The template name, the covered fraction and the sorted missing bone names of every template, best
+    first.
+    """
+    bone_names = frozenset(bone_names)
+    scores = []
+    for template_name, required_bone_names in template_index.items():
+        missing_bone_names = required_bone_names - bone_names
+        coverage = 1.0 - len(missing_bone_names) / len(required_bone_names) if required_bone_names else 1.0
+        scores.append((template_name, coverage, sorted(missing_bone_names), len(required_bone_names)))
+
+    # full coverage of a larger template is the better suggestion
+    scores.sort(key=lambda score: (-score[1], -score[3], score[0]))
+    return [(template_name, coverage, missing_bone_names) for template_name, coverage, missing_bone_names, size in scores]
+
+
+def get_scene_armature_index(scene):
+    """
+    This function gets the bone names of every armature object in a scene.
+
+    :param object scene: The scene.
+    :return dict: The bone names by armature object name.
+    """
+    return {
+        obj.name: frozenset(obj.data.bones.keys())
+        for obj in scene.objects
+        if obj.type == 'ARMATURE'
+    }
+
+
+# -------------- functions that index the armatures of blend file libraries --------------
+def get_library_index_path():
+    """
+    This function returns the path of the file the library index is kept in between sessions.
+
+    :return str: The full path to the library index file.
+    """
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'resources', LIBRARY_INDEX_FILE_NAME)
+
+
+def load_library_index():
+    """
+    This function loads the library index from disk into memory, once per session.
+    """
+    if _library_index:
+        return
+
+    try:
+        with open(get_library_index_path()) as index_file:
+            _library_index.update(json.load(index_file))
+    except (OSError, ValueError):
+        pass
+
+
+def save_library_index():
+    """
+    This function writes the library index to disk. An index that can not be written is only kept in memory.
+    """
+    index_path = get_library_index_path()
+    temporary_path = index_path + '.tmp'
+    try:
+        with open(temporary_path, 'w') as index_file:
+            json.dump(_library_index, index_file)
+        os.replace(temporary_path, index_path)
+    except OSError:
+        pass
+
+
+def read_library_armatures(blend_file_path):
+    """
+    This function reads the bone names of every armature in a blend file by linking only the armature data blocks,
+    then removes them again. A file that is already linked into the open file is read without removing anything.
+
+    :param str blend_file_path: The full path to the blend file.
+    :return dict: The bone names by armature name.
+    """
+    def get_library_key(file_path):
+        return os.path.normcase(os.path.abspath(bpy.path.abspath(file_path)))
+
+    is_linked = any(get_library_key(library.filepath) == get_library_key(blend_file_path) for library in bpy.data.libraries)
+
+    with bpy.data.libraries.load(blend_file_path, link=True) as (data_from, data_to):
+        data_to.armatures = list(data_from.armatures)
+
+    linked_armatures = [armature for armature in data_to.armatures if armature is not None]
+    armatures = {armature.name: sorted(armature.bones.keys()) for armature in linked_armatures}
+
+    if linked_armatures and not is_linked:
+        bpy.data.batch_remove(linked_armatures + [linked_armatures[0].library])
+    return armatures
+
+
+def get_library_armature_index(blend_file_paths):
+    """
+    This function gets the bone names of every armature in many blend files. Files are only read again when their
+    modification time or size changed since they were indexed.
+
+    :param list blend_file_paths: The full paths to the blend files.
+    :return dict: The bone names by blend file path and armature name.
+    """
+    load_library_index()
+
+    armature_index = {}
+    is_changed = False
+    for blend_file_path in blend_file_paths:
+        try:
+            stat = os.stat(blend_file_path)
+        except OSError:
+            continue
+
+        signature = [stat.st_mtime_ns, stat.st_size]
+        entry = _library_index.get(blend_file_path)
+        if not entry or entry['signature'] != signature:
+            with profiling.record('file_read', blend_file_path):
+                try:
+                    armatures = read_library_armatures(blend_file_path)
+                except (OSError, RuntimeError):
+                    armatures = {}
+            entry = {'signature': signature, 'armatures': armatures}
+            _library_index[blend_file_path] = entry
+            is_changed = True
+
+        for armature_name, bone_names in entry['armatures'].items():
+            armature_index[(blend_file_path, armature_name)] = frozenset(bone_names)
+
+    if is_changed:
+        save_library_index()
+    return armature_index
+
+
+def get_blend_files(directory):
+    """
+    This function finds every blend file in a directory and its sub directories.
+
+    :param str directory: The full path to the directory.
+    :return list: The full paths to the blend files.
+    """
+    blend_files = []
+    for root, directories, file_names in os.walk(directory):
+        directories.sort()
+        for file_name in sorted(file_names):
+            if file_name.endswith('.blend'):
+                blend_files.append(os.path.join(root, file_name))
+    return blend_files
+
+
+def scan(armature_index, template_index):
+    """
+    This function finds the best template for every armature of an armature index.
+
+    :param dict armature_index: The bone names by armature name.
+    :param dict template_index: The needed bone names by template name.
+    :return list: The armature name, the best template name, its covered fraction and its missing bone names of every
+    armature, worst covered first.
+    """
+    results = []
+    for key, bone_names in armature_index.items():
+        scores = score_templates(bone_names, template_index)
+        if scores:
+            results.append((key,) + scores[0])
+    results.sort(key=lambda result: (result[2], result[0]))
+    return results
+
+
+def scan_armatures(properties, directory=''):
+    """
+    This function finds the best template for every armature in the scene and, if a directory is given, for every
+    armature in the blend files of that directory. The results are kept in the addon's context for the panel.
+
+    :param object properties: The property group that contains variables that maintain the addon's correct state.
+    :param str directory: The full path to a directory of blend files, or an empty string to only scan the scene.
+    :return list: The armature name, the best template name, its covered fraction and its missing bone names of
+    every armature, worst covered first.
+    """
+    template_index = get_template_index(properties.skeleton_templates_path)
+    armature_index = get_scene_armature_index(bpy.context.scene)
+    if directory:
+        for (blend_file_path, armature_name), bone_names in get_library_armature_index(get_blend_files(directory)).items():
+            armature_index['{}: {}'.format(os.path.relpath(blend_file_path, directory), armature_name)] = bone_names
+
+    results = [
+        {'name': name, 'template_name': template_name, 'coverage': coverage, 'missing_bone_names': missing_bone_names}
+        for name, template_name, coverage, missing_bone_names in scan(armature_index, template_index)
+    ]
+    properties.context['compatibility_results'] = results
+    return results
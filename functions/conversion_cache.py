@@ -0,0 +1,157 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import os
+import uuid
+import hashlib
+
+from . import lazy
+from . import profiling
+
+numpy = lazy.import_module('numpy')
+
+CACHE_FILE_EXTENSION = '.npz'
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+
+# -------------- functions that store the solved rest data of converted armatures --------------
+def get_cache_path():
+    """
+    This function returns the conversion cache directory in the addon's resources directory.
+
+    :return str: The full path to the conversion cache directory.
+    """
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'resources', 'conversion_cache')
+
+
+def get_cache_key(bone_arrays, rules_digest):
+    """
+    This function hashes the rest data of an armature together with the digest of the rules that convert it. Armatures
+    with the same bone names, hierarchy, heads, tails and rolls get the same key.
+
+    :param BoneArrays bone_arrays: The rest data of the armature before the conversion.
+    :param str rules_digest: The digest of the rules.
+    :return str: The cache key.
+    """
+    digest = hashlib.sha256()
+    digest.update(rules_digest.encode('utf-8'))
+    digest.update('\0'.join(bone_arrays.names).encode('utf-8'))
+    digest.update(numpy.ascontiguousarray(bone_arrays.parents, dtype=numpy.int64).tobytes())
+    digest.update(numpy.ascontiguousarray(bone_arrays.connected, dtype=numpy.bool_).tobytes())
+
+    # blender stores the rest data as 32 bit floats, so hashing them at that precision keeps the key stable
+    for values in (bone_arrays.heads, bone_arrays.tails, bone_arrays.rolls):
+        digest.update(numpy.ascontiguousarray(values, dtype=numpy.float32).tobytes())
+    return digest.hexdigest()
+
+
+def get_cache_file_path(key, cache_path=None):
+    """
+    This function returns the path of the cache file of a key.
+
+    :param str key: The cache key.
+    :param str cache_path: The full path to the conversion cache directory.
+    :return str: The full path to the cache file.
+    """
+    return os.path.join(cache_path or get_cache_path(), key + CACHE_FILE_EXTENSION)
+
+
+def load(key, bone_count, cache_path=None):
+    """
+    This function loads the converted heads, tails and rolls of a key. A hit marks the file as recently used.
+
+    :param str key: The cache key.
+    :param int bone_count: The number of bones the cached arrays must have.
+    :param str cache_path: The full path to the conversion cache directory.
+    :return tuple: The heads, tails and rolls, or None if the key is not cached.
+    """
+    cache_file_path = get_cache_file_path(key, cache_path)
+    try:
+        with profiling.record('file_read', cache_file_path):
+            with numpy.load(cache_file_path) as cache_file:
+                heads, tails, rolls = cache_file['heads'], cache_file['tails'], cache_file['rolls']
+    except (OSError, KeyError, ValueError):
+        return None
+
+    if heads.shape != (bone_count, 3) or tails.shape != (bone_count, 3) or rolls.shape != (bone_count,):
+        return None
+
+    try:
+        os.utime(cache_file_path)
+    except OSError:
+        pass
+    return heads, tails, rolls
+
+
+def store(key, bone_arrays, cache_path=None, size_limit=DEFAULT_CACHE_SIZE):
+    """
+    This function stores the converted heads, tails and rolls of a key, then evicts the least recently used files
+    until the cache fits its size limit. The file is written under a temporary name and moved into place, so
+    several processes can share the cache.
+
+    :param str key: The cache key.
+    :param BoneArrays bone_arrays: The rest data of the armature after the conversion.
+    :param str cache_path: The full path to the conversion cache directory.
+    :param int size_limit: The largest size of the cache directory in bytes.
+    """
+    cache_path = cache_path or get_cache_path()
+    os.makedirs(cache_path, exist_ok=True)
+
+    cache_file_path = get_cache_file_path(key, cache_path)
+    temporary_file_path = '{}.{}.tmp'.format(cache_file_path, uuid.uuid4().hex)
+    try:
+        with open(temporary_file_path, 'wb') as cache_file:
+            numpy.savez(cache_file, heads=bone_arrays.heads, tails=bone_arrays.tails, rolls=bone_arrays.rolls)
+        os.replace(temporary_file_path, cache_file_path)
+    finally:
+        if os.path.exists(temporary_file_path):
+            os.remove(temporary_file_path)
+
+    evict(cache_path, size_limit)
+
+
+def evict(cache_path=None, size_limit=DEFAULT_CACHE_SIZE, file_extension=CACHE_FILE_EXTENSION):
+    """
+    This function removes the least recently used cache files until the cache fits its size limit.
+
+    :param str cache_path: The full path to the conversion cache directory.
+    :param int size_limit: The largest size of the cache directory in bytes.
+    :param str file_extension: The extension of the cache files.
+    :return int: The number of removed files.
+    """
+    cache_path = cache_path or get_cache_path()
+    entries = []
+    try:
+        with os.scandir(cache_path) as directory_entries:
+            for entry in directory_entries:
+                if entry.name.endswith(file_extension):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return 0
+
+    total_size = sum(size for mtime, size, path in entries)
+    removed_count = 0
+    for mtime, size, path in sorted(entries):
+        if total_size <= size_limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            # another process removed it first
+            pass
+        total_size -= size
+        removed_count += 1
+    return removed_count
+
+
+def clear(cache_path=None):
+    """
+    This function removes every file from the conversion cache.
+
+    :param str cache_path: The full path to the conversion cache directory.
+    :return int: The number of removed files.
+    """
+    return evict(cache_path, size_limit=-1)
@@ -0,0 +1,415 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import os
+import sys
+import bpy
+import json
+import uuid
+import hashlib
+
+from . import lazy
+from . import batch
+from . import scene
+from . import meshes
+from . import animation
+from . import adapter
+from . import packages
+from . import templates
+
+numpy = lazy.import_module('numpy')
+
+EXPORT_MANIFEST_FILE_NAME = 'export_manifest.json'
+EXPORT_VERSION = 1
+
+# the settings unreal expects from a skeletal mesh, the same for every exported character
+FBX_EXPORT_SETTINGS = {
+    'use_selection': True,
+    'object_types': {'ARMATURE', 'MESH'},
+    'global_scale': 1.0,
+    'apply_unit_scale': True,
+    'apply_scale_options': 'FBX_SCALE_NONE',
+    'axis_forward': '-Z',
+    'axis_up': 'Y',
+    'use_mesh_modifiers': True,
+    'mesh_smooth_type': 'FACE',
+    'use_tspace': False,
+    'add_leaf_bones': False,
+    'primary_bone_axis': 'Y',
+    'secondary_bone_axis': 'X',
+    'use_armature_deform_only': True,
+    'armature_nodetype': 'NULL',
+    'bake_anim_use_all_bones': True,
+    'bake_anim_use_nla_strips': True,
+    'bake_anim_use_all_actions': False,
+    'bake_anim_force_startend_keying': True
+}
+
+
+# -------------- functions that hash the source data of a character --------------
+def get_settings_digest(rules_digest=None, include_animation=False):
+    """
+    This function hashes everything besides the source data that changes the exported files, so changing the
+    template or the export settings exports every character again.
+
+    :param str rules_digest: The digest of the template the characters are converted with, or None if they are not.
+    :param bool include_animation: Whether the actions are exported.
+    :return str: The sha256 digest of the settings.
+    """
+    settings = dict(FBX_EXPORT_SETTINGS, object_types=sorted(FBX_EXPORT_SETTINGS['object_types']))
+    text = json.dumps([EXPORT_VERSION, settings, rules_digest, include_animation], sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def update_digest(digest, *values):
+    """
+    This function adds values to a running hash. Arrays are added by their raw bytes and everything else by its
+    text, each one with its length, so the boundaries between values are part of the hash.
+
+    :param object digest: The hashlib object.
+    :param object values: The values to add.
+    """
+    for value in values:
+        data = value.tobytes() if isinstance(value, numpy.ndarray) else str(value).encode('utf-8')
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+
+
+def get_array(collection, attribute, count, dtype):
+    """
+    This function reads an attribute of every item of a collection with bulk access.
+
+    :param object collection: The collection, for example the vertices of a mesh.
+    :param str attribute: The name of the attribute.
+    :param int count: The number of values, which is the number of items times the size of the attribute.
+    :param type dtype: The numpy type of the values.
+    :return numpy.ndarray: The values.
+    """
+    values = numpy.empty(count, dtype=dtype)
+    collection.foreach_get(attribute, values)
+    return values
+
+
+def get_character_hash(obj, mesh_objects, settings_digest, include_animation=False):
+    """
+    This function hashes the source data of a character: the rest pose of the armature, the geometry, uvs,
+    materials and vertex group weights of its meshes and, if they are exported, the keys of the actions of the
+    armature, which are the same actions the fbx exporter writes.
+
+    :param object obj: The armature object.
+    :param list mesh_objects: The mesh objects that are exported with the armature.
+    :param str settings_digest: The digest of the export settings.
+    :param bool include_animation: Whether the actions are exported.
+    :return str: The sha256 digest of the character.
+    """
+    digest = hashlib.sha256()
+    bone_arrays = adapter.read_bone_arrays(obj)
+    update_digest(
+        digest,
+        settings_digest,
+        obj.name,
+        numpy.array(obj.matrix_world, dtype=numpy.float32),
+        '\n'.join(bone_arrays.names),
+        bone_arrays.heads,
+        bone_arrays.tails,
+        bone_arrays.rolls,
+        bone_arrays.parents,
+        bone_arrays.connected
+    )
+
+    deform_bone_names = {bone.name for bone in obj.data.bones if bone.use_deform}
+    for mesh_object in mesh_objects:
+        mesh = mesh_object.data
+        update_digest(
+            digest,
+            mesh_object.name,
+            numpy.array(mesh_object.matrix_world, dtype=numpy.float32),
+            get_array(mesh.vertices, 'co', len(mesh.vertices) * 3, numpy.float32),
+            get_array(mesh.loops, 'vertex_index', len(mesh.loops), numpy.int32),
+            get_array(mesh.polygons, 'loop_total', len(mesh.polygons), numpy.int32),
+            get_array(mesh.polygons, 'material_index', len(mesh.polygons), numpy.int32),
+            [material.name if material else '' for material in mesh.materials],
+            [group.name for group in mesh_object.vertex_groups]
+        )
+        for uv_layer in mesh.uv_layers:
+            update_digest(digest, uv_layer.name, get_array(uv_layer.data, 'uv', len(uv_layer.data) * 2, numpy.float32))
+        # only the weights of the deform bones are exported
+        group_indices = {group.index for group in mesh_object.vertex_groups if group.name in deform_bone_names}
+        update_digest(digest, *meshes.get_vertex_group_weights(mesh, group_indices))
+
+    if include_animation:
+        for action in animation.get_armature_actions(obj):
+            update_digest(digest, action.name)
+            for fcurve in action.fcurves:
+                keyframe_points = fcurve.keyframe_points
+                update_digest(
+                    digest,
+                    fcurve.data_path,
+                    fcurve.array_index,
+                    get_array(keyframe_points, 'co', len(keyframe_points) * 2, numpy.float32),
+                    get_array(keyframe_points, 'interpolation', len(keyframe_points), numpy.int32)
+                )
+
+    return digest.hexdigest()
+
+
+# -------------- functions that run inside a background export worker --------------
+def get_fbx_file_name(obj):
+    """
+    This function gets the file name a character is exported to.
+
+    :param object obj: The armature object.
+    :return str: The file name.
+    """
+    return bpy.path.clean_name(obj.name) + '.fbx'
+
+
+def export_character(obj, mesh_objects, fbx_file_path, include_animation=False):
+    """
+    This function exports an armature and its meshes to an fbx file with the unreal settings. The file is written
+    under a temporary name and moved into place once it is complete.
+
+    :param object obj: The armature object.
+    :param list mesh_objects: The mesh objects that are exported with the armature.
+    :param str fbx_file_path: The full path to the fbx file.
+    :param bool include_animation: Whether the actions are exported.
+    """
+    view_layer = bpy.context.view_layer
+    for selected_object in view_layer.objects:
+        selected_object.select_set(False)
+    for selected_object in [obj] + mesh_objects:
+        selected_object.select_set(True)
+    view_layer.objects.active = obj
+
+    os.makedirs(os.path.dirname(fbx_file_path), exist_ok=True)
+    temporary_file_path = '{}.{}.tmp.fbx'.format(fbx_file_path[:-len('.fbx')], uuid.uuid4().hex)
+    try:
+        result = bpy.ops.export_scene.fbx(filepath=temporary_file_path, bake_anim=include_animation, **FBX_EXPORT_SETTINGS)
+        if 'FINISHED' not in result:
+            raise RuntimeError('The fbx export of "{}" was cancelled'.format(obj.name))
+        os.replace(temporary_file_path, fbx_file_path)
+    finally:
+        if os.path.exists(temporary_file_path):
+            os.remove(temporary_file_path)
+
+
+def export_open_file(armature_selector, output_folder, previous_hashes, template_folder_path=None,
+                     include_animation=False, cache_size=None):
+    """
+    This function exports every matching armature of the open blend file with its meshes. Characters whose hash
+    did not change since their last export and whose fbx file still exists are skipped. If a template is given the
+    armatures are converted first, without saving the blend file, and the exported actions are re-baked to the
+    converted rest pose.
+
+    :param str armature_selector: A fnmatch style pattern that selects the armatures to export.
+    :param str output_folder: The folder the fbx files of this blend file are written to.
+    :param dict previous_hashes: The hash of every character at its last export, by armature name.
+    :param str template_folder_path: The full path to the template folder, or None to export the armatures as they
+    are.
+    :param bool include_animation: Whether the actions are exported.
+    :param int cache_size: The size limit of the conversion cache in bytes, or None to convert without the cache.
+    :return dict: The hash and fbx file name of every character, and the names of the exported and skipped ones.
+    """
+    armatures = batch.select_armatures(armature_selector)
+    if not armatures:
+        raise LookupError('No armature matches "{}"'.format(armature_selector))
+
+    plan = templates.get_compiled_template(template_folder_path) if template_folder_path else None
+    rules_digest = templates.get_rules_digest(plan.orientations + plan.creations + plan.renames) if plan else None
+    settings_digest = get_settings_digest(rules_digest, include_animation)
+
+    result = {'characters': {}, 'exported': [], 'skipped': []}
+    for obj in armatures:
+        mesh_objects = sorted(meshes.get_bound_meshes(obj), key=lambda mesh_object: mesh_object.name)
+        character_hash = get_character_hash(obj, mesh_objects, settings_digest, include_animation)
+        fbx_file_name = get_fbx_file_name(obj)
+        result['characters'][obj.name] = {'hash': character_hash, 'fbx': fbx_file_name}
+
+        fbx_file_path = os.path.join(output_folder, fbx_file_name)
+        if previous_hashes.get(obj.name) == character_hash and os.path.isfile(fbx_file_path):
+            result['skipped'].append(obj.name)
+            continue
+
+        if plan:
+            scene.convert_armature(
+                obj, plan, include_animation, cache_size, os.path.basename(os.path.normpath(template_folder_path))
+            )
+        export_character(obj, mesh_objects, fbx_file_path, include_animation)
+        result['exported'].append(obj.name)
+
+    return result
+
+
+def run_export_worker(arguments):
+    """
+    This function is the entry point of a background export worker. It exports the characters of the blend file
+    Blender was started with and prints a single result line that the parent process collects.
+
+    :param object arguments: The parsed export worker command line arguments.
+    """
+    result = {'file': bpy.data.filepath, 'status': 'FAILED'}
+    try:
+        result.update(export_open_file(
+            arguments.armature,
+            arguments.output_dir,
+            json.loads(arguments.hashes),
+            arguments.template_path,
+            arguments.animation,
+            arguments.cache_size * 1024 * 1024 if arguments.cache_size else None
+        ))
+        result['status'] = 'FINISHED'
+    except Exception as error:
+        result['error'] = '{}: {}'.format(type(error).__name__, error)
+
+    print(batch.RESULT_PREFIX + json.dumps(result))
+    sys.stdout.flush()
+
+
+# -------------- functions that fan the exports out over background workers --------------
+def load_export_manifest(output_folder):
+    """
+    This function loads the record of the last export of every blend file from the output folder.
+
+    :param str output_folder: The folder the fbx files are written to.
+    :return dict: The export record by blend file path.
+    """
+    try:
+        with open(os.path.join(output_folder, EXPORT_MANIFEST_FILE_NAME)) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(manifest, dict) or manifest.get('version') != EXPORT_VERSION:
+        return {}
+    return manifest.get('files', {})
+
+
+def save_export_manifest(output_folder, files):
+    """
+    This function writes the record of the last export of every blend file to the output folder.
+
+    :param str output_folder: The folder the fbx files are written to.
+    :param dict files: The export record by blend file path.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    temporary_file_path = os.path.join(output_folder, '{}.{}.tmp'.format(EXPORT_MANIFEST_FILE_NAME, uuid.uuid4().hex))
+    with open(temporary_file_path, 'w') as manifest_file:
+        json.dump({'version': EXPORT_VERSION, 'files': files}, manifest_file, indent=4)
+    os.replace(temporary_file_path, os.path.join(output_folder, EXPORT_MANIFEST_FILE_NAME))
+
+
+def get_blend_file_hash(blend_file, entry):
+    """
+    This function gets the hash of a blend file. The hash of the last export is used as long as the size and
+    modification time of the file did not change.
+
+    :param str blend_file: The full path to the blend file.
+    :param dict entry: The export record of the blend file, or None if it was never exported.
+    :return dict: The sha256 digest, size and modification time of the blend file.
+    """
+    stat = os.stat(blend_file)
+    if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+        return {'sha256': entry['sha256'], 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    with open(blend_file, 'rb') as source_file:
+        sha256 = packages.get_file_hash(source_file)[0]
+    return {'sha256': sha256, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def is_export_current(entry, file_hash, settings_digest, character_folder):
+    """
+    This function checks whether the fbx files of a blend file are still current, so the blend file does not have
+    to be opened at all.
+
+    :param dict entry: The export record of the blend file, or None if it was never exported.
+    :param dict file_hash: The sha256 digest, size and modification time of the blend file.
+    :param str settings_digest: The digest of the export settings.
+    :param str character_folder: The folder the fbx files of the blend file are written to.
+    :return bool: True if nothing changed since the last export and every fbx file still exists.
+    """
+    if not entry or entry.get('sha256') != file_hash['sha256'] or entry.get('settings') != settings_digest:
+        return False
+    return all(
+        os.path.isfile(os.path.join(character_folder, character['fbx']))
+        for character in entry.get('characters', {}).values()
+    )
+
+
+def export_blend_files(input_path, armature_selector, output_folder, workers, script_path, template_name=None,
+                       templates_path=None, include_animation=False, cache_size=0, blender_path=None, timeout=None,
+                       force=False):
+    """
+    This function exports the characters of many blend files to fbx files across a pool of background Blender
+    processes. Blend files that did not change since their last export are skipped without starting Blender, and
+    inside a changed blend file only the characters whose source data changed are exported again. The fbx files
+    of every blend file are written to a folder that mirrors the input folder structure.
+
+    :param str input_path: A directory of blend files or a manifest file listing blend files.
+    :param str armature_selector: A fnmatch style pattern that selects the armatures to export.
+    :param str output_folder: The folder the fbx files and the export manifest are written to.
+    :param int workers: The number of Blender processes that run at the same time.
+    :param str script_path: The command line script the workers are started with.
+    :param str template_name: The name of the skeleton template the armatures are converted with first, or None to
+    export them as they are.
+    :param str templates_path: The skeleton templates directory. Defaults to the one next to this module.
+    :param bool include_animation: Whether the actions are exported.
+    :param int cache_size: The size limit of the conversion cache the workers share in megabytes, 0 turns it off.
+    :param str blender_path: The full path to the Blender executable. Defaults to the running Blender.
+    :param float timeout: The number of seconds after which a worker is killed.
+    :param bool force: Whether every character is exported, even if it did not change.
+    :return dict: A summary report with the per file results, failures and throughput.
+    """
+    template_folder_path = None
+    rules_digest = None
+    if template_name:
+        template_folder_path = os.path.join(templates_path or batch.get_addon_templates_path(), template_name)
+        plan = templates.get_compiled_template(template_folder_path)
+        rules_digest = templates.get_rules_digest(plan.orientations + plan.creations + plan.renames)
+    settings_digest = get_settings_digest(rules_digest, include_animation)
+
+    manifest = {} if force else load_export_manifest(output_folder)
+    jobs = []
+    skipped_results = []
+    file_hashes = {}
+    for blend_file in [os.path.abspath(blend_file) for blend_file in batch.get_blend_files(input_path)]:
+        entry = manifest.get(blend_file)
+        character_folder = os.path.splitext(batch.get_output_path(blend_file, input_path, output_folder))[0]
+        file_hashes[blend_file] = get_blend_file_hash(blend_file, entry)
+        if is_export_current(entry, file_hashes[blend_file], settings_digest, character_folder):
+            skipped_results.append({'file': blend_file, 'status': 'SKIPPED', 'seconds': 0.0})
+            continue
+
+        # the characters are only compared with their last export if the settings did not change
+        previous_hashes = {}
+        if entry and entry.get('settings') == settings_digest:
+            previous_hashes = {name: character['hash'] for name, character in entry.get('characters', {}).items()}
+
+        arguments = [
+            'export-worker', '--armature', armature_selector, '--output-dir', character_folder,
+            '--hashes', json.dumps(previous_hashes)
+        ]
+        if template_folder_path:
+            arguments += ['--template-path', template_folder_path]
+        if include_animation:
+            arguments.append('--animation')
+        if cache_size:
+            arguments += ['--cache-size', str(cache_size)]
+        jobs.append({'file': blend_file, 'script': script_path, 'arguments': arguments})
+
+    report = batch.run_jobs(jobs, workers, blender_path, timeout)
+
+    # failed files are left out of the manifest, so they are exported again next time
+    for result in report['results']:
+        if result['status'] == 'FINISHED':
+            manifest[result['file']] = dict(
+                file_hashes[result['file']],
+                settings=settings_digest,
+                characters=result['characters']
+            )
+        else:
+            manifest.pop(result['file'], None)
+    save_export_manifest(output_folder, manifest)
+
+    report['results'] = skipped_results + report['results']
+    report['files'] += len(skipped_results)
+    report['skipped'] = len(skipped_results)
+    return report
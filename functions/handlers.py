@@ -0,0 +1,267 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import bpy
+from bpy.app.handlers import persistent
+
+from . import utilities
+
+REPOSITORY_POLL_INTERVAL = 1.0
+REPOSITORY_REFRESH_INTERVAL = 300.0
+
+_msgbus_owner = object()
+_is_refreshing = False
+_repository_refresh = {'is_running': False}
+
+
+# -------------- functions that keep the panel state up to date --------------
+def get_panel_state():
+    """
+    This function gets the cached state that the panel draws from.
+
+    :return dict: The source skeleton name, its validation results, how well every template covers it and the names
+    of the objects in the scene when it was refreshed.
+    """
+    properties = bpy.context.window_manager.ueskeleton
+    return properties.context.setdefault('panel', {
+        'object_names': None,
+        'source_skeleton_name': '',
+        'is_armature': False,
+        'is_object_selected': False,
+        'is_rotation_applied': False,
+        'template_scores': None
+    })
+
+
+def refresh_panel_state():
+    """
+    This function syncs the source skeleton name with the picker object and validates the source skeleton. It is
+    only called when the picked object or its transform changes, so the panel never has to do this while drawing.
+    """
+    global _is_refreshing
+    if _is_refreshing:
+        return
+
+    _is_refreshing = True
+    try:
+        properties = bpy.context.window_manager.ueskeleton
+        picker_object = utilities.get_picker_object()
+        target = picker_object.constraints[0].target if picker_object.constraints else None
+        source_skeleton_name = target.name if target else ''
+
+        # set source skeleton name to the object picker
+        if properties.source_skeleton_name != source_skeleton_name:
+            properties.source_skeleton_name = source_skeleton_name
+
+        is_armature, is_object_selected = utilities.validate_source_skeleton_object(properties)
+        state = get_panel_state()
+        state['object_names'] = set(bpy.context.scene.objects.keys())
+        state['source_skeleton_name'] = source_skeleton_name
+        state['is_armature'] = is_armature
+        state['is_object_selected'] = is_object_selected
+        state['is_rotation_applied'] = is_armature and utilities.validate_source_skeleton_rotation(properties)
+
+        # the templates are scored again by a timer, so the panel only ever reads the scores
+        state['template_scores'] = None
+    finally:
+        _is_refreshing = False
+
+    schedule_template_scores()
+    tag_panel_redraw()
+
+
+def update_template_scores():
+    """
+    This timer scores how well every installed template covers the bones of the source skeleton and stores the
+    scores in the panel state. It runs once after the source skeleton or the templates changed, so the templates
+    are never read while the panel draws.
+
+    :return None: The timer does not run again.
+    """
+    from . import compatibility
+
+    state = get_panel_state()
+    state['template_scores'] = []
+    source_skeleton_object = bpy.data.objects.get(state['source_skeleton_name'])
+    if state['is_armature'] and source_skeleton_object:
+        properties = bpy.context.window_manager.ueskeleton
+        template_index = compatibility.get_template_index(properties.skeleton_templates_path)
+        bone_names = source_skeleton_object.data.bones.keys()
+        state['template_scores'] = compatibility.score_templates(bone_names, template_index)
+
+    tag_panel_redraw()
+    return None
+
+
+def schedule_template_scores():
+    """
+    This function scores the templates on the next timer tick, unless that is already scheduled.
+    """
+    if not bpy.app.timers.is_registered(update_template_scores):
+        bpy.app.timers.register(update_template_scores, first_interval=0.0)
+
+
+def invalidate_template_scores():
+    """
+    This function forces the templates to be scored again, after templates were added or removed.
+    """
+    from . import compatibility
+
+    compatibility.invalidate_template_index()
+    get_panel_state()['template_scores'] = None
+    schedule_template_scores()
+
+
+def tag_panel_redraw():
+    """
+    This function redraws the 3d view sidebars so the panel shows the refreshed state.
+    """
+    window_manager = bpy.context.window_manager
+    if not window_manager:
+        return
+
+    for window in window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+
+
+@persistent
+def on_depsgraph_update(scene, depsgraph=None):
+    """
+    This function refreshes the panel state when the picker object or the source skeleton was moved or changed, or
+    when objects were added to, removed from or renamed in the scene. Selecting objects and changing properties
+    also update the scene, so those updates are ignored unless the object names differ from the cached ones.
+
+    :param object scene: The scene that was updated.
+    :param object depsgraph: The dependency graph that holds the updates.
+    """
+    if depsgraph is None:
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+
+    properties = bpy.context.window_manager.ueskeleton
+    state = get_panel_state()
+    watched_names = {properties.picker_name, state['source_skeleton_name']}
+    is_scene_checked = False
+
+    for update in depsgraph.updates:
+        updated_id = update.id.original
+        if isinstance(updated_id, bpy.types.Object):
+            if updated_id.name in watched_names and (update.is_updated_transform or update.is_updated_geometry):
+                refresh_panel_state()
+                return
+        elif isinstance(updated_id, (bpy.types.Scene, bpy.types.Collection)) and not is_scene_checked:
+            is_scene_checked = True
+            if state['object_names'] != set(scene.objects.keys()):
+                refresh_panel_state()
+                return
+
+
+def on_picker_target_changed():
+    """
+    This function refreshes the panel state when a new source skeleton is picked.
+    """
+    refresh_panel_state()
+
+
+def subscribe_to_picker():
+    """
+    This function subscribes to changes of the picker constraint's target. Subscriptions are cleared when a file is
+    loaded, so this is called again after every load.
+    """
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+    bpy.msgbus.subscribe_rna(
+        key=(bpy.types.CopyTransformsConstraint, 'target'),
+        owner=_msgbus_owner,
+        args=(),
+        notify=on_picker_target_changed
+    )
+
+
+@persistent
+def on_load_post(*args):
+    """
+    This function prepares the picker object, the subscriptions and the panel state after a file was loaded.
+    """
+    subscribe_to_picker()
+    refresh_panel_state()
+
+
+def refresh_template_repository():
+    """
+    This timer starts a background refresh of the template repository mirror every REPOSITORY_REFRESH_INTERVAL
+    seconds, and polls it until it is done so the panel can be updated from the main thread. The template dropdown
+    reads the local mirror, so it never waits for the shared storage. The repository module is only imported once a
+    template repository is set.
+
+    :return float: The number of seconds until the timer runs again.
+    """
+    if _repository_refresh['is_running']:
+        from . import repository
+
+        if repository.is_refreshing():
+            return REPOSITORY_POLL_INTERVAL
+
+        _repository_refresh['is_running'] = False
+        result = repository.get_refresh_result()
+        if result and result['error']:
+            print('ueskeleton: the template repository "{}" could not be refreshed, {}'.format(result['location'], result['error']))
+        elif result and result['written'] + result['removed']:
+            invalidate_template_scores()
+            tag_panel_redraw()
+        return REPOSITORY_REFRESH_INTERVAL
+
+    preferences = utilities.get_addon_preferences()
+    location = bpy.path.abspath(preferences.template_repository.strip())
+    if not location:
+        return REPOSITORY_REFRESH_INTERVAL
+
+    from . import repository
+
+    cache_size = preferences.template_repository_cache_size * 1024 * 1024
+    _repository_refresh['is_running'] = repository.start_refresh(location, cache_size) or repository.is_refreshing()
+    return REPOSITORY_POLL_INTERVAL
+
+
+def restart_template_repository_refresh():
+    """
+    This function refreshes the template repository mirror right away, after the repository was changed.
+    """
+    invalidate_template_scores()
+    if bpy.app.timers.is_registered(refresh_template_repository):
+        bpy.app.timers.unregister(refresh_template_repository)
+    bpy.app.timers.register(refresh_template_repository, first_interval=0.0, persistent=True)
+
+
+def initialize():
+    """
+    This function runs the load handler once the addon is enabled, since blend data can not be changed while the
+    addon registers.
+    """
+    on_load_post()
+
+
+def register():
+    """
+    This function adds the handlers that keep the panel state up to date.
+    """
+    bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+    bpy.app.handlers.load_post.append(on_load_post)
+    bpy.app.timers.register(initialize, first_interval=0.0)
+    bpy.app.timers.register(refresh_template_repository, first_interval=0.0, persistent=True)
+
+
+def unregister():
+    """
+    This function removes the handlers that keep the panel state up to date.
+    """
+    if bpy.app.timers.is_registered(initialize):
+        bpy.app.timers.unregister(initialize)
+    if bpy.app.timers.is_registered(refresh_template_repository):
+        bpy.app.timers.unregister(refresh_template_repository)
+    if bpy.app.timers.is_registered(update_template_scores):
+        bpy.app.timers.unregister(update_template_scores)
+    if on_load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load_post)
+    if on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
@@ -0,0 +1,282 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import io
+import bpy
+import base64
+from collections import namedtuple
+
+from . import lazy
+from . import templates
+from . import utilities
+
+numpy = lazy.import_module('numpy')
+
+ConversionDelta = namedtuple('ConversionDelta', ['plan', 'snapshot', 'renamed_bones', 'removed_bone_names'])
+
+
+# -------------- functions that record what was applied to a converted armature --------------
+def get_conversion_record(obj, create=False):
+    """
+    This function gets the conversion record of an armature object. The record is kept on the armature data, so it
+    is found under any object name. A record that an older version saved in the scene under the name of the object
+    is still found, and moved to the armature data when the armature is converted again.
+
+    :param object obj: The armature object.
+    :param bool create: Whether a new record is added if the armature has none.
+    :return object: The conversion record, or None if the armature has none and none was created.
+    """
+    record = obj.data.ueskeleton_conversion
+    if record.template_name:
+        return record
+
+    legacy_record = bpy.context.scene.ueskeleton.conversions.get(obj.name)
+    if not create:
+        return legacy_record
+
+    if legacy_record is not None:
+        copy_conversion_record(legacy_record, record)
+        remove_legacy_conversion_record(obj)
+    return record
+
+
+def copy_conversion_record(source, target):
+    """
+    This function copies every value of a conversion record to another record.
+
+    :param object source: The conversion record to copy.
+    :param object target: The conversion record that is overwritten.
+    """
+    target.template_name = source.template_name
+    target.template_digest = source.template_digest
+    target.snapshot = source.snapshot
+    for collection_name in ('orientation_rules', 'created_bones', 'renamed_bones'):
+        target_entries = getattr(target, collection_name)
+        target_entries.clear()
+        for source_entry in getattr(source, collection_name):
+            entry = target_entries.add()
+            entry.name = source_entry.name
+            entry.value = source_entry.value
+
+
+def remove_legacy_conversion_record(obj):
+    """
+    This function removes the conversion record an older version saved in the scene for an armature object.
+
+    :param object obj: The armature object.
+    """
+    conversions = bpy.context.scene.ueskeleton.conversions
+    index = conversions.find(obj.name)
+    if index != -1:
+        conversions.remove(index)
+
+
+def remove_conversion_record(obj):
+    """
+    This function removes the conversion record of an armature object.
+
+    :param object obj: The armature object.
+    """
+    obj.data.property_unset('ueskeleton_conversion')
+    remove_legacy_conversion_record(obj)
+
+
+def encode_snapshot(snapshot):
+    """
+    This function encodes an edit bone snapshot as text, so it can be saved in a string property.
+
+    :param EditBoneSnapshot snapshot: The edit bone snapshot.
+    :return str: The encoded snapshot.
+    """
+    buffer = io.BytesIO()
+    numpy.savez(
+        buffer,
+        names=numpy.array(snapshot.names, dtype=str),
+        heads=snapshot.heads,
+        tails=snapshot.tails,
+        rolls=snapshot.rolls,
+        parents=numpy.array(snapshot.parents, dtype=str),
+        **{'flag_' + flag_name: values for flag_name, values in snapshot.flags.items()}
+    )
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def decode_snapshot(text):
+    """
+    This function decodes an edit bone snapshot that was encoded as text.
+
+    :param str text: The encoded snapshot.
+    :return EditBoneSnapshot: The edit bone snapshot.
+    """
+    with numpy.load(io.BytesIO(base64.b64decode(text))) as snapshot:
+        return utilities.EditBoneSnapshot(
+            names=[str(name) for name in snapshot['names']],
+            heads=snapshot['heads'],
+            tails=snapshot['tails'],
+            rolls=snapshot['rolls'],
+            parents=[str(name) for name in snapshot['parents']],
+            flags={key[len('flag_'):]: snapshot[key] for key in snapshot.files if key.startswith('flag_')}
+        )
+
+
+def restore_snapshot(bone_arrays, snapshot, renamed_bones):
+    """
+    This function writes the rest data of a snapshot back into bone arrays. Bones that were renamed since the
+    snapshot are found by their new name, and bones that are not in the snapshot are left as they are.
+
+    :param BoneArrays bone_arrays: The rest data of the armature. Updated in place.
+    :param EditBoneSnapshot snapshot: The decoded snapshot.
+    :param dict renamed_bones: The current name of every renamed bone, by the name it had in the snapshot.
+    """
+    name_indices = {name: index for index, name in enumerate(bone_arrays.names)}
+    snapshot_indices = []
+    indices = []
+    for snapshot_index, name in enumerate(snapshot.names):
+        index = name_indices.get(renamed_bones.get(name, name))
+        if index is not None:
+            snapshot_indices.append(snapshot_index)
+            indices.append(index)
+
+    bone_arrays.heads[indices] = snapshot.heads[snapshot_indices]
+    bone_arrays.tails[indices] = snapshot.tails[snapshot_indices]
+    bone_arrays.rolls[indices] = snapshot.rolls[snapshot_indices]
+
+
+def get_rule_digests(rules):
+    """
+    This function hashes every compiled rule on its own.
+
+    :param tuple rules: The compiled rules.
+    :return list: The digest of every rule.
+    """
+    return [templates.get_rules_digest((rule,)) for rule in rules]
+
+
+def rename_rule_bones(plan, renamed_bones):
+    """
+    This function points the orientation and creation rules of a compiled template at the current names of bones
+    that were renamed by an earlier conversion.
+
+    :param CompiledTemplate plan: The compiled template.
+    :param dict renamed_bones: The current name of every renamed bone, by its name in the template.
+    :return CompiledTemplate: The compiled template with the current bone names.
+    """
+    if not renamed_bones:
+        return plan
+
+    def rename(name):
+        return renamed_bones.get(name, name) if name else name
+
+    return plan._replace(
+        orientations=tuple(rule._replace(name=rename(rule.name)) for rule in plan.orientations),
+        creations=tuple(
+            rule._replace(
+                source_bone=rename(rule.source_bone),
+                parent_bone=rename(rule.parent_bone),
+                end_bone=rename(rule.end_bone)
+            )
+            for rule in plan.creations
+        )
+    )
+
+
+def get_conversion_delta(obj, plan):
+    """
+    This function works out what is left to do when an armature is converted again. If the recorded orientation
+    rules are the start of the template's orientation rules, only the new rules are applied. Otherwise the armature
+    is restored to the snapshot taken before its first conversion and every rule is applied again. Bones an earlier
+    conversion created are removed and created again when the bones they copy may have moved or their rule changed,
+    and creation rules whose bone already exists are skipped.
+
+    :param object obj: The armature object.
+    :param CompiledTemplate plan: The compiled template.
+    :return ConversionDelta: The rules to apply, the snapshot to restore first and the bones to remove.
+    """
+    record = get_conversion_record(obj)
+    if record is None or not record.snapshot:
+        return ConversionDelta(plan=plan, snapshot=None, renamed_bones={}, removed_bone_names=())
+
+    renamed_bones = {entry.name: entry.value for entry in record.renamed_bones}
+    bone_names = set(obj.data.bones.keys())
+    recorded_digests = [entry.name for entry in record.orientation_rules]
+    creation_digests = dict(zip([rule.name for rule in plan.creations], get_rule_digests(plan.creations)))
+
+    snapshot = None
+    orientations = plan.orientations
+    if get_rule_digests(orientations[:len(recorded_digests)]) == recorded_digests:
+        orientations = orientations[len(recorded_digests):]
+    else:
+        snapshot = decode_snapshot(record.snapshot)
+
+    # the created bones are found by their current name, since a rename rule may have renamed them, and the bones
+    # of rules that changed or were removed from the template are removed
+    removed_bone_names = []
+    for entry in record.created_bones:
+        bone_name = renamed_bones.get(entry.name, entry.name)
+        if bone_name not in bone_names:
+            continue
+        if orientations or snapshot is not None or creation_digests.get(entry.name) != entry.value:
+            removed_bone_names.append(bone_name)
+
+    creations = tuple(
+        rule for rule in plan.creations
+        if renamed_bones.get(rule.name, rule.name) not in bone_names
+        or renamed_bones.get(rule.name, rule.name) in removed_bone_names
+    )
+    return ConversionDelta(
+        plan=rename_rule_bones(plan._replace(orientations=orientations, creations=creations), renamed_bones),
+        snapshot=snapshot,
+        renamed_bones=renamed_bones,
+        removed_bone_names=tuple(removed_bone_names)
+    )
+
+
+def record_conversion(obj, template_name, plan, delta, snapshot, created_bone_names, renamed_bone_names):
+    """
+    This function records which template and which rules were applied to an armature object. The snapshot of the
+    rest data is only taken on the first conversion, so it always holds the armature as it was before any rule.
+
+    :param object obj: The converted armature object.
+    :param str template_name: The name of the template folder.
+    :param CompiledTemplate plan: The compiled template.
+    :param ConversionDelta delta: The part of the template that was applied.
+    :param EditBoneSnapshot snapshot: The edit bones before the conversion.
+    :param list created_bone_names: The names of the created bones, in the order of the applied creation rules.
+    :param list renamed_bone_names: The old and new name of every renamed bone.
+    """
+    record = get_conversion_record(obj, create=True)
+    if not record.snapshot:
+        record.snapshot = encode_snapshot(snapshot)
+
+    record.template_name = template_name
+    record.template_digest = templates.get_rules_digest(plan.orientations + plan.creations + plan.renames)
+
+    record.orientation_rules.clear()
+    for digest in get_rule_digests(plan.orientations):
+        record.orientation_rules.add().name = digest
+
+    # keep the created bones that were not removed and add the new ones
+    creation_digests = dict(zip([rule.name for rule in plan.creations], get_rule_digests(plan.creations)))
+    created_bones = {
+        entry.name: entry.value for entry in record.created_bones
+        if delta.renamed_bones.get(entry.name, entry.name) not in delta.removed_bone_names
+    }
+    for rule, bone_name in zip(delta.plan.creations, created_bone_names):
+        created_bones[bone_name] = creation_digests[rule.name]
+
+    record.created_bones.clear()
+    for bone_name, digest in created_bones.items():
+        entry = record.created_bones.add()
+        entry.name = bone_name
+        entry.value = digest
+
+    # the renamed bones are kept by the name they have in the template
+    renamed_bones = dict(delta.renamed_bones)
+    template_bone_names = {name: template_bone_name for template_bone_name, name in renamed_bones.items()}
+    for old_name, new_name in renamed_bone_names:
+        renamed_bones[template_bone_names.get(old_name, old_name)] = new_name
+
+    record.renamed_bones.clear()
+    for template_bone_name, bone_name in renamed_bones.items():
+        entry = record.renamed_bones.add()
+        entry.name = template_bone_name
+        entry.value = bone_name
@@ -0,0 +1,645 @@
+# Copyright Wuguyannian All Rights Reserved.
+"""
+Bone math on NumPy arrays. This module does not import bpy or mathutils, so it works on the rest data of a whole
+armature at once and reproduces what the edit bone api does one bone at a time.
+"""
+
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from . import lazy
+
+numpy = lazy.import_module('numpy')
+
+# the thresholds blender uses to detect bones that point along the negative y axis
+SAFE_THRESHOLD = 6.1e-3
+CRITICAL_THRESHOLD = 2.5e-4
+
+BoneArrays = namedtuple('BoneArrays', ['names', 'heads', 'tails', 'rolls', 'parents', 'connected'])
+HierarchyIndex = namedtuple('HierarchyIndex', [
+    'name_indices', 'parents', 'child_offsets', 'child_indices', 'order', 'positions', 'subtree_ends', 'depths'
+])
+KernelPlan = namedtuple('KernelPlan', ['orientations', 'creations'])
+
+
+def normalize(vectors):
+    """
+    This function normalizes an array of vectors. Zero length vectors are left as they are.
+
+    :param numpy.ndarray vectors: An array of vectors with the shape (n, 3).
+    :return numpy.ndarray: The normalized vectors.
+    """
+    lengths = numpy.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / numpy.where(lengths > 0.0, lengths, 1.0)
+
+
+def axis_angle_to_matrices(axes, angles):
+    """
+    This function builds the rotation matrices around normalized axes.
+
+    :param numpy.ndarray axes: The normalized rotation axes with the shape (n, 3).
+    :param numpy.ndarray angles: The rotation angles in radians with the shape (n,).
+    :return numpy.ndarray: The rotation matrices with the shape (n, 3, 3).
+    """
+    x, y, z = axes[:, 0], axes[:, 1], axes[:, 2]
+    sin = numpy.sin(angles)
+    cos = numpy.cos(angles)
+    inverse_cos = 1.0 - cos
+
+    matrices = numpy.empty((len(axes), 3, 3))
+    matrices[:, 0, 0] = x * x * inverse_cos + cos
+    matrices[:, 1, 0] = x * y * inverse_cos + z * sin
+    matrices[:, 2, 0] = x * z * inverse_cos - y * sin
+    matrices[:, 0, 1] = x * y * inverse_cos - z * sin
+    matrices[:, 1, 1] = y * y * inverse_cos + cos
+    matrices[:, 2, 1] = y * z * inverse_cos + x * sin
+    matrices[:, 0, 2] = x * z * inverse_cos + y * sin
+    matrices[:, 1, 2] = y * z * inverse_cos - x * sin
+    matrices[:, 2, 2] = z * z * inverse_cos + cos
+    return matrices
+
+
+def vec_roll_to_mat3(vectors, rolls):
+    """
+    This function computes the rest orientation of bones from their head to tail vectors and rolls, the same way
+    blender computes the x_axis, y_axis and z_axis of an edit bone.
+
+    :param numpy.ndarray vectors: The tail minus head vectors with the shape (n, 3).
+    :param numpy.ndarray rolls: The bone rolls in radians with the shape (n,).
+    :return numpy.ndarray: The orientation matrices with the shape (n, 3, 3), their columns are the bone axes.
+    """
+    normals = normalize(numpy.asarray(vectors, dtype=numpy.float64))
+    x, y, z = normals[:, 0], normals[:, 1], normals[:, 2]
+
+    theta = 1.0 + y
+    theta_alt = x * x + z * z
+    regular = (theta > SAFE_THRESHOLD) | (theta_alt > CRITICAL_THRESHOLD * CRITICAL_THRESHOLD)
+
+    # when the bone is close to the negative y axis theta is recomputed from x and z for precision
+    theta = numpy.where(theta <= SAFE_THRESHOLD, theta_alt * 0.5 + theta_alt * theta_alt * 0.125, theta)
+    theta = numpy.where(regular, theta, 1.0)
+
+    bone_matrices = numpy.zeros((len(normals), 3, 3))
+    bone_matrices[:, 0, 0] = 1.0 - x * x / theta
+    bone_matrices[:, 1, 0] = -x
+    bone_matrices[:, 2, 0] = -x * z / theta
+    bone_matrices[:, 0, 1] = x
+    bone_matrices[:, 1, 1] = y
+    bone_matrices[:, 2, 1] = z
+    bone_matrices[:, 0, 2] = -x * z / theta
+    bone_matrices[:, 1, 2] = -z
+    bone_matrices[:, 2, 2] = 1.0 - z * z / theta
+
+    # bones pointing exactly along the negative y axis are flipped around the z axis
+    bone_matrices[~regular] = numpy.diag([-1.0, -1.0, 1.0])
+
+    return numpy.matmul(axis_angle_to_matrices(normals, numpy.asarray(rolls, dtype=numpy.float64)), bone_matrices)
+
+
+def mat3_to_vec_roll(matrices):
+    """
+    This function computes the directions and rolls of bones from their rest orientations, the same way blender does
+    when the matrix of an edit bone is set.
+
+    :param numpy.ndarray matrices: The orientation matrices with the shape (n, 3, 3), their columns are the bone axes.
+    :return tuple: The y axes with the shape (n, 3) and the rolls in radians with the shape (n,).
+    """
+    matrices = numpy.asarray(matrices, dtype=numpy.float64)
+    vectors = matrices[:, :, 1]
+
+    # the roll is the rotation around the y axis that is left once the bone is pointed along its vector
+    bone_matrices = vec_roll_to_mat3(vectors, numpy.zeros(len(matrices)))
+    roll_matrices = numpy.matmul(numpy.transpose(bone_matrices, (0, 2, 1)), matrices)
+    return vectors, numpy.arctan2(roll_matrices[:, 0, 2], roll_matrices[:, 2, 2])
+
+
+def rotate_vectors(vectors, axes, angle):
+    """
+    This function rotates vectors around normalized axes by the same angle.
+
+    :param numpy.ndarray vectors: The vectors to rotate with the shape (n, 3).
+    :param numpy.ndarray axes: The normalized rotation axes with the shape (n, 3).
+    :param float angle: The rotation angle in radians.
+    :return numpy.ndarray: The rotated vectors.
+    """
+    sin = numpy.sin(angle)
+    cos = numpy.cos(angle)
+    dots = numpy.sum(axes * vectors, axis=1, keepdims=True)
+    return vectors * cos + numpy.cross(axes, vectors) * sin + axes * dots * (1.0 - cos)
+
+
+def build_hierarchy_index(names, parents):
+    """
+    This function builds the hierarchy index of an armature once, so bones can be found by name and whole
+    subtrees can be taken as slices of a precomputed depth first traversal order.
+
+    :param list names: The bone names.
+    :param numpy.ndarray parents: The parent index of every bone, -1 for bones without a parent.
+    :return HierarchyIndex: The name to index map, the children of every bone as offsets into one child array, the
+    depth first traversal order, the position of every bone in that order, where every bone's subtree ends in that
+    order and the depth of every bone.
+    """
+    parents = numpy.asarray(parents, dtype=numpy.int64)
+    count = len(parents)
+
+    # the children of bone i are child_indices[child_offsets[i]:child_offsets[i + 1]]
+    has_parent = parents >= 0
+    child_indices = numpy.flatnonzero(has_parent)
+    child_indices = child_indices[numpy.argsort(parents[child_indices], kind='stable')]
+    child_offsets = numpy.zeros(count + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(parents[has_parent], minlength=count), out=child_offsets[1:])
+
+    order = numpy.empty(count, dtype=numpy.int64)
+    depths = numpy.zeros(count, dtype=numpy.int64)
+    position = 0
+    stack = [(int(root), 0) for root in numpy.flatnonzero(~has_parent)[::-1]]
+    while stack:
+        index, depth = stack.pop()
+        order[position] = index
+        depths[index] = depth
+        position += 1
+        for child in child_indices[child_offsets[index]:child_offsets[index + 1]][::-1]:
+            stack.append((int(child), depth + 1))
+
+    positions = numpy.empty(count, dtype=numpy.int64)
+    positions[order] = numpy.arange(count)
+
+    # a subtree ends at the first following bone in the traversal order that is not deeper than its root
+    subtree_ends = numpy.full(count, count, dtype=numpy.int64)
+    open_bones = []
+    for position, index in enumerate(order):
+        while open_bones and depths[open_bones[-1]] >= depths[index]:
+            subtree_ends[open_bones.pop()] = position
+        open_bones.append(index)
+
+    return HierarchyIndex(
+        name_indices={name: index for index, name in enumerate(names)},
+        parents=parents,
+        child_offsets=child_offsets,
+        child_indices=child_indices,
+        order=order,
+        positions=positions,
+        subtree_ends=subtree_ends,
+        depths=depths
+    )
+
+
+def get_bone_index(hierarchy, name):
+    """
+    This function gets the index of a bone by its name.
+
+    :param HierarchyIndex hierarchy: The hierarchy index of the armature.
+    :param str name: The bone name.
+    :return int: The bone index.
+    """
+    if name not in hierarchy.name_indices:
+        raise KeyError('bone "{}" not found'.format(name))
+    return hierarchy.name_indices[name]
+
+
+def get_children(hierarchy, indices):
+    """
+    This function gets the children of a set of bones.
+
+    :param HierarchyIndex hierarchy: The hierarchy index of the armature.
+    :param numpy.ndarray indices: The bone indices.
+    :return numpy.ndarray: The indices of all their children.
+    """
+    starts = hierarchy.child_offsets[indices]
+    counts = hierarchy.child_offsets[indices + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return numpy.empty(0, dtype=numpy.int64)
+
+    return hierarchy.child_indices[numpy.repeat(starts - numpy.cumsum(counts) + counts, counts) + numpy.arange(total)]
+
+
+def get_subtree_levels(hierarchy, index, max_depth):
+    """
+    This function gets a bone and its children down to a maximum depth, grouped by their depth below the bone.
+
+    :param HierarchyIndex hierarchy: The hierarchy index of the armature.
+    :param int index: The index of the bone at the top of the subtree.
+    :param int max_depth: How many levels of children are included.
+    :return list: An array of bone indices for every level, starting with the bone itself.
+    """
+    subtree = hierarchy.order[hierarchy.positions[index]:hierarchy.subtree_ends[index]]
+    relative_depths = hierarchy.depths[subtree] - hierarchy.depths[index]
+
+    included = relative_depths <= max_depth
+    subtree = subtree[included]
+    relative_depths = relative_depths[included]
+
+    sorted_indices = numpy.argsort(relative_depths, kind='stable')
+    level_starts = numpy.flatnonzero(numpy.diff(relative_depths[sorted_indices])) + 1
+    return numpy.split(subtree[sorted_indices], level_starts)
+
+
+def rotate_bones(heads, tails, rolls, connected, hierarchy, indices, axis, angle):
+    """
+    This function rotates the tails of a set of independent bones around one of their own axes, and moves the
+    heads of their connected children onto the new tails, like setting the tail of an edit bone does.
+
+    :param numpy.ndarray heads: The bone heads with the shape (n, 3). Updated in place.
+    :param numpy.ndarray tails: The bone tails with the shape (n, 3). Updated in place.
+    :param numpy.ndarray rolls: The bone rolls with the shape (n,).
+    :param numpy.ndarray connected: Whether every bone is connected to its parent.
+    :param HierarchyIndex hierarchy: The hierarchy index of the armature.
+    :param numpy.ndarray indices: The bones to rotate, none of them may be the parent of another.
+    :param int axis: The index of the bone axis to rotate around, 0 for x, 1 for y and 2 for z.
+    :param float angle: The rotation angle in radians.
+    """
+    # a quaternion normalizes its axis, and close to the negative y axis the bone axes are not quite unit length
+    axes = normalize(vec_roll_to_mat3(tails[indices] - heads[indices], rolls[indices])[:, :, axis])
+    tails[indices] = heads[indices] + rotate_vectors(tails[indices] - heads[indices], axes, angle)
+
+    children = get_children(hierarchy, indices)
+    moved = children[connected[children]]
+    heads[moved] = tails[hierarchy.parents[moved]]
+
+
+def apply_orientation_rules(heads, tails, rolls, connected, hierarchy, rules):
+    """
+    This function applies orientation rules to the rest data of an armature. The rules are applied in order and
+    each rule rotates its bone and then each level of its children as one vectorized operation.
+
+    :param numpy.ndarray heads: The bone heads with the shape (n, 3). Updated in place.
+    :param numpy.ndarray tails: The bone tails with the shape (n, 3). Updated in place.
+    :param numpy.ndarray rolls: The bone rolls with the shape (n,). Updated in place.
+    :param numpy.ndarray connected: Whether every bone is connected to its parent.
+    :param HierarchyIndex hierarchy: The hierarchy index of the armature.
+    :param list rules: Tuples of the bone index, axis index, angle in radians, recursive depth and the roll to add
+    in radians or None.
+    """
+    for index, axis, angle, recursive, roll_add in rules:
+        if roll_add is not None:
+            rolls[index] += roll_add
+
+        for level in get_subtree_levels(hierarchy, index, recursive):
+            rotate_bones(heads, tails, rolls, connected, hierarchy, level, axis, angle)
+
+
+def resolve_orientation_rules(hierarchy, orientations):
+    """
+    This function resolves the bone names of orientation rules to bone indices.
+
+    :param HierarchyIndex hierarchy: The hierarchy index of the armature.
+    :param tuple orientations: Tuples of the bone name, axis index, angle in radians, recursive depth and the roll to
+    add in radians or None.
+    :return list: The orientation rules in the form apply_orientation_rules takes them.
+    """
+    return [
+        (get_bone_index(hierarchy, name), axis, angle, recursive, roll_add)
+        for name, axis, angle, recursive, roll_add in orientations
+    ]
+
+
+def apply_creation_rules(bone_arrays, creations):
+    """
+    This function appends the bones of creation rules to the rest data of an armature. A new bone copies the rest
+    data, parent and connected flag of its source bone, then gets its parent, head, tail and matrix set in that
+    order, like the edit bone api does. Setting a parent does not move the bone. A bone with an end bone is placed
+    between the heads of its source and end bone before its head, tail and matrix are set.
+
+    :param BoneArrays bone_arrays: The rest data of the armature.
+    :param tuple creations: Tuples of the bone name, source bone name or None, parent bone name or None, whether the
+    bone is parented to the root, the head, tail and 4x4 matrix as arrays or None, and the end bone name or None with
+    the fraction of the way to the end bone the head is placed at and the length as a fraction of that way.
+    :return BoneArrays: The rest data with the created bones after the existing bones, in the order of the rules.
+    """
+    count = len(bone_arrays.names)
+    total = count + len(creations)
+    name_indices = {name: index for index, name in enumerate(bone_arrays.names)}
+
+    def get_index(name):
+        if name not in name_indices:
+            raise KeyError('bone "{}" not found'.format(name))
+        return name_indices[name]
+
+    heads = numpy.zeros((total, 3))
+    tails = numpy.zeros((total, 3))
+    rolls = numpy.zeros(total)
+    parents = numpy.full(total, -1, dtype=numpy.int64)
+    connected = numpy.zeros(total, dtype=bool)
+    heads[:count] = bone_arrays.heads
+    tails[:count] = bone_arrays.tails
+    rolls[:count] = bone_arrays.rolls
+    parents[:count] = bone_arrays.parents
+    connected[:count] = bone_arrays.connected
+
+    for index, (name, source_bone, parent_bone, parent_root, head, tail, matrix, end_bone, fraction, length) in enumerate(creations, count):
+        if source_bone:
+            source = get_index(source_bone)
+            heads[index] = heads[source]
+            tails[index] = tails[source]
+            rolls[index] = rolls[source]
+            parents[index] = parents[source]
+            connected[index] = connected[source]
+        if parent_bone:
+            parents[index] = get_index(parent_bone)
+        if parent_root:
+            parents[index] = -1
+            connected[index] = False
+        if end_bone:
+            span = heads[get_index(end_bone)] - heads[index]
+            heads[index] = heads[index] + span * fraction
+            tails[index] = heads[index] + span * length
+            connected[index] = False
+        if head is not None:
+            heads[index] = head
+        if tail is not None:
+            tails[index] = tail
+        if matrix is not None:
+            matrix = numpy.asarray(matrix, dtype=numpy.float64)
+            matrix_length = numpy.linalg.norm(tails[index] - heads[index])
+            vectors, bone_rolls = mat3_to_vec_roll(matrix[None, :3, :3])
+            heads[index] = matrix[:3, 3]
+            tails[index] = heads[index] + vectors[0] * matrix_length
+            rolls[index] = bone_rolls[0]
+
+        # later rules find the new bone by its name
+        name_indices[name] = index
+
+    return BoneArrays(
+        names=list(bone_arrays.names) + [creation[0] for creation in creations],
+        heads=heads,
+        tails=tails,
+        rolls=rolls,
+        parents=parents,
+        connected=connected
+    )
+
+
+def convert_bone_arrays(bone_arrays, plan):
+    """
+    This function converts the rest data of an armature with a kernel plan. It only works on arrays, so it can run
+    in a worker process that has no access to blender.
+
+    :param BoneArrays bone_arrays: The rest data of the armature. It is not changed.
+    :param KernelPlan plan: The orientation and creation rules with plain values.
+    :return BoneArrays: The converted rest data, with the created bones after the existing bones.
+    """
+    converted_arrays = copy_bone_arrays(bone_arrays)
+    if plan.orientations:
+        hierarchy = build_hierarchy_index(converted_arrays.names, converted_arrays.parents)
+        apply_orientation_rules(
+            converted_arrays.heads,
+            converted_arrays.tails,
+            converted_arrays.rolls,
+            converted_arrays.connected,
+            hierarchy,
+            resolve_orientation_rules(hierarchy, plan.orientations)
+        )
+    return apply_creation_rules(converted_arrays, plan.creations)
+
+
+def convert_many(bone_arrays_list, plans, max_workers=None):
+    """
+    This function converts the rest data of many armatures. With more than one worker the conversions run in a pool
+    of new python processes, which only import this module and numpy.
+
+    :param list bone_arrays_list: The rest data of every armature.
+    :param list plans: The kernel plan of every armature.
+    :param int max_workers: The number of worker processes, None for one per cpu and 1 to convert in this process.
+    :return list: The converted rest data of every armature, in the given order.
+    """
+    bone_arrays_list = list(bone_arrays_list)
+    plans = list(plans)
+    if max_workers == 1 or len(bone_arrays_list) < 2:
+        return [convert_bone_arrays(bone_arrays, plan) for bone_arrays, plan in zip(bone_arrays_list, plans)]
+
+    # forking blender is not safe, so the workers always start from a fresh interpreter
+    with ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return list(executor.map(convert_bone_arrays, bone_arrays_list, plans))
+
+
+def copy_bone_arrays(bone_arrays):
+    """
+    This function copies bone arrays, so the copy can be kept while the original is changed in place.
+
+    :param BoneArrays bone_arrays: The bone arrays to copy.
+    :return BoneArrays: The copied bone arrays.
+    """
+    return BoneArrays(
+        names=list(bone_arrays.names),
+        heads=bone_arrays.heads.copy(),
+        tails=bone_arrays.tails.copy(),
+        rolls=bone_arrays.rolls.copy(),
+        parents=bone_arrays.parents.copy(),
+        connected=bone_arrays.connected.copy()
+    )
+
+
+def select_bones(bone_arrays, names):
+    """
+    This function gets the bone arrays of some of the bones, in the given order. Parents that are not selected become
+    -1.
+
+    :param BoneArrays bone_arrays: The bone arrays.
+    :param list names: The names of the bones to select.
+    :return BoneArrays: The bone arrays of the selected bones.
+    """
+    name_indices = {name: index for index, name in enumerate(bone_arrays.names)}
+    indices = numpy.array([name_indices[name] for name in names], dtype=numpy.int64)
+
+    selected_positions = numpy.full(len(bone_arrays.names) + 1, -1, dtype=numpy.int64)
+    selected_positions[indices] = numpy.arange(len(indices))
+    return BoneArrays(
+        names=list(names),
+        heads=bone_arrays.heads[indices],
+        tails=bone_arrays.tails[indices],
+        rolls=bone_arrays.rolls[indices],
+        parents=selected_positions[bone_arrays.parents[indices]],
+        connected=bone_arrays.connected[indices]
+    )
+
+
+# -------------- functions that carry animation over a change of the rest pose --------------
+EULER_ORDERS = ('XYZ', 'XZY', 'YXZ', 'YZX', 'ZXY', 'ZYX')
+
+
+def get_rest_deltas(original, converted):
+    """
+    This function computes how the rest pose of every bone changed, expressed in the bone's original rest space.
+
+    :param BoneArrays original: The bone arrays before the conversion.
+    :param BoneArrays converted: The bone arrays after the conversion, with the same bones in the same order.
+    :return tuple: The rotation deltas with the shape (n, 3, 3) and the translation deltas with the shape (n, 3).
+    """
+    original_rotations = vec_roll_to_mat3(original.tails - original.heads, original.rolls)
+    converted_rotations = vec_roll_to_mat3(converted.tails - converted.heads, converted.rolls)
+
+    inverse_rotations = numpy.transpose(original_rotations, (0, 2, 1))
+    rotation_deltas = numpy.matmul(inverse_rotations, converted_rotations)
+    translation_deltas = numpy.einsum('nij,nj->ni', inverse_rotations, converted.heads - original.heads)
+    return rotation_deltas, translation_deltas
+
+
+def is_identity_delta(rotation_delta, translation_delta, tolerance=1e-6):
+    """
+    This function checks whether a rest pose delta leaves the bone unchanged.
+
+    :param numpy.ndarray rotation_delta: The rotation delta with the shape (3, 3).
+    :param numpy.ndarray translation_delta: The translation delta with the shape (3,).
+    :param float tolerance: The largest difference that is treated as no change.
+    :return bool: True if the bone did not change.
+    """
+    return numpy.abs(rotation_delta - numpy.eye(3)).max() <= tolerance and numpy.abs(translation_delta).max() <= tolerance
+
+
+def quaternion_multiply(a, b):
+    """
+    This function multiplies arrays of quaternions.
+
+    :param numpy.ndarray a: Quaternions in w, x, y, z order with the shape (n, 4).
+    :param numpy.ndarray b: Quaternions in w, x, y, z order with the shape (n, 4) or (4,).
+    :return numpy.ndarray: The products a * b.
+    """
+    aw, ax, ay, az = numpy.moveaxis(numpy.asarray(a), -1, 0)
+    bw, bx, by, bz = numpy.moveaxis(numpy.asarray(b), -1, 0)
+    return numpy.stack([
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw
+    ], axis=-1)
+
+
+def quaternion_to_matrix(quaternions):
+    """
+    This function converts quaternions to rotation matrices.
+
+    :param numpy.ndarray quaternions: Quaternions in w, x, y, z order with the shape (n, 4).
+    :return numpy.ndarray: The rotation matrices with the shape (n, 3, 3).
+    """
+    w, x, y, z = numpy.moveaxis(normalize(quaternions), -1, 0)
+    matrices = numpy.empty(quaternions.shape[:-1] + (3, 3))
+    matrices[..., 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    matrices[..., 0, 1] = 2.0 * (x * y - w * z)
+    matrices[..., 0, 2] = 2.0 * (x * z + w * y)
+    matrices[..., 1, 0] = 2.0 * (x * y + w * z)
+    matrices[..., 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    matrices[..., 1, 2] = 2.0 * (y * z - w * x)
+    matrices[..., 2, 0] = 2.0 * (x * z - w * y)
+    matrices[..., 2, 1] = 2.0 * (y * z + w * x)
+    matrices[..., 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+    return matrices
+
+
+def matrix_to_quaternion(matrices):
+    """
+    This function converts rotation matrices to quaternions with a non negative w.
+
+    :param numpy.ndarray matrices: The rotation matrices with the shape (n, 3, 3).
+    :return numpy.ndarray: Quaternions in w, x, y, z order with the shape (n, 4).
+    """
+    m = numpy.asarray(matrices, dtype=numpy.float64)
+    trace = m[..., 0, 0] + m[..., 1, 1] + m[..., 2, 2]
+
+    # use the largest of w, x, y and z as the divisor to stay precise
+    candidates = numpy.stack([
+        numpy.stack([1.0 + trace, m[..., 2, 1] - m[..., 1, 2], m[..., 0, 2] - m[..., 2, 0], m[..., 1, 0] - m[..., 0, 1]], axis=-1),
+        numpy.stack([m[..., 2, 1] - m[..., 1, 2], 1.0 + m[..., 0, 0] - m[..., 1, 1] - m[..., 2, 2], m[..., 0, 1] + m[..., 1, 0], m[..., 0, 2] + m[..., 2, 0]], axis=-1),
+        numpy.stack([m[..., 0, 2] - m[..., 2, 0], m[..., 0, 1] + m[..., 1, 0], 1.0 - m[..., 0, 0] + m[..., 1, 1] - m[..., 2, 2], m[..., 1, 2] + m[..., 2, 1]], axis=-1),
+        numpy.stack([m[..., 1, 0] - m[..., 0, 1], m[..., 0, 2] + m[..., 2, 0], m[..., 1, 2] + m[..., 2, 1], 1.0 - m[..., 0, 0] - m[..., 1, 1] + m[..., 2, 2]], axis=-1)
+    ], axis=-2)
+    diagonal = numpy.stack([1.0 + trace, 1.0 + m[..., 0, 0] - m[..., 1, 1] - m[..., 2, 2],
+                            1.0 - m[..., 0, 0] + m[..., 1, 1] - m[..., 2, 2], 1.0 - m[..., 0, 0] - m[..., 1, 1] + m[..., 2, 2]], axis=-1)
+    largest = numpy.argmax(diagonal, axis=-1)
+
+    quaternions = numpy.take_along_axis(candidates, largest[..., None, None], axis=-2)[..., 0, :]
+    quaternions = normalize(quaternions)
+    return numpy.where(quaternions[..., :1] < 0.0, -quaternions, quaternions)
+
+
+def make_quaternions_continuous(quaternions):
+    """
+    This function flips the sign of quaternions that point away from the previous quaternion, so an animation
+    interpolates the short way between keys.
+
+    :param numpy.ndarray quaternions: Quaternions of consecutive keys with the shape (n, 4).
+    :return numpy.ndarray: The continuous quaternions.
+    """
+    if len(quaternions) < 2:
+        return quaternions
+
+    flips = numpy.sum(quaternions[1:] * quaternions[:-1], axis=-1) < 0.0
+    signs = numpy.concatenate([[1.0], numpy.where(numpy.cumsum(flips) % 2, -1.0, 1.0)])
+    return quaternions * signs[:, None]
+
+
+def axis_rotation_matrices(axis, angles):
+    """
+    This function builds the rotation matrices around one of the world axes.
+
+    :param int axis: The index of the axis, 0 for x, 1 for y and 2 for z.
+    :param numpy.ndarray angles: The angles in radians with the shape (n,).
+    :return numpy.ndarray: The rotation matrices with the shape (n, 3, 3).
+    """
+    axes = numpy.zeros((len(angles), 3))
+    axes[:, axis] = 1.0
+    return axis_angle_to_matrices(axes, angles)
+
+
+def euler_to_matrix(eulers, order):
+    """
+    This function converts euler rotations to rotation matrices. The first axis of the order is applied first.
+
+    :param numpy.ndarray eulers: The x, y and z angles in radians with the shape (n, 3).
+    :param str order: The rotation order, for example 'XYZ'.
+    :return numpy.ndarray: The rotation matrices with the shape (n, 3, 3).
+    """
+    first, second, third = ['XYZ'.index(axis_name) for axis_name in order]
+    return numpy.matmul(
+        axis_rotation_matrices(third, eulers[:, third]),
+        numpy.matmul(axis_rotation_matrices(second, eulers[:, second]), axis_rotation_matrices(first, eulers[:, first]))
+    )
+
+
+def matrix_to_euler(matrices, order):
+    """
+    This function converts rotation matrices to euler rotations, keeping consecutive keys free of 360 degree jumps.
+
+    :param numpy.ndarray matrices: The rotation matrices of consecutive keys with the shape (n, 3, 3).
+    :param str order: The rotation order, for example 'XYZ'.
+    :return numpy.ndarray: The x, y and z angles in radians with the shape (n, 3).
+    """
+    first, second, third = ['XYZ'.index(axis_name) for axis_name in order]
+    sign = 1.0 if order in ('XYZ', 'YZX', 'ZXY') else -1.0
+
+    sin_second = numpy.clip(-sign * matrices[:, third, first], -1.0, 1.0)
+    cos_second = numpy.sqrt(1.0 - sin_second * sin_second)
+    locked = cos_second < 1e-6
+
+    eulers = numpy.empty((len(matrices), 3))
+    eulers[:, second] = numpy.arcsin(sin_second)
+    eulers[:, first] = numpy.where(
+        locked,
+        numpy.arctan2(-sign * matrices[:, second, third], matrices[:, second, second]),
+        numpy.arctan2(sign * matrices[:, third, second], matrices[:, third, third])
+    )
+    eulers[:, third] = numpy.where(locked, 0.0, numpy.arctan2(sign * matrices[:, second, first], matrices[:, first, first]))
+
+    return numpy.unwrap(eulers, axis=0) if len(eulers) > 1 else eulers
+
+
+def rebake_transforms(rotation_delta, translation_delta, locations, rotations, scales):
+    """
+    This function rewrites the pose transforms of one bone so the bone deforms the same way after its rest pose
+    changed by the given delta. The scale is kept as it is.
+
+    :param numpy.ndarray rotation_delta: The rotation delta of the bone with the shape (3, 3).
+    :param numpy.ndarray translation_delta: The translation delta of the bone with the shape (3,).
+    :param numpy.ndarray locations: The pose locations of every key with the shape (n, 3).
+    :param numpy.ndarray rotations: The pose rotations of every key with the shape (n, 3, 3).
+    :param numpy.ndarray scales: The pose scales of every key with the shape (n, 3).
+    :return tuple: The new locations with the shape (n, 3) and the new rotations with the shape (n, 3, 3).
+    """
+    inverse_delta = rotation_delta.T
+
+    # the basis becomes delta^-1 * basis * delta
+    scaled_translation = numpy.einsum('nij,nj->ni', rotations, scales * translation_delta)
+    new_locations = numpy.einsum('ij,nj->ni', inverse_delta, locations + scaled_translation - translation_delta)
+    new_rotations = numpy.matmul(numpy.matmul(inverse_delta, rotations), rotation_delta)
+    return new_locations, new_rotations
@@ -0,0 +1,28 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import sys
+import importlib.util
+
+
+# -------------- functions that defer importing modules until they are used --------------
+def import_module(name):
+    """
+    This function imports a module the first time one of its attributes is used, so enabling the addon does not
+    pay for the modules only the conversion needs. A module that was already imported is returned as it is.
+
+    :param str name: The name of the module.
+    :return object: The module.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError('No module named "{}"'.format(name))
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,466 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import os
+import re
+import bpy
+import json
+from collections import namedtuple
+from mathutils.kdtree import KDTree
+
+from . import lazy
+from . import kernel
+from . import templates
+from . import profiling
+from . import compatibility
+
+numpy = lazy.import_module('numpy')
+
+NAME_PATTERN = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+SIDE_TOKENS = {'l': 'l', 'left': 'l', 'r': 'r', 'right': 'r'}
+IGNORED_TOKENS = {'mixamorig', 'bip', 'def', 'org', 'mch', 'jnt', 'joint', 'bone', 'b', 'cc', 'base'}
+COMPOUND_TOKENS = {
+    ('upper', 'arm'): 'upperarm',
+    ('up', 'arm'): 'upperarm',
+    ('lower', 'arm'): 'lowerarm',
+    ('fore', 'arm'): 'lowerarm',
+    ('upper', 'leg'): 'thigh',
+    ('up', 'leg'): 'thigh',
+    ('lower', 'leg'): 'calf'
+}
+TOKEN_SYNONYMS = {
+    'hips': 'pelvis',
+    'hip': 'pelvis',
+    'shoulder': 'clavicle',
+    'collar': 'clavicle',
+    'arm': 'upperarm',
+    'forearm': 'lowerarm',
+    'elbow': 'lowerarm',
+    'upleg': 'thigh',
+    'leg': 'calf',
+    'shin': 'calf',
+    'knee': 'calf',
+    'toe': 'ball',
+    'toes': 'ball',
+    'chest': 'spine',
+    'wrist': 'hand',
+    'ankle': 'foot'
+}
+
+# how much the name, the rest position and the place in the hierarchy count towards the score of a match
+NAME_WEIGHT = 0.55
+SPATIAL_WEIGHT = 0.3
+SHAPE_WEIGHT = 0.15
+PARENT_BONUS = 0.1
+MINIMUM_SCORE = 0.35
+
+# the distance, as a fraction of the rig height, at which two joints stop counting as the same place
+SPATIAL_RADIUS = 0.1
+NAME_CANDIDATE_COUNT = 8
+SPATIAL_CANDIDATE_COUNT = 8
+ANCESTOR_DEPTH = 3
+
+NormalizedName = namedtuple('NormalizedName', ['key', 'side', 'trigrams'])
+NameIndex = namedtuple('NameIndex', ['names', 'trigram_bones', 'trigram_counts'])
+RigShape = namedtuple('RigShape', ['names', 'heads', 'parents', 'depths', 'has_children'])
+BoneMatch = namedtuple('BoneMatch', ['reference_name', 'source_name', 'score'])
+
+_name_indices = {}
+
+
+# -------------- functions that normalize bone names --------------
+def get_name_tokens(name):
+    """
+    This function splits a bone name into lower case tokens at separators, case changes and digits. Numbers lose
+    their leading zeros, so spine_01 and Spine1 give the same tokens.
+
+    :param str name: The bone name.
+    :return list: The tokens.
+    """
+    tokens = []
+    for part in re.split(r'[^A-Za-z0-9]+', name):
+        for token in NAME_PATTERN.findall(part):
+            tokens.append(str(int(token)) if token.isdigit() else token.lower())
+    return tokens
+
+
+def normalize_name(name):
+    """
+    This function normalizes a bone name into a key that does not depend on the naming convention of the rig, and
+    the side the bone is on.
+
+    :param str name: The bone name.
+    :return NormalizedName: The key, the side ('l', 'r' or '') and the trigrams of the key.
+    """
+    side = ''
+    tokens = []
+    for token in get_name_tokens(name):
+        if token in SIDE_TOKENS:
+            side = SIDE_TOKENS[token]
+        elif token not in IGNORED_TOKENS:
+            tokens.append(token)
+
+    merged_tokens = []
+    for token in tokens:
+        compound = COMPOUND_TOKENS.get((merged_tokens[-1], token)) if merged_tokens else None
+        if compound:
+            merged_tokens[-1] = compound
+        else:
+            merged_tokens.append(token)
+
+    key = ' '.join(TOKEN_SYNONYMS.get(token, token) for token in merged_tokens)
+    padded_key = ' {} '.format(key)
+    trigrams = frozenset(padded_key[index:index + 3] for index in range(len(padded_key) - 2))
+    return NormalizedName(key=key, side=side, trigrams=trigrams)
+
+
+def get_name_index(names):
+    """
+    This function gets the name index of a rig, which finds the bones that share trigrams with a name without
+    comparing it to every bone. The index is built once per set of bone names.
+
+    :param list names: The bone names of the rig.
+    :return NameIndex: The normalized names, the bones of every trigram and the trigram count of every bone.
+    """
+    names = tuple(names)
+    name_index = _name_indices.get(names)
+    if name_index:
+        return name_index
+
+    normalized_names = [normalize_name(name) for name in names]
+    trigram_bones = {}
+    for index, normalized_name in enumerate(normalized_names):
+        for trigram in normalized_name.trigrams:
+            trigram_bones.setdefault(trigram, []).append(index)
+
+    name_index = NameIndex(
+        names=normalized_names,
+        trigram_bones={trigram: numpy.array(indices, dtype=numpy.int64) for trigram, indices in trigram_bones.items()},
+        trigram_counts=numpy.array([len(normalized_name.trigrams) for normalized_name in normalized_names], dtype=numpy.float64)
+    )
+
+    # only the last few rigs are kept
+    if len(_name_indices) >= 4:
+        _name_indices.pop(next(iter(_name_indices)))
+    _name_indices[names] = name_index
+    return name_index
+
+
+def get_name_scores(name_index, name):
+    """
+    This function scores how alike a name is to every bone of a name index, as the dice coefficient of their
+    trigrams. Bones on the other side score zero, and bones with a side score half when the name has none.
+
+    :param NameIndex name_index: The name index of the rig.
+    :param NormalizedName name: The normalized name.
+    :return numpy.ndarray: The score of every bone of the rig.
+    """
+    postings = [name_index.trigram_bones[trigram] for trigram in name.trigrams if trigram in name_index.trigram_bones]
+    if not postings:
+        return numpy.zeros(len(name_index.names))
+
+    shared_counts = numpy.bincount(numpy.concatenate(postings), minlength=len(name_index.names))
+    scores = 2.0 * shared_counts / (len(name.trigrams) + name_index.trigram_counts)
+
+    for index in numpy.flatnonzero(scores):
+        side = name_index.names[index].side
+        if side != name.side:
+            scores[index] *= 0.0 if side and name.side else 0.5
+    return scores
+
+
+# -------------- functions that read the shape of a rig --------------
+def get_rig_shape(obj):
+    """
+    This function reads the rest positions and hierarchy of an armature object without entering edit mode. The
+    positions are in world space, moved so the rig stands on the origin and scaled to a height of one, so rigs of
+    any size and placement can be compared.
+
+    :param object obj: The armature object.
+    :return RigShape: The bone names, normalized head positions, parent indices, normalized depths and whether
+    every bone has children.
+    """
+    bones = obj.data.bones
+    count = len(bones)
+    names = bones.keys()
+    name_indices = {name: index for index, name in enumerate(names)}
+
+    heads = numpy.empty(count * 3, dtype=numpy.float32)
+    bones.foreach_get('head_local', heads)
+    matrix = numpy.array(obj.matrix_world, dtype=numpy.float64)
+    heads = heads.reshape(count, 3).astype(numpy.float64) @ matrix[:3, :3].T + matrix[:3, 3]
+
+    if count:
+        minimum = heads.min(axis=0)
+        maximum = heads.max(axis=0)
+        origin = numpy.array([(minimum[0] + maximum[0]) / 2.0, (minimum[1] + maximum[1]) / 2.0, minimum[2]])
+        height = (maximum - minimum).max()
+        heads = (heads - origin) / (height if height > 0.0 else 1.0)
+
+    parents = numpy.array([name_indices[bone.parent.name] if bone.parent else -1 for bone in bones], dtype=numpy.int64)
+    depths = kernel.build_hierarchy_index(names, parents).depths.astype(numpy.float64)
+    has_children = numpy.zeros(count, dtype=bool)
+    has_children[parents[parents >= 0]] = True
+
+    return RigShape(
+        names=names,
+        heads=heads,
+        parents=parents,
+        depths=depths / depths.max() if count and depths.max() > 0.0 else depths,
+        has_children=has_children
+    )
+
+
+def get_kd_tree(heads):
+    """
+    This function builds a kd tree over joint positions.
+
+    :param numpy.ndarray heads: The joint positions with the shape (n, 3).
+    :return KDTree: The balanced kd tree.
+    """
+    kd_tree = KDTree(len(heads))
+    for index, head in enumerate(heads):
+        kd_tree.insert(head, index)
+    kd_tree.balance()
+    return kd_tree
+
+
+def is_ancestor(parents, ancestor, index, max_depth=ANCESTOR_DEPTH):
+    """
+    This function checks whether a bone is an ancestor of another bone within a few levels.
+
+    :param numpy.ndarray parents: The parent index of every bone.
+    :param int ancestor: The index of the possible ancestor.
+    :param int index: The index of the bone.
+    :param int max_depth: The number of levels to look up.
+    :return bool: Whether the bone is an ancestor of the other bone.
+    """
+    for _ in range(max_depth):
+        index = parents[index]
+        if index < 0:
+            return False
+        if index == ancestor:
+            return True
+    return False
+
+
+# -------------- functions that match the bones of two rigs --------------
+def get_candidates(reference_name, reference_index, reference, source, name_index, kd_tree):
+    """
+    This function scores the source bones that could match a reference bone. Only the bones with the most alike
+    names and the bones nearest to its rest position are scored, so the cost does not grow with the size of the rig.
+
+    :param str reference_name: The name of the reference bone.
+    :param int reference_index: The index of the reference bone in the reference shape, or -1 if it has none.
+    :param RigShape reference: The shape of the reference rig, or None to match on names only.
+    :param RigShape source: The shape of the source rig.
+    :param NameIndex name_index: The name index of the source rig.
+    :param KDTree kd_tree: The kd tree over the source joints.
+    :return dict: The score of every candidate, by source bone index.
+    """
+    name_scores = get_name_scores(name_index, normalize_name(reference_name))
+    count = min(NAME_CANDIDATE_COUNT, len(name_scores))
+    candidates = set(numpy.argpartition(-name_scores, count - 1)[:count].tolist()) if count else set()
+
+    spatial_scores = {}
+    if reference is not None and reference_index >= 0:
+        for co, index, distance in kd_tree.find_n(reference.heads[reference_index], SPATIAL_CANDIDATE_COUNT):
+            spatial_scores[index] = max(0.0, 1.0 - distance / SPATIAL_RADIUS)
+            candidates.add(index)
+
+    scores = {}
+    for index in candidates:
+        if reference is None or reference_index < 0:
+            score = name_scores[index]
+        else:
+            shape_score = 1.0 - abs(reference.depths[reference_index] - source.depths[index])
+            if reference.has_children[reference_index] != source.has_children[index]:
+                shape_score *= 0.5
+            score = (
+                NAME_WEIGHT * name_scores[index] +
+                SPATIAL_WEIGHT * spatial_scores.get(index, 0.0) +
+                SHAPE_WEIGHT * shape_score
+            )
+        if score > 0.0:
+            scores[index] = float(score)
+    return scores
+
+
+def assign_matches(candidate_scores):
+    """
+    This function assigns every reference bone at most one source bone, best scores first, so no source bone is
+    used twice.
+
+    :param dict candidate_scores: The candidate scores by source bone index, by reference bone name.
+    :return dict: The source bone index and score, by reference bone name.
+    """
+    pairs = sorted(
+        ((score, reference_name, index) for reference_name, scores in candidate_scores.items() for index, score in scores.items()),
+        key=lambda pair: (-pair[0], pair[1], pair[2])
+    )
+    assignments = {}
+    used_indices = set()
+    for score, reference_name, index in pairs:
+        if score < MINIMUM_SCORE:
+            break
+        if reference_name in assignments or index in used_indices:
+            continue
+        assignments[reference_name] = (index, score)
+        used_indices.add(index)
+    return assignments
+
+
+def match_bones(reference_names, source, reference=None):
+    """
+    This function maps bone names a template uses to the bones of a source rig by the normalized names, and if a
+    reference rig is given also by the rest positions and the hierarchy. A second pass rewards matches whose parent
+    matched an ancestor of the source bone.
+
+    :param list reference_names: The bone names to match.
+    :param RigShape source: The shape of the source rig.
+    :param RigShape reference: The shape of a rig that has the reference bones, or None.
+    :return list: A bone match for every reference bone that was matched, in the order of the reference names.
+    """
+    with profiling.record('stage', 'match bones'):
+        name_index = get_name_index(source.names)
+        kd_tree = get_kd_tree(source.heads) if reference is not None else None
+        reference_indices = {name: index for index, name in enumerate(reference.names)} if reference is not None else {}
+
+        candidate_scores = {
+            reference_name: get_candidates(
+                reference_name, reference_indices.get(reference_name, -1), reference, source, name_index, kd_tree
+            )
+            for reference_name in reference_names
+        }
+        assignments = assign_matches(candidate_scores)
+
+        # the parent of a reference bone should match an ancestor of its source bone
+        if reference is not None:
+            for reference_name, scores in candidate_scores.items():
+                reference_index = reference_indices.get(reference_name, -1)
+                parent_index = reference.parents[reference_index] if reference_index >= 0 else -1
+                parent_assignment = assignments.get(reference.names[parent_index]) if parent_index >= 0 else None
+                if parent_assignment is None:
+                    continue
+                for index in scores:
+                    if is_ancestor(source.parents, parent_assignment[0], index):
+                        scores[index] += PARENT_BONUS
+            assignments = assign_matches(candidate_scores)
+
+    return [
+        BoneMatch(reference_name=reference_name, source_name=source.names[assignments[reference_name][0]], score=min(1.0, assignments[reference_name][1]))
+        for reference_name in reference_names
+        if reference_name in assignments
+    ]
+
+
+# -------------- functions that write a template for the matched bones --------------
+def get_template_bone_names(template_folder_path):
+    """
+    This function gets the bone names a template needs, in the order of its rules.
+
+    :param str template_folder_path: The full path to the template folder.
+    :return list: The bone names.
+    """
+    plan = templates.get_compiled_template(template_folder_path)
+    required_bone_names = compatibility.get_required_bone_names(plan)
+    bone_names = []
+    for name in [rule.name for rule in plan.orientations] + [
+        bone_name for rule in plan.creations for bone_name in (rule.source_bone, rule.parent_bone, rule.end_bone)
+    ]:
+        if name in required_bone_names and name not in bone_names:
+            bone_names.append(name)
+    return bone_names
+
+
+def map_template_data(template_data, template_file_name, bone_names):
+    """
+    This function points the entries of a template file at the matched source bones. Entries that need a bone that
+    was not matched are left out.
+
+    :param list template_data: The entries of the template file.
+    :param str template_file_name: The name of the template file.
+    :param dict bone_names: The source bone name, by the bone name in the template.
+    :return list: The mapped entries.
+    """
+    def rename(name):
+        return bone_names.get(name, name)
+
+    # generated bones are written out one entry per bone, so every bone they need can be matched
+    if template_file_name == 'creation.json':
+        template_data = [entry for index, entry in templates.expand_creation_data(template_data)]
+
+    created_bone_names = set()
+    mapped_data = []
+    for entry in template_data:
+        entry = dict(entry)
+        if template_file_name == 'orientation.json':
+            if entry['name'] not in bone_names:
+                continue
+            entry['name'] = rename(entry['name'])
+        elif template_file_name == 'creation.json':
+            needed_bone_names = [entry.get(key) for key in templates.CREATION_BONE_KEYS if entry.get(key)]
+            if any(name not in bone_names and name not in created_bone_names for name in needed_bone_names):
+                continue
+            for key in templates.CREATION_BONE_KEYS:
+                if entry.get(key):
+                    entry[key] = rename(entry[key])
+            created_bone_names.add(entry['name'])
+        elif template_file_name == 'rename.json':
+            entry['source_bones'] = [rename(name) for name in entry['source_bones']]
+        mapped_data.append(entry)
+    return mapped_data
+
+
+def write_template(template_folder_path, reference_template_folder_path, matches):
+    """
+    This function writes a template folder that applies the rules of a reference template to the matched bones.
+
+    :param str template_folder_path: The full path to the new template folder.
+    :param str reference_template_folder_path: The full path to the reference template folder.
+    :param list matches: The bone matches.
+    """
+    bone_names = {match.reference_name: match.source_name for match in matches}
+    reference_template_data = templates.get_template_data(reference_template_folder_path)
+    for template_file_name in templates.TEMPLATE_FILE_NAMES:
+        template_data = reference_template_data[template_file_name]
+        if not template_data:
+            continue
+
+        with open(os.path.join(template_folder_path, template_file_name), 'w') as template_file:
+            json.dump(map_template_data(template_data, template_file_name, bone_names), template_file, indent=4)
+
+    templates.invalidate_compiled_templates(template_folder_path)
+    compatibility.invalidate_template_index()
+
+
+def generate_template(properties, template_name):
+    """
+    This function matches the bones of the source skeleton to the bones the selected template needs, and writes a
+    new template folder for the source skeleton. The reference skeleton, if one is picked, is a rig the selected
+    template already works on and lets the rest positions and hierarchy count towards the matches.
+
+    :param object properties: The property group that contains variables that maintain the addon's correct state.
+    :param str template_name: The name of the new template folder.
+    :return tuple: The name of the new template folder, the bone matches and the template bone names that were not
+    matched.
+    """
+    source_object = bpy.data.objects.get(properties.source_skeleton_name)
+    if not source_object or source_object.type != 'ARMATURE':
+        raise LookupError('No source skeleton is selected')
+
+    reference_object = bpy.data.objects.get(properties.reference_skeleton_name)
+    reference = get_rig_shape(reference_object) if reference_object and reference_object.type == 'ARMATURE' else None
+
+    reference_template_folder_path = templates.get_template_folder_path(properties)
+    reference_names = get_template_bone_names(reference_template_folder_path)
+    matches = match_bones(reference_names, get_rig_shape(source_object), reference)
+
+    template_folder_path = templates.create_template_folder(template_name, properties)
+    write_template(template_folder_path, reference_template_folder_path, matches)
+
+    matched_names = {match.reference_name for match in matches}
+    return (
+        os.path.basename(template_folder_path),
+        matches,
+        [name for name in reference_names if name not in matched_names]
+    )
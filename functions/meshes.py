@@ -0,0 +1,204 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import bpy
+import bmesh
+import itertools
+
+from . import lazy
+from . import profiling
+
+numpy = lazy.import_module('numpy')
+
+
+# -------------- functions that remap the vertex groups of the meshes bound to an armature --------------
+def get_bound_meshes(obj):
+    """
+    This function gets the mesh objects that are deformed by the given armature object, either through an armature
+    modifier or an armature parent.
+
+    :param object obj: The armature object.
+    :return list: The mesh objects.
+    """
+    meshes = []
+    for mesh_object in bpy.data.objects:
+        if mesh_object.type != 'MESH':
+            continue
+
+        is_parented = mesh_object.parent == obj and mesh_object.parent_type == 'ARMATURE'
+        has_modifier = any(
+            modifier.type == 'ARMATURE' and modifier.object == obj
+            for modifier in mesh_object.modifiers
+        )
+        if is_parented or has_modifier:
+            meshes.append(mesh_object)
+    return meshes
+
+
+def get_vertex_group_weights(mesh, group_indices):
+    """
+    This function reads the weights of the given vertex groups. The weights have no array access like foreach_get,
+    so they are read from the deform layer of a bmesh copy of the mesh, which is made in one call and skips the rna
+    wrapper of every vertex and weight. The weights of every vertex are taken as one list, the lists are joined and
+    turned into arrays without a python loop, and the other groups are filtered out on the arrays.
+
+    :param object mesh: The mesh data.
+    :param set group_indices: The indices of the vertex groups to read.
+    :return tuple: The vertex indices, the group indices and the weights as flat arrays of the same length.
+    """
+    vertex_indices = numpy.zeros(0, dtype=numpy.int64)
+    groups = numpy.zeros(0, dtype=numpy.int64)
+    weights = numpy.zeros(0, dtype=numpy.float32)
+    if not group_indices:
+        return vertex_indices, groups, weights
+
+    bm = bmesh.new()
+    try:
+        bm.from_mesh(mesh)
+        deform_layer = bm.verts.layers.deform.active
+        if deform_layer is None:
+            return vertex_indices, groups, weights
+
+        vertex_weights = [vertex[deform_layer].items() for vertex in bm.verts]
+    finally:
+        bm.free()
+
+    counts = numpy.fromiter(map(len, vertex_weights), dtype=numpy.int64, count=len(vertex_weights))
+    elements = numpy.fromiter(
+        itertools.chain.from_iterable(itertools.chain.from_iterable(vertex_weights)),
+        dtype=numpy.float64,
+        count=int(counts.sum()) * 2
+    ).reshape(-1, 2)
+    vertex_indices = numpy.repeat(numpy.arange(len(vertex_weights), dtype=numpy.int64), counts)
+    groups = elements[:, 0].astype(numpy.int64)
+
+    selected = numpy.isin(groups, numpy.fromiter(group_indices, dtype=numpy.int64, count=len(group_indices)))
+    return vertex_indices[selected], groups[selected], elements[selected, 1].astype(numpy.float32)
+
+
+def set_vertex_group_weights(vertex_group, vertex_indices, weights):
+    """
+    This function writes weights to a vertex group. Vertices that share a weight are written in one call, so
+    the number of calls depends on the number of distinct weights rather than the number of vertices.
+
+    :param object vertex_group: The vertex group.
+    :param numpy.ndarray vertex_indices: The vertex indices.
+    :param numpy.ndarray weights: The weight of every vertex.
+    """
+    unique_weights, inverse = numpy.unique(weights, return_inverse=True)
+    order = numpy.argsort(inverse, kind='stable')
+    splits = numpy.cumsum(numpy.bincount(inverse, minlength=len(unique_weights)))[:-1]
+
+    for weight, indices in zip(unique_weights, numpy.split(vertex_indices[order], splits)):
+        vertex_group.add(indices.tolist(), float(weight), 'REPLACE')
+
+
+def remap_vertex_groups(mesh_object, renames):
+    """
+    This function applies rename rules to the vertex groups of a mesh object. A single source group is renamed to
+    the target, and the weights of several source groups are added up into the target and clamped to one.
+
+    :param object mesh_object: The mesh object.
+    :param tuple renames: The rename rules.
+    :return int: The number of vertex groups that were renamed or merged.
+    """
+    vertex_groups = mesh_object.vertex_groups
+    merges = []
+    changed_count = 0
+
+    for rename in renames:
+        source_groups = [
+            vertex_groups[name] for name in rename.source_bones
+            if name != rename.name and name in vertex_groups
+        ]
+        if not source_groups:
+            continue
+
+        target_group = vertex_groups.get(rename.name)
+        if target_group is None:
+            target_group = source_groups.pop(0)
+            target_group.name = rename.name
+            changed_count += 1
+
+        if source_groups:
+            merges.append((target_group, source_groups))
+
+    if not merges:
+        return changed_count
+
+    group_indices = {group.index for target_group, source_groups in merges for group in [target_group] + source_groups}
+    vertex_indices, groups, weights = get_vertex_group_weights(mesh_object.data, group_indices)
+    vertex_count = len(mesh_object.data.vertices)
+
+    for target_group, source_groups in merges:
+        source_mask = numpy.isin(groups, [group.index for group in source_groups])
+        merge_mask = source_mask | (groups == target_group.index)
+
+        totals = numpy.bincount(vertex_indices[merge_mask], weights=weights[merge_mask], minlength=vertex_count)
+        # only the vertices a source group contributed to need to be written
+        touched = numpy.unique(vertex_indices[source_mask])
+        set_vertex_group_weights(target_group, touched, numpy.minimum(totals[touched], 1.0).astype(numpy.float32))
+
+    # removing groups shifts the group indices, so it is done after all the weights were read and written
+    for target_group, source_groups in merges:
+        for source_group in source_groups:
+            vertex_groups.remove(source_group)
+            changed_count += 1
+
+    return changed_count
+
+
+def rename_bones(obj, renames):
+    """
+    This function applies rename rules to the bones of an armature object. The first source bone is renamed to the
+    target, unless the target already exists, and the other source bones stop deforming since their weights were
+    merged into the target. Renaming a bone also renames the f-curves that animate it.
+
+    :param object obj: The armature object.
+    :param tuple renames: The rename rules.
+    :return tuple: The old and new name of every renamed bone, and the number of merged bones.
+    """
+    bones = obj.data.bones
+    renamed_bone_names = []
+    merged_count = 0
+
+    for rename in renames:
+        source_bones = [bones[name] for name in rename.source_bones if name != rename.name and name in bones]
+        if not source_bones:
+            continue
+
+        if rename.name not in bones:
+            source_bone = source_bones.pop(0)
+            renamed_bone_names.append((source_bone.name, rename.name))
+            source_bone.name = rename.name
+
+        for source_bone in source_bones:
+            source_bone.use_deform = False
+            merged_count += 1
+
+    return renamed_bone_names, merged_count
+
+
+def apply_rename_rules(obj, renames):
+    """
+    This function applies rename rules to an armature object and to every mesh that is bound to it. The vertex
+    groups are remapped before the bones are renamed, so renaming the bones finds no vertex groups left to rename.
+    It must be called while the armature is not in edit mode.
+
+    :param object obj: The armature object.
+    :param tuple renames: The rename rules.
+    :return dict: The number of remapped meshes and vertex groups, the old and new name of every renamed bone and
+    the number of merged bones.
+    """
+    summary = {'meshes': 0, 'vertex_groups': 0, 'renamed_bones': [], 'merged_bones': 0}
+    if not renames:
+        return summary
+
+    for mesh_object in get_bound_meshes(obj):
+        with profiling.record('mesh', mesh_object.name):
+            changed_count = remap_vertex_groups(mesh_object, renames)
+        if changed_count:
+            summary['meshes'] += 1
+            summary['vertex_groups'] += changed_count
+
+    summary['renamed_bones'], summary['merged_bones'] = rename_bones(obj, renames)
+    return summary
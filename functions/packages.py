@@ -0,0 +1,306 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import zipfile
+
+from . import profiling
+
+MANIFEST_FILE_NAME = 'manifest.json'
+PACKAGE_FORMAT = 'ueskeleton-template'
+PACKAGE_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+
+
+class PackageError(Exception):
+    """
+    This exception is raised when a template package is damaged or was written by a newer version of the addon.
+    """
+
+
+# -------------- functions that describe the files of a template --------------
+def get_file_hash(file_object):
+    """
+    This function hashes a file in chunks, so large files are never read into memory at once.
+
+    :param object file_object: The file opened in binary mode.
+    :return tuple: The sha256 digest and the size of the file.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: file_object.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def get_template_file_names(template_folder_path):
+    """
+    This function lists the files of a template folder and its sub folders, without the manifest.
+
+    :param str template_folder_path: The full path to the template folder.
+    :return list: The file names relative to the template folder, with forward slashes.
+    """
+    file_names = []
+    for root, directories, names in os.walk(template_folder_path):
+        directories.sort()
+        for name in sorted(names):
+            file_name = os.path.relpath(os.path.join(root, name), template_folder_path).replace(os.sep, '/')
+            if file_name != MANIFEST_FILE_NAME:
+                file_names.append(file_name)
+    return file_names
+
+
+def create_manifest(template_folder_path, template_name):
+    """
+    This function creates the manifest of a template folder with the hash and size of every file.
+
+    :param str template_folder_path: The full path to the template folder.
+    :param str template_name: The name of the template.
+    :return dict: The manifest.
+    """
+    files = {}
+    for file_name in get_template_file_names(template_folder_path):
+        with open(os.path.join(template_folder_path, file_name), 'rb') as template_file:
+            sha256, size = get_file_hash(template_file)
+        files[file_name] = {'sha256': sha256, 'size': size}
+
+    return {
+        'format': PACKAGE_FORMAT,
+        'version': PACKAGE_VERSION,
+        'template_name': template_name,
+        'files': files
+    }
+
+
+def read_manifest(template_folder_path):
+    """
+    This function reads the manifest that was saved in an installed template folder.
+
+    :param str template_folder_path: The full path to the template folder.
+    :return dict: The manifest, or None if the folder has no readable manifest.
+    """
+    try:
+        with open(os.path.join(template_folder_path, MANIFEST_FILE_NAME)) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+
+def validate_file_name(file_name):
+    """
+    This function checks that a file name of a package stays inside the template folder.
+
+    :param str file_name: The file name relative to the template folder.
+    """
+    if file_name.startswith('/') or '\\' in file_name or ':' in file_name or '..' in file_name.split('/'):
+        raise PackageError('The package file "{}" is outside of the template folder'.format(file_name))
+
+
+def validate_manifest(manifest):
+    """
+    This function checks that a manifest can be read by this version of the addon.
+
+    :param dict manifest: The manifest.
+    """
+    if not isinstance(manifest, dict) or manifest.get('format') != PACKAGE_FORMAT:
+        raise PackageError('The package manifest is not a skeleton template manifest')
+    if not isinstance(manifest.get('version'), int) or manifest['version'] > PACKAGE_VERSION:
+        raise PackageError('The package was written by a newer version of the addon (version {})'.format(manifest.get('version')))
+    if not isinstance(manifest.get('files'), dict):
+        raise PackageError('The package manifest has no file list')
+
+    for file_name, entry in manifest['files'].items():
+        validate_file_name(file_name)
+        if not isinstance(entry, dict) or not isinstance(entry.get('sha256'), str) or not isinstance(entry.get('size'), int):
+            raise PackageError('The package file "{}" has no hash'.format(file_name))
+
+
+# -------------- functions that write and read template packages --------------
+def write_package(template_folder_path, package_file_path):
+    """
+    This function packs a template folder into a zip file with a manifest of the hash of every file. The package is
+    written under a temporary name and moved into place once it is complete.
+
+    :param str template_folder_path: The full path to the template folder.
+    :param str package_file_path: The full path to the zip file.
+    """
+    manifest = create_manifest(template_folder_path, os.path.basename(os.path.normpath(template_folder_path)))
+
+    temporary_file_path = '{}.{}.tmp'.format(package_file_path, uuid.uuid4().hex)
+    try:
+        with zipfile.ZipFile(temporary_file_path, 'w', zipfile.ZIP_DEFLATED) as package:
+            package.writestr(MANIFEST_FILE_NAME, json.dumps(manifest, indent=4))
+            for file_name in manifest['files']:
+                package.write(os.path.join(template_folder_path, file_name), file_name)
+        os.replace(temporary_file_path, package_file_path)
+    finally:
+        if os.path.exists(temporary_file_path):
+            os.remove(temporary_file_path)
+
+
+def read_package_manifest(package):
+    """
+    This function reads the manifest of a template package. Packages from before the manifest was added get one
+    without hashes, so their files are hashed while they are extracted.
+
+    :param object package: The opened zip file.
+    :return dict: The manifest.
+    """
+    try:
+        with package.open(MANIFEST_FILE_NAME) as manifest_file:
+            manifest = json.loads(manifest_file.read().decode('utf-8'))
+    except KeyError:
+        file_names = [info.filename for info in package.infolist() if not info.is_dir()]
+        for file_name in file_names:
+            validate_file_name(file_name)
+        return {'format': PACKAGE_FORMAT, 'version': 0, 'files': dict.fromkeys(file_names)}
+    except ValueError:
+        raise PackageError('The package manifest is not valid json')
+
+    validate_manifest(manifest)
+    return manifest
+
+
+def extract_file(package, file_name, entry, file_path):
+    """
+    This function streams a file out of a template package and checks its size and hash against the manifest
+    while it is written.
+
+    :param object package: The opened zip file.
+    :param str file_name: The name of the file in the package.
+    :param dict entry: The hash and size of the file from the manifest, or None if the package has no hashes.
+    :param str file_path: The full path to write the file to.
+    :return tuple: The sha256 digest and the size of the file.
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with package.open(file_name) as source_file, open(file_path, 'wb') as target_file:
+            for chunk in iter(lambda: source_file.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size += len(chunk)
+                target_file.write(chunk)
+    except KeyError:
+        raise PackageError('The package file "{}" is missing'.format(file_name))
+    except zipfile.BadZipFile as error:
+        raise PackageError('The package file "{}" is damaged: {}'.format(file_name, error))
+
+    if entry and (digest.hexdigest() != entry['sha256'] or size != entry['size']):
+        raise PackageError('The package file "{}" does not match its hash'.format(file_name))
+    return digest.hexdigest(), size
+
+
+def get_installed_hashes(template_folder_path):
+    """
+    This function gets the hashes of the files of an installed template. The hash saved in the manifest is used for
+    every file whose size and modification time did not change since it was installed, and other files are hashed
+    again.
+
+    :param str template_folder_path: The full path to the template folder.
+    :return dict: The sha256 digest by file name.
+    """
+    if not os.path.isdir(template_folder_path):
+        return {}
+
+    manifest = read_manifest(template_folder_path) or {}
+    entries = manifest.get('files') if isinstance(manifest.get('files'), dict) else {}
+
+    hashes = {}
+    for file_name in get_template_file_names(template_folder_path):
+        file_path = os.path.join(template_folder_path, file_name)
+        stat = os.stat(file_path)
+        entry = entries.get(file_name)
+        if isinstance(entry, dict) and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            hashes[file_name] = entry['sha256']
+        else:
+            with open(file_path, 'rb') as template_file:
+                hashes[file_name] = get_file_hash(template_file)[0]
+    return hashes
+
+
+def write_installed_manifest(template_folder_path, template_name, files):
+    """
+    This function saves the manifest of an installed template, with the modification time of every file so later
+    imports can trust the saved hashes.
+
+    :param str template_folder_path: The full path to the template folder.
+    :param str template_name: The name of the template.
+    :param dict files: The sha256 digest and size of every file, by file name.
+    """
+    for file_name, entry in files.items():
+        entry['mtime_ns'] = os.stat(os.path.join(template_folder_path, file_name)).st_mtime_ns
+
+    manifest = {'format': PACKAGE_FORMAT, 'version': PACKAGE_VERSION, 'template_name': template_name, 'files': files}
+    temporary_file_path = os.path.join(template_folder_path, '{}.{}.tmp'.format(MANIFEST_FILE_NAME, uuid.uuid4().hex))
+    with open(temporary_file_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=4)
+    os.replace(temporary_file_path, os.path.join(template_folder_path, MANIFEST_FILE_NAME))
+
+
+def install_package(package_file_path, template_folder_path):
+    """
+    This function installs a template package into a template folder. Every changed file is streamed into a staging
+    folder next to the template folder and checked against the manifest before anything is installed, so a damaged
+    package leaves the installed template as it was. A new template folder is moved into place as a whole, and an
+    installed template folder only has its changed files replaced and the files the package no longer has removed.
+
+    :param str package_file_path: The full path to the zip file.
+    :param str template_folder_path: The full path to the template folder.
+    :return dict: The number of written, unchanged and removed files.
+    """
+    summary = {'written': 0, 'unchanged': 0, 'removed': 0}
+    parent_path, template_name = os.path.split(os.path.normpath(template_folder_path))
+    staging_path = os.path.join(parent_path, '.{}.{}.tmp'.format(template_name, uuid.uuid4().hex))
+
+    try:
+        files = {}
+        staged_file_names = []
+        with profiling.record('file_read', package_file_path):
+            with zipfile.ZipFile(package_file_path) as package:
+                manifest = read_package_manifest(package)
+                installed_hashes = get_installed_hashes(template_folder_path)
+
+                for file_name, entry in manifest['files'].items():
+                    if entry and installed_hashes.get(file_name) == entry['sha256']:
+                        files[file_name] = {'sha256': entry['sha256'], 'size': entry['size']}
+                        summary['unchanged'] += 1
+                        continue
+
+                    staged_file_path = os.path.join(staging_path, file_name)
+                    sha256, size = extract_file(package, file_name, entry, staged_file_path)
+                    files[file_name] = {'sha256': sha256, 'size': size}
+
+                    # a package without hashes can only be compared once the file was hashed
+                    if installed_hashes.get(file_name) == sha256:
+                        os.remove(staged_file_path)
+                        summary['unchanged'] += 1
+                    else:
+                        staged_file_names.append(file_name)
+                        summary['written'] += 1
+
+        if not os.path.isdir(template_folder_path):
+            os.makedirs(staging_path, exist_ok=True)
+            write_installed_manifest(staging_path, template_name, files)
+            os.replace(staging_path, template_folder_path)
+            return summary
+
+        for file_name in staged_file_names:
+            file_path = os.path.join(template_folder_path, file_name)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            os.replace(os.path.join(staging_path, file_name), file_path)
+
+        for file_name in installed_hashes:
+            if file_name not in files:
+                os.remove(os.path.join(template_folder_path, file_name))
+                summary['removed'] += 1
+
+        # the manifest is written last, so an interrupted update is hashed again on the next import
+        write_installed_manifest(template_folder_path, template_name, files)
+        return summary
+    finally:
+        shutil.rmtree(staging_path, ignore_errors=True)
@@ -0,0 +1,128 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import json
+import time
+from contextlib import contextmanager
+
+_profile = {
+    'enabled': False,
+    'origin': time.perf_counter(),
+    'records': []
+}
+
+
+# -------------- functions that record where the conversion time goes --------------
+def set_enabled(enabled):
+    """
+    This function turns the recording on or off.
+
+    :param bool enabled: Whether timings are recorded.
+    """
+    _profile['enabled'] = bool(enabled)
+
+
+def is_enabled():
+    """
+    This function checks whether timings are recorded.
+
+    :return bool: True if timings are recorded.
+    """
+    return _profile['enabled']
+
+
+def clear():
+    """
+    This function removes all the recorded timings.
+    """
+    _profile['records'] = []
+    _profile['origin'] = time.perf_counter()
+
+
+@contextmanager
+def record(category, name):
+    """
+    This context manager records the wall time of its block when recording is turned on.
+
+    :param str category: The kind of work, for example 'stage', 'rule', 'mode_switch' or 'file_read'.
+    :param str name: What was timed, for example the stage name, the rule or the file path.
+    """
+    if not _profile['enabled']:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _profile['records'].append((category, name, start - _profile['origin'], end - start))
+
+
+def get_records():
+    """
+    This function gets the recorded timings.
+
+    :return list: Tuples of the category, name, start and duration in seconds.
+    """
+    return list(_profile['records'])
+
+
+def get_summary(top_count=10):
+    """
+    This function adds up the recorded timings of everything with the same category and name and returns the
+    entries that took the most time.
+
+    :param int top_count: The number of entries to return.
+    :return list: Tuples of the category, name, total seconds and number of calls, slowest first.
+    """
+    totals = {}
+    for category, name, start, seconds in _profile['records']:
+        total, calls = totals.get((category, name), (0.0, 0))
+        totals[(category, name)] = (total + seconds, calls + 1)
+
+    summary = [(category, name, total, calls) for (category, name), (total, calls) in totals.items()]
+    summary.sort(key=lambda entry: entry[2], reverse=True)
+    return summary[:top_count]
+
+
+def dump_json(file_path):
+    """
+    This function writes the recorded timings and their summary to a json file.
+
+    :param str file_path: The full path to the json file.
+    """
+    data = {
+        'records': [
+            {'category': category, 'name': name, 'start': start, 'seconds': seconds}
+            for category, name, start, seconds in _profile['records']
+        ],
+        'summary': [
+            {'category': category, 'name': name, 'seconds': total, 'calls': calls}
+            for category, name, total, calls in get_summary(len(_profile['records']))
+        ]
+    }
+    with open(file_path, 'w') as json_file:
+        json.dump(data, json_file, indent=4)
+
+
+def dump_chrome_trace(file_path):
+    """
+    This function writes the recorded timings in the chrome trace event format, which can be opened in
+    chrome://tracing or https://ui.perfetto.dev.
+
+    :param str file_path: The full path to the trace file.
+    """
+    events = []
+    for category, name, start, seconds in _profile['records']:
+        events.append({
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': start * 1e6,
+            'dur': seconds * 1e6,
+            'pid': 1,
+            'tid': 1
+        })
+
+    with open(file_path, 'w') as trace_file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
@@ -0,0 +1,385 @@
+# Copyright Wuguyannian All Rights Reserved.
+"""
+Templates from a shared repository. The repository is a directory, for example on a network share, or the url of an
+http server with the same layout. Its templates are mirrored into a local folder that the addon reads from, and
+every file is kept in a local cache by its sha256 hash, so the shared storage is only read by a background refresh.
+"""
+
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import threading
+import urllib.parse
+import urllib.request
+
+from . import packages
+from . import profiling
+from . import conversion_cache
+
+REPOSITORY_INDEX_FILE_NAME = 'index.json'
+REPOSITORY_STATE_FILE_NAME = '.repository.json'
+REPOSITORY_FORMAT = 'ueskeleton-repository'
+REPOSITORY_VERSION = 1
+CACHE_FILE_EXTENSION = '.blob'
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+REQUEST_TIMEOUT = 10.0
+
+_refresh = {'thread': None, 'result': None}
+
+
+# -------------- functions that read the shared repository --------------
+def get_mirror_path():
+    """
+    This function returns the folder the templates of the repository are mirrored into, which the addon reads the
+    templates from while a repository is set.
+
+    :return str: The full path to the mirror folder.
+    """
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'resources', 'template_repository')
+
+
+def get_cache_path():
+    """
+    This function returns the folder the files of the repository are cached in by their hash.
+
+    :return str: The full path to the repository cache folder.
+    """
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'resources', 'template_repository_cache')
+
+
+def is_url(location):
+    """
+    This function checks whether a repository location is the url of an http server rather than a directory.
+
+    :param str location: The repository location.
+    :return bool: True if the location is an http or https url.
+    """
+    return urllib.parse.urlparse(location).scheme in ('http', 'https')
+
+
+def read_repository_file(location, file_name):
+    """
+    This function reads a file from the repository.
+
+    :param str location: The repository directory or url.
+    :param str file_name: The name of the file relative to the repository, with forward slashes.
+    :return bytes: The content of the file.
+    """
+    with profiling.record('file_read', '{}/{}'.format(location, file_name)):
+        if is_url(location):
+            url = '{}/{}'.format(location.rstrip('/'), urllib.parse.quote(file_name))
+            with urllib.request.urlopen(url, timeout=REQUEST_TIMEOUT) as response:
+                return response.read()
+
+        with open(os.path.join(location, *file_name.split('/')), 'rb') as repository_file:
+            return repository_file.read()
+
+
+def create_repository_index(repository_path):
+    """
+    This function lists the files of every template in a repository directory with their hash and size.
+
+    :param str repository_path: The full path to the repository directory.
+    :return dict: The repository index.
+    """
+    template_names = sorted(
+        name for name in next(os.walk(repository_path), (None, [], None))[1]
+        if not name.startswith('.')
+    )
+    return {
+        'format': REPOSITORY_FORMAT,
+        'version': REPOSITORY_VERSION,
+        'templates': {
+            template_name: packages.create_manifest(os.path.join(repository_path, template_name), template_name)['files']
+            for template_name in template_names
+        }
+    }
+
+
+def write_repository_index(repository_path):
+    """
+    This function writes the index of a repository directory, which an http server has to serve next to the
+    templates. It must be written again whenever a template of the repository changes.
+
+    :param str repository_path: The full path to the repository directory.
+    :return dict: The repository index.
+    """
+    index = create_repository_index(repository_path)
+    temporary_file_path = os.path.join(repository_path, '{}.{}.tmp'.format(REPOSITORY_INDEX_FILE_NAME, uuid.uuid4().hex))
+    with open(temporary_file_path, 'w') as index_file:
+        json.dump(index, index_file, indent=4)
+    os.replace(temporary_file_path, os.path.join(repository_path, REPOSITORY_INDEX_FILE_NAME))
+    return index
+
+
+def read_repository_index(location):
+    """
+    This function reads the index of a repository. A repository directory without an index is indexed on the fly.
+
+    :param str location: The repository directory or url.
+    :return dict: The files of every template with their hash and size, by template name.
+    """
+    if not is_url(location) and not os.path.isfile(os.path.join(location, REPOSITORY_INDEX_FILE_NAME)):
+        index = create_repository_index(location)
+    else:
+        try:
+            index = json.loads(read_repository_file(location, REPOSITORY_INDEX_FILE_NAME).decode('utf-8'))
+        except ValueError:
+            raise packages.PackageError('The repository index is not valid json')
+
+    if not isinstance(index, dict) or index.get('format') != REPOSITORY_FORMAT:
+        raise packages.PackageError('The repository index is not a skeleton template repository index')
+    if not isinstance(index.get('version'), int) or index['version'] > REPOSITORY_VERSION:
+        raise packages.PackageError('The repository was written by a newer version of the addon (version {})'.format(index.get('version')))
+    if not isinstance(index.get('templates'), dict):
+        raise packages.PackageError('The repository index has no template list')
+
+    for template_name, files in index['templates'].items():
+        if not template_name or template_name.startswith('.') or template_name != os.path.basename(template_name):
+            raise packages.PackageError('The repository template "{}" is not a folder name'.format(template_name))
+        packages.validate_manifest({'format': packages.PACKAGE_FORMAT, 'version': packages.PACKAGE_VERSION, 'files': files})
+    return index['templates']
+
+
+# -------------- functions that keep the local cache of repository files --------------
+def get_cached_file(sha256, cache_path):
+    """
+    This function reads a file from the cache by its hash. A hit marks the file as recently used.
+
+    :param str sha256: The sha256 digest of the file.
+    :param str cache_path: The full path to the repository cache folder.
+    :return bytes: The content of the file, or None if it is not cached.
+    """
+    cache_file_path = os.path.join(cache_path, sha256 + CACHE_FILE_EXTENSION)
+    try:
+        with open(cache_file_path, 'rb') as cache_file:
+            data = cache_file.read()
+        os.utime(cache_file_path)
+    except OSError:
+        return None
+
+    # a damaged file is read from the repository again
+    return data if hashlib.sha256(data).hexdigest() == sha256 else None
+
+
+def store_cached_file(sha256, data, cache_path):
+    """
+    This function stores a file in the cache under its hash. The file is written under a temporary name and moved
+    into place, so several Blender sessions can share the cache.
+
+    :param str sha256: The sha256 digest of the file.
+    :param bytes data: The content of the file.
+    :param str cache_path: The full path to the repository cache folder.
+    """
+    os.makedirs(cache_path, exist_ok=True)
+    cache_file_path = os.path.join(cache_path, sha256 + CACHE_FILE_EXTENSION)
+    temporary_file_path = '{}.{}.tmp'.format(cache_file_path, uuid.uuid4().hex)
+    try:
+        with open(temporary_file_path, 'wb') as cache_file:
+            cache_file.write(data)
+        os.replace(temporary_file_path, cache_file_path)
+    finally:
+        if os.path.exists(temporary_file_path):
+            os.remove(temporary_file_path)
+
+
+def get_repository_file(location, template_name, file_name, entry, cache_path):
+    """
+    This function gets a template file from the cache, or reads it from the repository and caches it. Files read from
+    the repository are checked against the hash and size of the index.
+
+    :param str location: The repository directory or url.
+    :param str template_name: The name of the template.
+    :param str file_name: The name of the file relative to the template folder.
+    :param dict entry: The hash and size of the file from the index.
+    :param str cache_path: The full path to the repository cache folder.
+    :return bytes: The content of the file.
+    """
+    data = get_cached_file(entry['sha256'], cache_path)
+    if data is not None:
+        return data
+
+    data = read_repository_file(location, '{}/{}'.format(template_name, file_name))
+    if hashlib.sha256(data).hexdigest() != entry['sha256'] or len(data) != entry['size']:
+        raise packages.PackageError('The repository file "{}/{}" does not match its hash'.format(template_name, file_name))
+
+    store_cached_file(entry['sha256'], data, cache_path)
+    return data
+
+
+# -------------- functions that mirror the repository templates --------------
+def read_mirror_state(mirror_path):
+    """
+    This function reads the names of the templates that were mirrored from the repository, so templates that were
+    created or imported locally are never removed by a refresh.
+
+    :param str mirror_path: The full path to the mirror folder.
+    :return list: The names of the mirrored templates.
+    """
+    try:
+        with open(os.path.join(mirror_path, REPOSITORY_STATE_FILE_NAME)) as state_file:
+            return list(json.load(state_file).get('templates', []))
+    except (OSError, ValueError, AttributeError):
+        return []
+
+
+def write_mirror_state(mirror_path, location, template_names):
+    """
+    This function writes which repository was mirrored and which templates came from it.
+
+    :param str mirror_path: The full path to the mirror folder.
+    :param str location: The repository directory or url.
+    :param list template_names: The names of the mirrored templates.
+    """
+    temporary_file_path = os.path.join(mirror_path, '{}.{}.tmp'.format(REPOSITORY_STATE_FILE_NAME, uuid.uuid4().hex))
+    with open(temporary_file_path, 'w') as state_file:
+        json.dump({'location': location, 'templates': sorted(template_names)}, state_file, indent=4)
+    os.replace(temporary_file_path, os.path.join(mirror_path, REPOSITORY_STATE_FILE_NAME))
+
+
+def write_template_file(template_folder_path, file_name, data):
+    """
+    This function writes a file into a template folder under a temporary name and moves it into place.
+
+    :param str template_folder_path: The full path to the template folder.
+    :param str file_name: The name of the file relative to the template folder.
+    :param bytes data: The content of the file.
+    """
+    file_path = os.path.join(template_folder_path, *file_name.split('/'))
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    temporary_file_path = '{}.{}.tmp'.format(file_path, uuid.uuid4().hex)
+    with open(temporary_file_path, 'wb') as template_file:
+        template_file.write(data)
+    os.replace(temporary_file_path, file_path)
+
+
+def mirror_template(location, template_name, files, mirror_path, cache_path):
+    """
+    This function brings the mirror of one template up to date with the repository. Only the files whose hash
+    changed are written. A template that is new to the mirror is assembled in a staging folder and moved into place
+    as a whole, so the template list never shows a half written template.
+
+    :param str location: The repository directory or url.
+    :param str template_name: The name of the template.
+    :param dict files: The hash and size of every file of the template, by file name.
+    :param str mirror_path: The full path to the mirror folder.
+    :param str cache_path: The full path to the repository cache folder.
+    :return dict: The number of written and removed files.
+    """
+    summary = {'written': 0, 'removed': 0}
+    template_folder_path = os.path.join(mirror_path, template_name)
+    installed_hashes = packages.get_installed_hashes(template_folder_path)
+    changed_file_names = [file_name for file_name, entry in files.items() if installed_hashes.get(file_name) != entry['sha256']]
+    removed_file_names = [file_name for file_name in installed_hashes if file_name not in files]
+    if not changed_file_names and not removed_file_names and os.path.isdir(template_folder_path):
+        return summary
+
+    installed_files = {file_name: {'sha256': entry['sha256'], 'size': entry['size']} for file_name, entry in files.items()}
+    is_new = not os.path.isdir(template_folder_path)
+    target_path = os.path.join(mirror_path, '.{}.{}.tmp'.format(template_name, uuid.uuid4().hex)) if is_new else template_folder_path
+    try:
+        os.makedirs(target_path, exist_ok=True)
+        for file_name in changed_file_names:
+            write_template_file(target_path, file_name, get_repository_file(location, template_name, file_name, files[file_name], cache_path))
+            summary['written'] += 1
+        for file_name in removed_file_names:
+            os.remove(os.path.join(target_path, *file_name.split('/')))
+            summary['removed'] += 1
+
+        # the manifest is written last, so an interrupted refresh is hashed again on the next one
+        packages.write_installed_manifest(target_path, template_name, installed_files)
+        if is_new:
+            os.replace(target_path, template_folder_path)
+    finally:
+        if is_new:
+            shutil.rmtree(target_path, ignore_errors=True)
+    return summary
+
+
+def refresh(location, mirror_path=None, cache_path=None, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    This function mirrors every template of a repository. Templates that were mirrored before and are no longer in
+    the repository are removed, then the least recently used cached files are evicted until the cache fits its size.
+
+    :param str location: The repository directory or url.
+    :param str mirror_path: The full path to the mirror folder.
+    :param str cache_path: The full path to the repository cache folder.
+    :param int cache_size: The size limit of the repository cache in bytes.
+    :return dict: The number of templates and the number of written and removed files.
+    """
+    mirror_path = mirror_path or get_mirror_path()
+    cache_path = cache_path or get_cache_path()
+    os.makedirs(mirror_path, exist_ok=True)
+
+    repository_templates = read_repository_index(location)
+    summary = {'templates': len(repository_templates), 'written': 0, 'removed': 0}
+    for template_name, files in sorted(repository_templates.items()):
+        template_summary = mirror_template(location, template_name, files, mirror_path, cache_path)
+        summary['written'] += template_summary['written']
+        summary['removed'] += template_summary['removed']
+
+    for template_name in read_mirror_state(mirror_path):
+        if template_name not in repository_templates:
+            shutil.rmtree(os.path.join(mirror_path, template_name), ignore_errors=True)
+            summary['removed'] += 1
+
+    # the state is only written when it changed, so the mirror folder keeps its modification time
+    if read_mirror_state(mirror_path) != sorted(repository_templates):
+        write_mirror_state(mirror_path, location, repository_templates)
+    conversion_cache.evict(cache_path, cache_size, CACHE_FILE_EXTENSION)
+    return summary
+
+
+# -------------- functions that refresh the mirror in the background --------------
+def run_refresh(location, cache_size):
+    """
+    This function is the body of the background refresh thread. It keeps the summary or the error of the refresh
+    for the main thread to pick up.
+
+    :param str location: The repository directory or url.
+    :param int cache_size: The size limit of the repository cache in bytes.
+    """
+    try:
+        result = dict(refresh(location, cache_size=cache_size), location=location, error='')
+    except (OSError, ValueError, packages.PackageError) as error:
+        result = {'location': location, 'error': '{}: {}'.format(type(error).__name__, error)}
+    _refresh['result'] = result
+
+
+def start_refresh(location, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    This function starts refreshing the mirror in a background thread, unless a refresh is already running. The
+    thread only reads the repository and writes files, it never touches blender data.
+
+    :param str location: The repository directory or url.
+    :param int cache_size: The size limit of the repository cache in bytes.
+    :return bool: True if a refresh was started.
+    """
+    if is_refreshing():
+        return False
+
+    thread = threading.Thread(target=run_refresh, args=(location, cache_size), name='ueskeleton repository refresh', daemon=True)
+    _refresh['thread'] = thread
+    thread.start()
+    return True
+
+
+def is_refreshing():
+    """
+    This function checks whether a background refresh is running.
+
+    :return bool: True if a refresh is running.
+    """
+    return _refresh['thread'] is not None and _refresh['thread'].is_alive()
+
+
+def get_refresh_result():
+    """
+    This function gets the outcome of the last background refresh.
+
+    :return dict: The repository location with the summary or the error of the refresh, or None if no refresh
+    finished yet.
+    """
+    return _refresh['result']
@@ -1,10 +1,762 @@
 import bpy
-import mathutils
+import time
 import math
+import fnmatch
 
+from . import lazy
+from . import kernel
+from . import adapter
+from . import meshes
+from . import history
+from . import animation
+from . import profiling
+from . import conversion_cache
 from . import utilities
 from . import templates
 
+numpy = lazy.import_module('numpy')
+
+# a pool of worker processes takes a while to start, so smaller batches are converted in the edit session
+PRECOMPUTE_ARMATURE_COUNT = 4
+
+
+def get_orientation_rules(plan, hierarchy):
+    """
+    This function resolves the bone names of the orientation rules to bone indices.
+
+    :param CompiledTemplate plan: The compiled template.
+    :param HierarchyIndex hierarchy: The hierarchy index of the armature.
+    :return list: The orientation rules in the form the kernel applies them.
+    """
+    return kernel.resolve_orientation_rules(hierarchy, adapter.get_kernel_orientations(plan.orientations))
+
+
+def check_conversion_plan(plan, bone_names, removed_bone_names=()):
+    """
+    This function checks that every bone the rules of a compiled template refer to exists before anything is
+    changed. Creation rules may refer to bones that earlier creation rules create.
+
+    :param CompiledTemplate plan: The compiled template.
+    :param list bone_names: The names of the bones of the armature.
+    :param tuple removed_bone_names: The names of the bones that are removed before the bones are created.
+    """
+    missing_bone_names = []
+    available_bone_names = set(bone_names)
+
+    for orientation in plan.orientations:
+        if orientation.name not in available_bone_names:
+            missing_bone_names.append(orientation.name)
+
+    available_bone_names.difference_update(removed_bone_names)
+    for creation in plan.creations:
+        for bone_name in (creation.source_bone, creation.parent_bone, creation.end_bone):
+            if bone_name and bone_name not in available_bone_names:
+                missing_bone_names.append(bone_name)
+        available_bone_names.add(creation.name)
+
+    if missing_bone_names:
+        raise KeyError('bones not found: {}'.format(', '.join(
+            '"{}"'.format(bone_name) for bone_name in sorted(set(missing_bone_names))
+        )))
+
+
+def apply_creation_rules(edit_bones, bone_arrays, creations, removed_bone_names=()):
+    """
+    This function removes the given bones, works out the bones of the creation rules with the kernel and writes the
+    rest data of every bone to the edit bones in one pass. It must be called while the armature is in edit mode.
+
+    :param object edit_bones: The edit bones collection of the armature that is being converted.
+    :param BoneArrays bone_arrays: The rest data of the edit bones after the orientation rules.
+    :param tuple creations: The creation rules.
+    :param tuple removed_bone_names: The names of the bones to remove before the bones are created.
+    :return list: The names of the created bones.
+    """
+    bones = {bone.name: bone for bone in edit_bones}
+    remove_bones(edit_bones, bones, removed_bone_names)
+    if len(bones) != len(bone_arrays.names):
+        bone_arrays = kernel.select_bones(bone_arrays, [name for name in bone_arrays.names if name in bones])
+
+    converted_arrays = kernel.apply_creation_rules(bone_arrays, adapter.get_kernel_creations(creations))
+    return adapter.write_bone_arrays(edit_bones, converted_arrays, creations)
+
+
+def solve_orientation_rules(bone_arrays, hierarchy, rules):
+    """
+    This function applies orientation rules to bone arrays. When profiling is turned on the rules are applied one
+    by one, so the time of every rule is recorded.
+
+    :param BoneArrays bone_arrays: The rest data of the armature. Updated in place.
+    :param HierarchyIndex hierarchy: The hierarchy index of the armature.
+    :param list rules: The orientation rules in the form the kernel applies them.
+    """
+    if not profiling.is_enabled():
+        kernel.apply_orientation_rules(
+            bone_arrays.heads,
+            bone_arrays.tails,
+            bone_arrays.rolls,
+            bone_arrays.connected,
+            hierarchy,
+            rules
+        )
+        return
+
+    for rule in rules:
+        with profiling.record('rule', 'orientation {}'.format(bone_arrays.names[rule[0]])):
+            kernel.apply_orientation_rules(
+                bone_arrays.heads,
+                bone_arrays.tails,
+                bone_arrays.rolls,
+                bone_arrays.connected,
+                hierarchy,
+                [rule]
+            )
+
+
+def get_cache_size():
+    """
+    This function gets the size limit of the conversion cache from the addon preferences.
+
+    :return int: The size limit in bytes, or None if the conversion cache is turned off.
+    """
+    preferences = utilities.get_addon_preferences()
+    if not preferences.use_conversion_cache:
+        return None
+    return preferences.conversion_cache_size * 1024 * 1024
+
+
+def load_cached_orientations(bone_arrays, plan):
+    """
+    This function looks up the solved orientations of an armature in the conversion cache.
+
+    :param BoneArrays bone_arrays: The rest data of the armature. Updated in place on a cache hit.
+    :param CompiledTemplate plan: The compiled template.
+    :return tuple: Whether the cache had the orientations, and the cache key to store them under otherwise.
+    """
+    key = conversion_cache.get_cache_key(bone_arrays, templates.get_rules_digest(plan.orientations))
+    cached = conversion_cache.load(key, len(bone_arrays.names))
+    if cached is None:
+        return False, key
+
+    bone_arrays.heads[:], bone_arrays.tails[:], bone_arrays.rolls[:] = cached
+    return True, key
+
+
+def store_cached_orientations(key, bone_arrays, cache_size):
+    """
+    This function stores solved orientations in the conversion cache. A cache that can not be written does not stop
+    the conversion.
+
+    :param str key: The cache key.
+    :param BoneArrays bone_arrays: The rest data of the armature after the orientation rules were solved.
+    :param int cache_size: The size limit of the conversion cache in bytes.
+    """
+    try:
+        conversion_cache.store(key, bone_arrays, size_limit=cache_size)
+    except OSError:
+        pass
+
+
+def remove_bones(edit_bones, bones, bone_names):
+    """
+    This function removes edit bones by name. It must be called while the armature is in edit mode.
+
+    :param object edit_bones: The edit bones collection of the armature that is being converted.
+    :param dict bones: The edit bones of the armature by name. The removed bones are removed from it.
+    :param tuple bone_names: The names of the bones to remove.
+    """
+    for bone_name in bone_names:
+        if bone_name in bones:
+            edit_bones.remove(bones.pop(bone_name))
+
+
+def apply_conversion_plan(edit_bones, plan, cache_size=None, delta=None, converted_arrays=None):
+    """
+    This function applies every rule of a compiled template to the given edit bones. It must be called while the
+    armature is in edit mode.
+
+    :param object edit_bones: The edit bones collection of the armature that is being converted.
+    :param CompiledTemplate plan: The compiled template.
+    :param int cache_size: The size limit of the conversion cache in bytes, or None to solve without the cache.
+    :param ConversionDelta delta: The snapshot to restore and the bones to remove before the rules are applied.
+    :param BoneArrays converted_arrays: The rest data the kernel already converted before the edit session, or None
+    to apply the rules here.
+    :return tuple: The bone arrays of the existing bones before and after the conversion, and the names of the
+    created bones.
+    """
+    with profiling.record('stage', 'read bones'):
+        bone_arrays = utilities.get_edit_bone_arrays(edit_bones)
+        original_arrays = kernel.copy_bone_arrays(bone_arrays)
+        hierarchy = kernel.build_hierarchy_index(bone_arrays.names, bone_arrays.parents)
+
+    # the precomputed rest data is only used if the bones did not change since it was read
+    if converted_arrays is not None and converted_arrays.names[:len(bone_arrays.names)] == bone_arrays.names:
+        with profiling.record('stage', 'creation'):
+            created_bone_names = adapter.write_bone_arrays(edit_bones, converted_arrays, plan.creations)
+
+        bone_arrays = kernel.select_bones(converted_arrays, bone_arrays.names)
+        if plan.orientations and cache_size is not None:
+            key = conversion_cache.get_cache_key(original_arrays, templates.get_rules_digest(plan.orientations))
+            store_cached_orientations(key, bone_arrays, cache_size)
+        return original_arrays, bone_arrays, created_bone_names
+
+    is_restored = bool(delta and delta.snapshot)
+    if is_restored:
+        history.restore_snapshot(bone_arrays, delta.snapshot, delta.renamed_bones)
+
+    # 1.process the orientation
+    if plan.orientations or is_restored:
+        with profiling.record('stage', 'orientation'):
+            is_cached, key = False, None
+            if plan.orientations and cache_size is not None:
+                is_cached, key = load_cached_orientations(bone_arrays, plan)
+            if plan.orientations and not is_cached:
+                solve_orientation_rules(bone_arrays, hierarchy, get_orientation_rules(plan, hierarchy))
+                if key:
+                    store_cached_orientations(key, bone_arrays, cache_size)
+
+    # 2.process the ik creation, which also writes the solved orientations
+    with profiling.record('stage', 'creation'):
+        created_bone_names = apply_creation_rules(
+            edit_bones, bone_arrays, plan.creations, delta.removed_bone_names if delta else ()
+        )
+
+    return original_arrays, bone_arrays, created_bone_names
+
+
+class ConversionSession:
+    """
+    This class splits the conversion of an armature into stages that can be spread over many event loop ticks. The
+    orientation rules are solved on arrays first, then the bones are written in one edit session, the actions are
+    re-baked one at a time and last the bones and vertex groups are renamed and the conversion is recorded. A session
+    that is cancelled after the bones were written puts the rest pose and the re-baked actions back.
+    """
+
+    def __init__(self, obj, plan, rebake_animation=False, cache_size=None, template_name=None):
+        """
+        This function reads the rest data of the armature and resolves the rules, so missing bones are reported
+        before any step runs.
+
+        :param object obj: The armature object to convert.
+        :param CompiledTemplate plan: The compiled template.
+        :param bool rebake_animation: Whether the actions of the armature are re-baked after the bones are written.
+        :param int cache_size: The size limit of the conversion cache in bytes, or None to solve without the cache.
+        :param str template_name: The name of the template folder. If given, only the rules that changed since the
+        last conversion of the armature are applied, and the conversion is recorded.
+        """
+        self.object_name = obj.name
+        self.full_plan = plan
+        self.cache_size = cache_size
+        self.template_name = template_name
+        self.delta = history.get_conversion_delta(obj, plan) if template_name else None
+        self.plan = self.delta.plan if self.delta else plan
+        check_conversion_plan(self.plan, obj.data.bones.keys(), self.delta.removed_bone_names if self.delta else ())
+
+        # the bones only hold the edits of an armature in edit mode once they are flushed
+        if obj.mode == 'EDIT':
+            obj.update_from_editmode()
+        self.bone_arrays = adapter.read_bone_arrays(obj)
+
+        if self.delta and self.delta.snapshot:
+            history.restore_snapshot(self.bone_arrays, self.delta.snapshot, self.delta.renamed_bones)
+
+        self.hierarchy = kernel.build_hierarchy_index(self.bone_arrays.names, self.bone_arrays.parents)
+        is_cached, self.cache_key = False, None
+        if self.plan.orientations and cache_size is not None:
+            is_cached, self.cache_key = load_cached_orientations(self.bone_arrays, self.plan)
+
+        # cached orientations are already solved, so the bones can be written right away
+        self.rules = [] if is_cached else get_orientation_rules(self.plan, self.hierarchy)
+        self.solved_rules = 0
+
+        self.action_names = [action.name for action in animation.get_armature_actions(obj)] if rebake_animation else []
+        self.rebaked_action_names = []
+        self.rest_pose_deltas = {}
+        self.rotation_modes = {}
+
+        # set once the bones are written
+        self.snapshot = None
+        self.original_arrays = None
+        self.created_bone_names = None
+        self.is_renaming = False
+        self.is_finished = False
+
+        # writing the bones and renaming them are one step each
+        self.total_steps = len(self.rules) + 1 + len(self.action_names) + 1
+
+    @property
+    def is_solved(self):
+        """
+        Whether all the orientation rules have been solved.
+        """
+        return self.solved_rules == len(self.rules)
+
+    @property
+    def is_written(self):
+        """
+        Whether the converted bones have been written to the armature.
+        """
+        return self.snapshot is not None
+
+    @property
+    def stage(self):
+        """
+        The name of the stage the next step runs.
+        """
+        if self.is_finished:
+            return 'finished'
+        if not self.is_solved:
+            return 'solve'
+        if not self.is_written:
+            return 'write'
+        if len(self.rebaked_action_names) < len(self.action_names):
+            return 'rebake'
+        return 'rename'
+
+    @property
+    def done_steps(self):
+        """
+        The number of steps that are done.
+        """
+        return self.solved_rules + self.is_written + len(self.rebaked_action_names) + self.is_finished
+
+    def get_object(self):
+        """
+        This function gets the armature object of the session.
+
+        :return object: The armature object.
+        """
+        obj = bpy.data.objects.get(self.object_name)
+        if not obj or obj.type != 'ARMATURE':
+            raise LookupError('The armature "{}" no longer exists'.format(self.object_name))
+        return obj
+
+    def step(self, seconds):
+        """
+        This function runs the next stage of the conversion. Orientation rules are solved and actions are re-baked
+        until the given time budget is used up, writing the bones and renaming them take a step of their own. A step
+        never runs into the next stage, so the caller can react to events between the stages.
+
+        :param float seconds: The time budget of this step.
+        :return int: The number of steps that are done.
+        """
+        stage = self.stage
+        if stage == 'write':
+            self.write_bones()
+        elif stage == 'rename':
+            self.rename_bones()
+        else:
+            end = time.perf_counter() + seconds
+            while self.stage == stage and time.perf_counter() < end:
+                if stage == 'solve':
+                    solve_orientation_rules(self.bone_arrays, self.hierarchy, self.rules[self.solved_rules:self.solved_rules + 1])
+                    self.solved_rules += 1
+                else:
+                    self.rebake_next_action()
+
+        return self.done_steps
+
+    def write_bones(self):
+        """
+        This function writes the solved orientations to the armature and creates the new bones in one edit session.
+        If anything fails the edit bones are restored from a snapshot taken before they were written.
+        """
+        obj = self.get_object()
+        with profiling.record('stage', 'commit {}'.format(self.object_name)), utilities.edit_session(obj) as edit_bones:
+            original_arrays = utilities.get_edit_bone_arrays(edit_bones)
+            if sorted(original_arrays.names) != sorted(self.bone_arrays.names):
+                raise RuntimeError('The bones of "{}" changed during the conversion'.format(self.object_name))
+
+            # the edit bones can be listed in another order than the bones the arrays were read from
+            if original_arrays.names != self.bone_arrays.names:
+                self.bone_arrays = kernel.select_bones(self.bone_arrays, original_arrays.names)
+
+            snapshot = utilities.get_edit_bone_snapshot(edit_bones)
+            try:
+                self.created_bone_names = apply_creation_rules(
+                    edit_bones, self.bone_arrays, self.plan.creations, self.delta.removed_bone_names if self.delta else ()
+                )
+            except Exception:
+                utilities.restore_edit_bone_snapshot(edit_bones, snapshot)
+                raise
+
+        self.snapshot = snapshot
+        self.original_arrays = original_arrays
+        if self.cache_key and self.rules:
+            store_cached_orientations(self.cache_key, self.bone_arrays, self.cache_size)
+
+        if self.action_names:
+            self.rest_pose_deltas = animation.get_rest_pose_deltas(original_arrays, self.bone_arrays)
+            self.rotation_modes = {pose_bone.name: pose_bone.rotation_mode for pose_bone in obj.pose.bones}
+
+    def rebake_next_action(self):
+        """
+        This function re-bakes the next action of the armature to the converted rest pose.
+        """
+        action_name = self.action_names[len(self.rebaked_action_names)]
+        action = bpy.data.actions.get(action_name)
+        if action and self.rest_pose_deltas:
+            with profiling.record('rebake', action_name):
+                animation.rebake_action(action, self.rest_pose_deltas, self.rotation_modes)
+        self.rebaked_action_names.append(action_name)
+
+    def rename_bones(self):
+        """
+        This function renames the bones and the vertex groups of the bound meshes and records the conversion. This is
+        the last step, and renamed bones and merged vertex groups can not be put back, so the session can no longer
+        be rolled back once it started.
+        """
+        obj = self.get_object()
+        self.is_renaming = True
+        renamed_bone_names = finish_conversion(obj, self.plan, self.original_arrays, self.bone_arrays, False)
+        if self.template_name:
+            history.record_conversion(
+                obj,
+                self.template_name,
+                self.full_plan,
+                self.delta,
+                self.snapshot,
+                self.created_bone_names,
+                renamed_bone_names
+            )
+        self.is_finished = True
+
+    def commit(self):
+        """
+        This function runs every stage that is left in one go.
+        """
+        while not self.is_finished:
+            self.step(float('inf'))
+
+    def cancel(self):
+        """
+        This function rolls back a session that is stopped before it finished. Nothing has to be undone before the
+        bones are written, afterwards the actions that were already re-baked are re-baked back to the original rest
+        pose and the edit bones are restored from the snapshot.
+        """
+        if self.is_finished or self.is_renaming or not self.is_written:
+            return
+
+        obj = self.get_object()
+        if self.rest_pose_deltas:
+            deltas = animation.get_rest_pose_deltas(self.bone_arrays, self.original_arrays)
+            for action_name in self.rebaked_action_names:
+                action = bpy.data.actions.get(action_name)
+                if action:
+                    animation.rebake_action(action, deltas, self.rotation_modes)
+
+        with utilities.edit_session(obj) as edit_bones:
+            utilities.restore_edit_bone_snapshot(edit_bones, self.snapshot)
+
+        self.snapshot = None
+        self.rebaked_action_names = []
+
+
+def finish_conversion(obj, plan, original_arrays, converted_arrays, rebake_animation, rebaked_actions=None):
+    """
+    This function runs the stages that follow the edit session of a conversion. The actions are re-baked while the
+    bones still have their original names, then the bones and the vertex groups of the bound meshes are renamed.
+
+    :param object obj: The converted armature object.
+    :param CompiledTemplate plan: The compiled template.
+    :param BoneArrays original_arrays: The bone arrays before the conversion.
+    :param BoneArrays converted_arrays: The bone arrays after the conversion.
+    :param bool rebake_animation: Whether the actions of the armature are re-baked to the converted rest pose.
+    :param set rebaked_actions: The names of the actions that were already re-baked in the same batch.
+    :return list: The old and new name of every renamed bone.
+    """
+    # 3.process the animation
+    if rebake_animation:
+        with profiling.record('stage', 'rebake animation'):
+            animation.rebake_actions(obj, original_arrays, converted_arrays, rebaked_actions)
+
+    # 4.process the bone and vertex group renaming
+    if not plan.renames:
+        return []
+
+    with profiling.record('stage', 'rename'):
+        return meshes.apply_rename_rules(obj, plan.renames)['renamed_bones']
+
+
+def prepare_conversion(obj, plan, template_name=None):
+    """
+    This function works out which rules a conversion applies and checks that every bone they refer to exists,
+    before anything is changed.
+
+    :param object obj: The armature object to convert.
+    :param CompiledTemplate plan: The compiled template.
+    :param str template_name: The name of the template folder. If given, only the rules that changed since the last
+    conversion of the armature are applied.
+    :return ConversionDelta: The rules to apply, or None if the whole template is applied without a record.
+    """
+    delta = history.get_conversion_delta(obj, plan) if template_name else None
+    check_conversion_plan(delta.plan if delta else plan, obj.data.bones.keys(), delta.removed_bone_names if delta else ())
+    return delta
+
+
+def apply_conversion_plan_safely(edit_bones, plan, cache_size=None, delta=None, converted_arrays=None):
+    """
+    This function applies a compiled template to edit bones and restores the edit bones from a snapshot if anything
+    fails. It must be called while the armature is in edit mode.
+
+    :param object edit_bones: The edit bones collection of the armature that is being converted.
+    :param CompiledTemplate plan: The compiled template.
+    :param int cache_size: The size limit of the conversion cache in bytes, or None to solve without the cache.
+    :param ConversionDelta delta: The snapshot to restore and the bones to remove before the rules are applied.
+    :param BoneArrays converted_arrays: The rest data the kernel already converted before the edit session, or None
+    to apply the rules here.
+    :return tuple: The snapshot of the edit bones, the bone arrays before and after the conversion, and the names
+    of the created bones.
+    """
+    snapshot = utilities.get_edit_bone_snapshot(edit_bones)
+    try:
+        original_arrays, converted_arrays, created_bone_names = apply_conversion_plan(
+            edit_bones, delta.plan if delta else plan, cache_size, delta, converted_arrays
+        )
+    except Exception:
+        utilities.restore_edit_bone_snapshot(edit_bones, snapshot)
+        raise
+    return snapshot, original_arrays, converted_arrays, created_bone_names
+
+
+def precompute_conversions(prepared, plan, cache_size=None):
+    """
+    This function converts the rest data of the armatures of a batch in a pool of worker processes before the edit
+    session. Only the armatures that get the whole template applied to their rest pose are converted this way, the
+    ones that are restored to a snapshot first or whose orientations are in the conversion cache are converted in
+    the edit session.
+
+    :param list prepared: The armature objects and the rules to apply to them.
+    :param CompiledTemplate plan: The compiled template.
+    :param int cache_size: The size limit of the conversion cache in bytes, or None to solve without the cache.
+    :return dict: The converted rest data by armature object name.
+    """
+    objects = []
+    for obj, delta in prepared:
+        if delta and (delta.plan is not plan or delta.snapshot):
+            continue
+        if plan.orientations and cache_size is not None:
+            if load_cached_orientations(adapter.read_bone_arrays(obj), plan)[0]:
+                continue
+        objects.append(obj)
+
+    if len(objects) < PRECOMPUTE_ARMATURE_COUNT:
+        return {}
+
+    with profiling.record('stage', 'precompute {} armatures'.format(len(objects))):
+        try:
+            return adapter.precompute_conversions(objects, plan)
+        except (OSError, RuntimeError):
+            # a pool that can not start or whose workers died leaves the conversions to the edit session
+            return {}
+
+
+def complete_conversion(obj, plan, delta, template_name, rebake_animation, result, rebaked_actions=None):
+    """
+    This function runs the stages that follow the edit session and records the conversion.
+
+    :param object obj: The converted armature object.
+    :param CompiledTemplate plan: The compiled template.
+    :param ConversionDelta delta: The part of the template that was applied, or None if all of it was.
+    :param str template_name: The name of the template folder. The conversion is only recorded if it is given.
+    :param bool rebake_animation: Whether the actions of the armature are re-baked to the converted rest pose.
+    :param tuple result: What apply_conversion_plan_safely returned.
+    :param set rebaked_actions: The names of the actions that were already re-baked in the same batch.
+    """
+    snapshot, original_arrays, converted_arrays, created_bone_names = result
+    renamed_bone_names = finish_conversion(
+        obj, delta.plan if delta else plan, original_arrays, converted_arrays, rebake_animation, rebaked_actions
+    )
+    if template_name:
+        history.record_conversion(
+            obj,
+            template_name,
+            plan,
+            delta,
+            snapshot,
+            created_bone_names,
+            renamed_bone_names
+        )
+
+
+def convert_armature(obj, plan, rebake_animation=False, cache_size=None, template_name=None):
+    """
+    This function converts the given armature object with the given plan inside a single edit session.
+
+    :param object obj: The armature object to convert.
+    :param CompiledTemplate plan: The compiled template.
+    :param bool rebake_animation: Whether the actions of the armature are re-baked to the converted rest pose.
+    :param int cache_size: The size limit of the conversion cache in bytes, or None to solve without the cache.
+    :param str template_name: The name of the template folder. If given, only the rules that changed since the last
+    conversion of the armature are applied, and the conversion is recorded.
+    """
+    delta = prepare_conversion(obj, plan, template_name)
+
+    with profiling.record('stage', 'convert {}'.format(obj.name)):
+        with utilities.edit_session(obj) as edit_bones:
+            result = apply_conversion_plan_safely(edit_bones, plan, cache_size, delta)
+
+        complete_conversion(obj, plan, delta, template_name, rebake_animation, result)
+
+
+def convert_armatures(objects, plan, rebake_animation=False, cache_size=None, template_name=None):
+    """
+    This function converts several armature objects with the same plan inside one multi object edit session, so
+    all of them cost one mode switch in and one mode switch out. The rest data of larger batches is converted in a
+    pool of worker processes before the edit session. An armature that fails is restored and reported without
+    stopping the others.
+
+    :param list objects: The armature objects to convert.
+    :param CompiledTemplate plan: The compiled template.
+    :param bool rebake_animation: Whether the actions of the armatures are re-baked to the converted rest pose.
+    :param int cache_size: The size limit of the conversion cache in bytes, or None to solve without the cache.
+    :param str template_name: The name of the template folder. If given, only the rules that changed since the last
+    conversion of every armature are applied, and the conversions are recorded.
+    :return list: The name, status and message of every armature.
+    """
+    results = []
+    prepared = []
+    armatures = set()
+    for obj in objects:
+        if obj.data in armatures:
+            results.append({'name': obj.name, 'status': 'SKIPPED', 'message': 'shares its armature with another object'})
+            continue
+        if not obj.visible_get():
+            results.append({'name': obj.name, 'status': 'SKIPPED', 'message': 'is hidden'})
+            continue
+
+        try:
+            prepared.append((obj, prepare_conversion(obj, plan, template_name)))
+            armatures.add(obj.data)
+        except KeyError as error:
+            results.append({'name': obj.name, 'status': 'FAILED', 'message': str(error)})
+
+    if not prepared:
+        return results
+
+    converted = []
+    # an action shared by several of the armatures is only re-baked by the first of them
+    rebaked_actions = set()
+    with profiling.record('stage', 'convert {} armatures'.format(len(prepared))):
+        precomputed = precompute_conversions(prepared, plan, cache_size)
+        with utilities.edit_session_many([obj for obj, delta in prepared]) as edit_bones_collections:
+            for (obj, delta), edit_bones in zip(prepared, edit_bones_collections):
+                try:
+                    with profiling.record('stage', 'convert {}'.format(obj.name)):
+                        result = apply_conversion_plan_safely(
+                            edit_bones, plan, cache_size, delta, precomputed.get(obj.name)
+                        )
+                        converted.append((obj, delta, result))
+                except Exception as error:
+                    results.append({'name': obj.name, 'status': 'FAILED', 'message': str(error)})
+
+        for obj, delta, result in converted:
+            try:
+                complete_conversion(obj, plan, delta, template_name, rebake_animation, result, rebaked_actions)
+            except Exception as error:
+                results.append({'name': obj.name, 'status': 'FAILED', 'message': str(error)})
+                continue
+
+            applied_plan = delta.plan if delta else plan
+            results.append({
+                'name': obj.name,
+                'status': 'FINISHED',
+                'message': '{} rules applied, {} bones created'.format(len(applied_plan.orientations), len(result[3]))
+            })
+
+    return sorted(results, key=lambda result: result['name'])
+
+
+def restore_armature(obj, rebake_animation=False):
+    """
+    This function restores an armature object to how it was before its first recorded conversion. Renamed bones get
+    their names back, created bones are removed and the rest data, parents and flags are written back in one edit
+    session. Merged vertex groups stay merged.
+
+    :param object obj: The converted armature object.
+    :param bool rebake_animation: Whether the actions of the armature are re-baked to the restored rest pose.
+    """
+    record = history.get_conversion_record(obj)
+    if record is None or not record.snapshot:
+        raise LookupError('The armature "{}" has no recorded conversion to restore'.format(obj.name))
+
+    snapshot = history.decode_snapshot(record.snapshot)
+    with profiling.record('stage', 'restore {}'.format(obj.name)):
+        # renaming the bones back also renames their vertex groups and f-curves
+        bones = obj.data.bones
+        for entry in record.renamed_bones:
+            if entry.value in bones and entry.name not in bones:
+                bones[entry.value].name = entry.name
+
+        with utilities.edit_session(obj) as edit_bones:
+            converted_arrays = utilities.get_edit_bone_arrays(edit_bones)
+            utilities.restore_edit_bone_snapshot(edit_bones, snapshot)
+            restored_arrays = utilities.get_edit_bone_arrays(edit_bones)
+
+        if rebake_animation:
+            converted_bone_names = set(converted_arrays.names)
+            bone_names = [name for name in restored_arrays.names if name in converted_bone_names]
+            animation.rebake_actions(
+                obj,
+                kernel.select_bones(converted_arrays, bone_names),
+                kernel.select_bones(restored_arrays, bone_names)
+            )
+
+    history.remove_conversion_record(obj)
+
+
+def convert_armature_per_entry(obj, orientation_data, creation_data):
+    """
+    This function converts the given armature object by switching in and out of edit mode for every template
+    entry. It is kept as the reference path that the single edit session conversion is compared against.
+
+    :param object obj: The armature object to convert.
+    :param list orientation_data: A list of dictionaries that are used to modify orientation.
+    :param list creation_data: A list of dictionaries that are used to create ik.
+    """
+    bpy.context.view_layer.objects.active = obj
+
+    # 1.process the orientation
+    for orientation in orientation_data:
+        bpy.ops.object.mode_set(mode='EDIT')
+
+        bone = obj.data.edit_bones[orientation['name']]
+        recursive = orientation.get('recursive', 0)
+
+        if 'roll_add' in orientation:
+            bone.roll = bone.roll + math.radians(orientation['roll_add'])
+
+        utilities.change_bone_orientation(bone, orientation['axis'], orientation['angle'], recursive)
+
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+    # 2.process the ik creation
+    for creation in creation_data:
+        bpy.ops.object.mode_set(mode='EDIT')
+
+        ik_bone = obj.data.edit_bones.new(creation['name'])
+
+        if 'source_bone' in creation:
+            utilities.copy_bone(obj.data.edit_bones[creation['source_bone']], ik_bone)
+        if 'parent_bone' in creation:
+            ik_bone.parent = obj.data.edit_bones[creation['parent_bone']]
+        if 'parent_root' in creation:
+            ik_bone.parent = None
+        if 'end_bone' in creation:
+            start = ik_bone.head.copy()
+            span = obj.data.edit_bones[creation['end_bone']].head - start
+            ik_bone.use_connect = False
+            ik_bone.head = start + span * creation['fraction']
+            ik_bone.tail = ik_bone.head + span * creation['length']
+        if 'head' in creation:
+            ik_bone.head = utilities.get_array_data(creation['head'])
+        if 'tail' in creation:
+            ik_bone.tail = utilities.get_array_data(creation['tail'])
+        if 'Matrix' in creation:
+            ik_bone.matrix = utilities.get_matrix_data(creation['Matrix'])
+
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+
 def convert_to_epic_skeleton(properties):
     """
     This function convert the selected skeleton object to the epic skeleton.
@@ -12,44 +764,97 @@ def convert_to_epic_skeleton(properties):
     :param object properties: The property group that contains variables that maintain the addon's correct state.
     """
     obj = bpy.data.objects.get(properties.source_skeleton_name)
-    if obj:      
-        # 1.process the orientation
-        orientation_data = templates.get_orientation_data(properties)       
-        for orientation in orientation_data:
-            bpy.ops.object.mode_set(mode='EDIT')
-
-            bone = obj.data.edit_bones[orientation['name']]
-            axis_name = orientation['axis']
-            angle = orientation['angle']
-            recursive = 0
-            if 'recursive' in orientation:
-                recursive = orientation['recursive']
-            
-            if 'roll_add' in orientation:
-                bone.roll = bone.roll + math.radians(orientation['roll_add'])
-
-            utilities.change_bone_orientation(bone, axis_name, angle, recursive)           
-
-            bpy.ops.object.mode_set(mode='OBJECT')
-        
-        # 2.process the ik creation
-        creation_data = templates.get_creation_data(properties) 
-        for creation in creation_data:
-            bpy.ops.object.mode_set(mode='EDIT')
-
-            ik_bone = obj.data.edit_bones.new(creation['name'])
-            
-            if 'source_bone' in creation:
-                utilities.copy_bone(obj.data.edit_bones[creation['source_bone']], ik_bone)
-            if 'parent_bone' in creation:
-                ik_bone.parent = obj.data.edit_bones[creation['parent_bone']]                    
-            if 'parent_root' in creation:
-                ik_bone.parent = obj
-            if 'head' in creation:
-                ik_bone.head = utilities.get_array_data(creation['head'])
-            if 'tail' in creation:
-                ik_bone.tail = utilities.get_array_data(creation['tail'])
-            if 'Matrix' in creation:
-                ik_bone.matrix = utilities.get_matrix_data(creation['Matrix'])
-
-            bpy.ops.object.mode_set(mode='OBJECT')
\ No newline at end of file
+    if obj:
+        convert_armature(
+            obj,
+            templates.get_compiled_template(templates.get_template_folder_path(properties)),
+            properties.rebake_animation,
+            get_cache_size(),
+            properties.selected_skeleton_template
+        )
+
+
+def get_armatures_to_convert(properties):
+    """
+    This function gets the armature objects a multi armature conversion converts. These are the armatures in the
+    view layer whose name matches the armature filter, or the selected armatures if the filter is empty.
+
+    :param object properties: The property group that contains variables that maintain the addon's correct state.
+    :return list: The armature objects sorted by name.
+    """
+    armature_filter = properties.armature_filter.strip()
+    objects = []
+    for obj in bpy.context.view_layer.objects:
+        if obj.type != 'ARMATURE':
+            continue
+        if armature_filter:
+            if fnmatch.fnmatchcase(obj.name, armature_filter):
+                objects.append(obj)
+        elif obj.select_get():
+            objects.append(obj)
+    return sorted(objects, key=lambda obj: obj.name)
+
+
+def convert_selected_skeletons(properties):
+    """
+    This function converts every armature the armature filter selects and keeps the results for the panel.
+
+    :param object properties: The property group that contains variables that maintain the addon's correct state.
+    :return list: The name, status and message of every armature.
+    """
+    results = convert_armatures(
+        get_armatures_to_convert(properties),
+        templates.get_compiled_template(templates.get_template_folder_path(properties)),
+        properties.rebake_animation,
+        get_cache_size(),
+        properties.selected_skeleton_template
+    )
+    properties.context['conversion_results'] = results
+    return results
+
+
+def compare_conversion_timings(properties):
+    """
+    This function converts two temporary copies of the selected skeleton object, one with the per entry path and
+    one with the single edit session path, and times both of them. The source skeleton is left untouched.
+
+    :param object properties: The property group that contains variables that maintain the addon's correct state.
+    :return dict: The wall time in seconds of each path, the speed up of the single edit session path and the largest
+    difference between the bones the two paths produced.
+    """
+    obj = bpy.data.objects.get(properties.source_skeleton_name)
+    if not obj:
+        return {}
+
+    orientation_data = templates.get_orientation_data(properties)
+    creation_data = templates.get_creation_data(properties)
+    plan = templates.get_compiled_template(templates.get_template_folder_path(properties))
+    timings = {}
+    results = {}
+
+    for path_name in ['per_entry', 'single_session']:
+        copy_object = utilities.copy_armature_object(obj)
+        try:
+            start = time.perf_counter()
+            if path_name == 'per_entry':
+                convert_armature_per_entry(copy_object, orientation_data, creation_data)
+            else:
+                convert_armature(copy_object, plan)
+            timings[path_name] = time.perf_counter() - start
+
+            with utilities.edit_session(copy_object) as edit_bones:
+                results[path_name] = utilities.get_edit_bone_arrays(edit_bones)
+        finally:
+            utilities.remove_armature_object(copy_object)
+
+    bpy.context.view_layer.objects.active = obj
+    if timings['single_session'] > 0:
+        timings['speed_up'] = timings['per_entry'] / timings['single_session']
+
+    if results['per_entry'].names == results['single_session'].names:
+        timings['max_difference'] = float(max(
+            numpy.abs(results['per_entry'].heads - results['single_session'].heads).max(initial=0.0),
+            numpy.abs(results['per_entry'].tails - results['single_session'].tails).max(initial=0.0),
+            numpy.abs(results['per_entry'].rolls - results['single_session'].rolls).max(initial=0.0)
+        ))
+    return timings
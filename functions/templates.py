@@ -2,39 +2,115 @@
 
 import os
 import re
+import math
+import time
 import bpy
 import json
+import heapq
 import shutil
+import hashlib
+import tempfile
+from collections import namedtuple
 from mathutils import Color, Euler, Matrix, Quaternion, Vector
 
 from . import utilities
+from . import profiling
 from ..settings.tool_tips import *
 
 _result_reference_populate_templates_dropdown = []
 _result_reference_get_skeleton_templates = []
+_compiled_templates = {}
+_template_enumeration = {'path': None, 'mtime': None, 'checked': 0.0, 'items': []}
+_skeleton_templates_path = []
+
+TEMPLATE_ENUMERATION_CHECK_INTERVAL = 1.0
+
+TEMPLATE_FILE_NAMES = ('orientation.json', 'creation.json', 'rename.json')
+TEMPLATE_INFO_FILE_NAME = 'template.json'
+MERGE_KEYS = ('remove', 'override', 'add')
+AXIS_NAMES = ('x', 'y', 'z')
+MIRROR_SIDES = (('_l', '_r'), ('_L', '_R'), ('.l', '.r'), ('.L', '.R'))
+CREATION_BONE_KEYS = ('source_bone', 'parent_bone', 'end_bone')
+
+OrientationRule = namedtuple('OrientationRule', ['name', 'axis', 'angle', 'recursive', 'roll_add'])
+CreationRule = namedtuple('CreationRule', ['name', 'source_bone', 'parent_bone', 'parent_root', 'head', 'tail', 'matrix', 'end_bone', 'fraction', 'length'])
+RenameRule = namedtuple('RenameRule', ['name', 'source_bones'])
+CompiledTemplate = namedtuple('CompiledTemplate', ['orientations', 'creations', 'renames'])
+
+
+class TemplateError(Exception):
+    """
+    This exception is raised when a template file does not match the template schema.
+    """
 
 
 # -------------- functions that handle the skeleton templating --------------
 def get_skeleton_templates_path():
     """
-    This function returns the path to the addons skeleton template directory.
+    This function returns the path to the addons skeleton template directory. It is looked up the first time it is
+    needed rather than when the addon is enabled. While a template repository is set in the addon preferences, the
+    local mirror of the repository is used instead. Background workers and tests import the addon without
+    enabling it, so when there are no addon preferences the templates that ship next to this module are used.
 
     :return str: The full path to the addons skeleton template directory.
     """
-    addons = bpy.utils.user_resource('SCRIPTS', 'addons')
-    return os.path.join(addons, __package__.split('.')[0], 'resources', 'skeleton_templates')
+    try:
+        template_repository = utilities.get_addon_preferences().template_repository
+    except KeyError:
+        return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources', 'skeleton_templates')
+
+    if template_repository.strip():
+        from . import repository
+
+        return repository.get_mirror_path()
+
+    if not _skeleton_templates_path:
+        addons = bpy.utils.user_resource('SCRIPTS', 'addons')
+        _skeleton_templates_path.append(os.path.join(addons, __package__.split('.')[0], 'resources', 'skeleton_templates'))
+    return _skeleton_templates_path[0]
 
 
 def get_skeleton_templates(self=None, context=None):
     """
-    This function gets the enumeration for the skeleton template selection.
+    This function gets the enumeration for the skeleton template selection. The enumeration is cached and only
+    rebuilt when the modification time of the skeleton templates directory changes, which is checked at most once
+    every TEMPLATE_ENUMERATION_CHECK_INTERVAL seconds.
 
     :param object self: This is a reference to the class this functions in appended to.
     :param object context: The context of the object this function is appended to.
     :return list: A list of tuples that define the skeleton template enumeration.
     """
+    return enumerate_skeleton_templates(get_skeleton_templates_path())
+
+
+def enumerate_skeleton_templates(skeleton_templates_path):
+    """
+    This function gets the cached enumeration of the template folders in a skeleton templates directory.
+
+    :param str skeleton_templates_path: The full path to the skeleton templates directory.
+    :return list: A list of tuples that define the skeleton template enumeration.
+    """
+    now = time.monotonic()
+
+    if _template_enumeration['path'] == skeleton_templates_path:
+        if now - _template_enumeration['checked'] < TEMPLATE_ENUMERATION_CHECK_INTERVAL:
+            return _template_enumeration['items']
+
+    try:
+        mtime = os.stat(skeleton_templates_path).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    _template_enumeration['checked'] = now
+    if _template_enumeration['path'] == skeleton_templates_path and _template_enumeration['mtime'] == mtime:
+        return _template_enumeration['items']
+
     skeleton_templates = []
-    skeleton_template_directories = next(os.walk(get_skeleton_templates_path()))[1]
+    # folders starting with a dot are packages that are still being installed
+    skeleton_template_directories = sorted(
+        directory for directory in next(os.walk(skeleton_templates_path), (None, [], None))[1]
+        if not directory.startswith('.')
+    )
 
     for index, skeleton_template in enumerate(skeleton_template_directories):
         skeleton_templates.append((
@@ -44,9 +120,20 @@ def get_skeleton_templates(self=None, context=None):
             'OUTLINER_OB_ARMATURE',
             index
         ))
+
+    _template_enumeration['path'] = skeleton_templates_path
+    _template_enumeration['mtime'] = mtime
+    _template_enumeration['items'] = skeleton_templates
     return skeleton_templates
 
 
+def invalidate_template_enumeration():
+    """
+    This function forces the skeleton template enumeration to be rebuilt the next time it is requested.
+    """
+    _template_enumeration['path'] = None
+
+
 def get_template_file_path(template_file_name, properties):
     """
     This function get the the full path to a template file based on the provided template file name.
@@ -55,21 +142,54 @@ def get_template_file_path(template_file_name, properties):
     :param object properties: The property group that contains variables that maintain the addon's correct state.
     :return str: The full path to a template file.
     """
-    template_name = properties.selected_skeleton_template
+    return os.path.join(get_template_folder_path(properties), template_file_name)
 
-    return os.path.join(
-        properties.skeleton_templates_path,
-        template_name,
-        template_file_name
-    )
+
+def get_template_folder_path(properties):
+    """
+    This function gets the full path to the selected skeleton template folder.
+
+    :param object properties: The property group that contains variables that maintain the addon's correct state.
+    :return str: The full path to the selected skeleton template folder.
+    """
+    return os.path.join(properties.skeleton_templates_path, properties.selected_skeleton_template)
+
+
+def get_dependent_templates(skeleton_templates_path, template_name):
+    """
+    This function finds the templates that inherit from a template, directly or through other base templates.
+    Templates whose chain is already broken are left out.
+
+    :param str skeleton_templates_path: The full path to the skeleton templates directory.
+    :param str template_name: The name of the template folder.
+    :return list: The names of the dependent template folders.
+    """
+    dependent_templates = []
+    for directory in sorted(next(os.walk(skeleton_templates_path), (None, [], None))[1]):
+        if directory.startswith('.') or directory == template_name:
+            continue
+        try:
+            chain = get_template_chain(os.path.join(skeleton_templates_path, directory))
+        except TemplateError:
+            continue
+        if any(os.path.basename(folder_path) == template_name for folder_path in chain[:-1]):
+            dependent_templates.append(directory)
+    return dependent_templates
 
 
 def remove_template_folder(properties):
     """
-    This function removes the active template from the addon's skeleton templates folder.
+    This function removes the active template from the addon's skeleton templates folder. A template that other
+    templates inherit from is not removed.
 
     :param object properties: The property group that contains variables that maintain the addon's correct state.
     """
+    dependent_templates = get_dependent_templates(properties.skeleton_templates_path, properties.selected_skeleton_template)
+    if dependent_templates:
+        raise TemplateError('The template "{}" can not be removed, since {} inherit from it'.format(
+            properties.selected_skeleton_template,
+            ', '.join('"{}"'.format(name) for name in dependent_templates)
+        ))
 
     # delete the selected skeleton template folder
     selected_template_path = os.path.join(properties.skeleton_templates_path, properties.selected_skeleton_template)
@@ -80,10 +200,22 @@ def remove_template_folder(properties):
         shutil.rmtree(selected_template_path)
     finally:
         os.umask(original_umask)
+    invalidate_compiled_templates(selected_template_path)
+    invalidate_template_enumeration()
 
     # set the selected skeleton template to the default
     properties.selected_skeleton_template = properties.default_template
 
+def get_template_folder_name(template_name):
+    """
+    This function turns a template name into the name of its template folder.
+
+    :param str template_name: The name of the template.
+    :return str: The lower case template name with every non alpha numeric character replaced.
+    """
+    return re.sub(r'\W+', '_', template_name.strip()).lower()
+
+
 def create_template_folder(template_name, properties):
     """
     This function creates a new template folder in the addon's skeleton templates folder.
@@ -91,8 +223,7 @@ def create_template_folder(template_name, properties):
     :param str template_name: The name of the template folder to create.
     :param object properties: The property group that contains variables that maintain the addon's correct state.
     """
-    # remove non alpha numeric characters
-    template_name = re.sub(r'\W+', '_', template_name.strip()).lower()
+    template_name = get_template_folder_name(template_name)
 
     # create the template folder
     template_path = os.path.join(properties.skeleton_templates_path, template_name)
@@ -107,6 +238,8 @@ def create_template_folder(template_name, properties):
     while not os.path.exists(template_path):
         pass
 
+    invalidate_template_enumeration()
+
     return template_path
 
 
@@ -151,20 +284,34 @@ def set_template(self=None, context=None):
     properties = bpy.context.window_manager.ueskeleton
 
 
+def read_template_file(template_folder_path, template_file_name):
+    """
+    This function reads from disk the list of dictionaries stored in a template file.
+
+    :param str template_folder_path: The full path to the template folder.
+    :param str template_file_name: The name of the template file.
+    :return list: The template file data, or an empty dictionary if the file does not exist.
+    """
+    template_data = {}
+    template_file_path = os.path.join(template_folder_path, template_file_name)
+    if os.path.exists(template_file_path):
+        with profiling.record('file_read', template_file_path):
+            template_file = open(template_file_path)
+            template_data = json.load(template_file)
+            template_file.close()
+
+    return template_data
+
+
 def get_creation_data(properties):
     """
-    This function reads from disk a list of dictionaries that are used to create ik.
+    This function reads from disk a list of dictionaries that are used to create ik. Entries that generate several
+    bones are expanded into one entry per bone, in the order the bones have to be created.
 
     :param object properties: The property group that contains variables that maintain the addon's correct state.
     """
-    creation_data = {}
-    creation_path = get_template_file_path('creation.json', properties)
-    if os.path.exists(creation_path):
-        creation_file = open(creation_path)
-        creation_data = json.load(creation_file)
-        creation_file.close()
-
-    return creation_data
+    creation_data = get_template_data(get_template_folder_path(properties))['creation.json']
+    return [creation for index, creation in expand_creation_data(creation_data or [])]
 
 
 def get_orientation_data(properties):
@@ -173,47 +320,624 @@ def get_orientation_data(properties):
 
     :param object properties: The property group that contains variables that maintain the addon's correct state.
     """
-    orientation_data = {}
-    orientation_path = get_template_file_path('orientation.json', properties)
-    if os.path.exists(orientation_path):
-        orientation_file = open(orientation_path)
-        orientation_data = json.load(orientation_file)
-        orientation_file.close()
+    return get_template_data(get_template_folder_path(properties))['orientation.json']
+
+
+def get_template_chain(template_folder_path):
+    """
+    This function follows the base templates a template declares in its template.json. A base template is the name
+    of another template folder in the same skeleton templates directory.
+
+    :param str template_folder_path: The full path to the template folder.
+    :return list: The full paths to the template folders of the chain, the root base template first.
+    """
+    chain = []
+    folder_path = os.path.normpath(template_folder_path)
+    while True:
+        if folder_path in chain:
+            raise TemplateError('The template "{}" inherits from itself'.format(os.path.basename(folder_path)))
+        chain.append(folder_path)
+
+        template_info = read_template_file(folder_path, TEMPLATE_INFO_FILE_NAME)
+        if not isinstance(template_info, dict):
+            raise TemplateError('{} of "{}" must contain an object'.format(TEMPLATE_INFO_FILE_NAME, os.path.basename(folder_path)))
+        for key in template_info:
+            if key != 'base':
+                raise TemplateError('{} has an unknown key "{}"'.format(TEMPLATE_INFO_FILE_NAME, key))
+
+        base = template_info.get('base')
+        if not base:
+            return chain[::-1]
+        if not isinstance(base, str) or base != os.path.basename(base) or base.startswith('.'):
+            raise TemplateError('{} "base" must be the name of a template folder'.format(TEMPLATE_INFO_FILE_NAME))
+
+        base_folder_path = os.path.join(os.path.dirname(folder_path), base)
+        if not os.path.isdir(base_folder_path):
+            raise TemplateError('The base template "{}" of "{}" does not exist'.format(base, os.path.basename(folder_path)))
+        folder_path = base_folder_path
+
+
+def merge_template_data(base_data, template_data, template_file_name):
+    """
+    This function applies the data of a template file to the data its base template resolved to. An array replaces
+    the base rules, and an object removes, overrides and adds rules by their name, in that order. An override
+    changes the given keys of every base rule with the same name, and a key set to null is removed from the rule.
+
+    :param list base_data: The resolved rules of the base template.
+    :param object template_data: The data of the template file, or an empty dictionary if the file does not exist.
+    :param str template_file_name: The name of the template file.
+    :return list: The resolved rules.
+    """
+    if isinstance(template_data, list):
+        return template_data
+    if not isinstance(template_data, dict):
+        raise TemplateError('{} must contain an array or an object'.format(template_file_name))
+
+    for key in template_data:
+        if key not in MERGE_KEYS:
+            raise TemplateError('{} has an unknown key "{}", expected one of {}'.format(template_file_name, key, ', '.join(MERGE_KEYS)))
+
+    removed_names = template_data.get('remove', [])
+    if not isinstance(removed_names, list) or not all(isinstance(name, str) for name in removed_names):
+        raise TemplateError('{} "remove" must be an array of rule names'.format(template_file_name))
+    data = [entry for entry in base_data if not (isinstance(entry, dict) and entry.get('name') in removed_names)]
+
+    for key in ('override', 'add'):
+        entries = template_data.get(key, [])
+        if not isinstance(entries, list) or not all(isinstance(entry, dict) and 'name' in entry for entry in entries):
+            raise TemplateError('{} "{}" must be an array of rules with a name'.format(template_file_name, key))
+
+    for index, override in enumerate(template_data.get('override', [])):
+        positions = [position for position, entry in enumerate(data) if isinstance(entry, dict) and entry.get('name') == override['name']]
+        if not positions:
+            raise TemplateError('{} override {} "{}" is not a rule of the base template'.format(template_file_name, index, override['name']))
+
+        for position in positions:
+            entry = dict(data[position])
+            for key, value in override.items():
+                if value is None:
+                    entry.pop(key, None)
+                else:
+                    entry[key] = value
+            data[position] = entry
+
+    return data + template_data.get('add', [])
+
+
+def get_template_data(template_folder_path, chain=None):
+    """
+    This function reads the template files of a template and of every base template it inherits from, and merges
+    them into the rules the template resolves to.
+
+    :param str template_folder_path: The full path to the template folder.
+    :param list chain: The template chain if it was already followed.
+    :return dict: The resolved rules of every template file, by the name of the template file.
+    """
+    template_data = {template_file_name: [] for template_file_name in TEMPLATE_FILE_NAMES}
+    for folder_path in chain or get_template_chain(template_folder_path):
+        for template_file_name in TEMPLATE_FILE_NAMES:
+            template_data[template_file_name] = merge_template_data(
+                template_data[template_file_name],
+                read_template_file(folder_path, template_file_name),
+                template_file_name
+            )
+    return template_data
+
+
+def get_template_signature(template_folder_path):
+    """
+    This function gets the modification time and size of every file in a template folder, which changes whenever
+    one of the files is edited, replaced or removed.
+
+    :param str template_folder_path: The full path to the template folder.
+    :return tuple: The modification time and size of each template file, or None for missing files.
+    """
+    signature = []
+    for template_file_name in TEMPLATE_FILE_NAMES + (TEMPLATE_INFO_FILE_NAME,):
+        try:
+            stat = os.stat(os.path.join(template_folder_path, template_file_name))
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def get_chain_signature(chain):
+    """
+    This function gets the signature of every template folder of a template chain, which changes whenever any
+    template in the chain is edited, including the base it declares.
+
+    :param list chain: The full paths to the template folders of the chain.
+    :return tuple: The path and signature of every template folder.
+    """
+    return tuple((folder_path, get_template_signature(folder_path)) for folder_path in chain)
+
+
+def get_compiled_template(template_folder_path):
+    """
+    This function gets the compiled template of a template folder, with the rules of its base templates merged in.
+    The template files of the chain are only read, merged and compiled again when the modification time or size of
+    a file in any template of the chain changes.
+
+    :param str template_folder_path: The full path to the template folder.
+    :return CompiledTemplate: The validated orientation, creation and rename rules.
+    """
+    template_folder_path = os.path.normpath(template_folder_path)
+
+    cached = _compiled_templates.get(template_folder_path)
+    if cached and get_chain_signature(cached[0]) == cached[1]:
+        return cached[2]
+
+    with profiling.record('stage', 'compile template'):
+        chain = get_template_chain(template_folder_path)
+        signature = get_chain_signature(chain)
+        template_data = get_template_data(template_folder_path, chain)
+        compiled_template = CompiledTemplate(
+            orientations=compile_orientation_data(template_data['orientation.json']),
+            creations=compile_creation_data(template_data['creation.json']),
+            renames=compile_rename_data(template_data['rename.json'])
+        )
+    _compiled_templates[template_folder_path] = (chain, signature, compiled_template)
+    return compiled_template
+
+
+def invalidate_compiled_templates(template_folder_path=None):
+    """
+    This function removes a template folder from the compiled template cache, or every template folder if no path
+    is given.
+
+    :param str template_folder_path: The full path to the template folder.
+    """
+    if template_folder_path is None:
+        _compiled_templates.clear()
+    else:
+        _compiled_templates.pop(os.path.normpath(template_folder_path), None)
+
+
+def get_rule_data(rule):
+    """
+    This function converts a compiled rule into plain values that can be written as json.
+
+    :param tuple rule: An orientation, creation or rename rule.
+    :return list: The kind of rule followed by its values.
+    """
+    values = [type(rule).__name__]
+    for value in rule:
+        if isinstance(value, Matrix):
+            value = [list(row) for row in value]
+        elif isinstance(value, Vector):
+            value = list(value)
+        elif isinstance(value, tuple):
+            value = list(value)
+        values.append(value)
+    return values
+
+
+def get_rules_digest(rules):
+    """
+    This function hashes compiled rules, so two lists of rules have the same digest only if they do the same thing.
+
+    :param tuple rules: The compiled rules.
+    :return str: The sha256 digest of the rules.
+    """
+    rule_data = json.dumps([get_rule_data(rule) for rule in rules])
+    return hashlib.sha256(rule_data.encode('utf-8')).hexdigest()
+
+
+def validate_entry(entry, index, file_name, required_keys, optional_keys):
+    """
+    This function checks that a template entry is a dictionary with all the required keys and no unknown keys.
+
+    :param object entry: The template entry.
+    :param int index: The position of the entry in the template file.
+    :param str file_name: The name of the template file.
+    :param tuple required_keys: The keys the entry must have.
+    :param tuple optional_keys: The keys the entry may have.
+    """
+    if not isinstance(entry, dict):
+        raise TemplateError('{} entry {} must be an object'.format(file_name, index))
+
+    for key in required_keys:
+        if key not in entry:
+            raise TemplateError('{} entry {} is missing "{}"'.format(file_name, index, key))
+
+    for key in entry:
+        if key not in required_keys and key not in optional_keys:
+            raise TemplateError('{} entry {} has an unknown key "{}"'.format(file_name, index, key))
+
+
+def validate_value(value, index, file_name, key, value_type, length=None):
+    """
+    This function checks the type of a template value, or the type and length of every row of an array value.
+
+    :param object value: The template value.
+    :param int index: The position of the entry in the template file.
+    :param str file_name: The name of the template file.
+    :param str key: The key of the value in the entry.
+    :param type value_type: The expected type of the value.
+    :param int length: The expected length if the value is an array.
+    :return object: The value.
+    """
+    if length is None:
+        values = [value]
+    elif isinstance(value, list) and len(value) == length:
+        values = value
+    else:
+        raise TemplateError('{} entry {} "{}" must be an array of {} values'.format(file_name, index, key, length))
+
+    for item in values:
+        if isinstance(item, bool) or not isinstance(item, value_type):
+            raise TemplateError('{} entry {} "{}" has an invalid value {}'.format(file_name, index, key, json.dumps(value)))
+    return value
 
-    return orientation_data
+
+def compile_orientation_data(orientation_data):
+    """
+    This function validates the orientation template data and compiles it into orientation rules with resolved
+    axis indices and angles in radians.
+
+    :param list orientation_data: A list of dictionaries that are used to modify orientation.
+    :return tuple: The orientation rules.
+    """
+    file_name = 'orientation.json'
+    if not orientation_data:
+        return ()
+    if not isinstance(orientation_data, list):
+        raise TemplateError('{} must contain an array'.format(file_name))
+
+    orientations = []
+    for index, orientation in enumerate(orientation_data):
+        validate_entry(orientation, index, file_name, ('name', 'axis', 'angle'), ('recursive', 'roll_add'))
+
+        if orientation['axis'] not in AXIS_NAMES:
+            raise TemplateError('{} entry {} "axis" must be one of {}'.format(file_name, index, ', '.join(AXIS_NAMES)))
+
+        recursive = validate_value(orientation.get('recursive', 0), index, file_name, 'recursive', int)
+        if recursive < 0:
+            raise TemplateError('{} entry {} "recursive" must not be negative'.format(file_name, index))
+
+        roll_add = None
+        if 'roll_add' in orientation:
+            roll_add = math.radians(validate_value(orientation['roll_add'], index, file_name, 'roll_add', (int, float)))
+
+        orientations.append(OrientationRule(
+            name=validate_value(orientation['name'], index, file_name, 'name', str),
+            axis=AXIS_NAMES.index(orientation['axis']),
+            angle=math.radians(validate_value(orientation['angle'], index, file_name, 'angle', (int, float))),
+            recursive=recursive,
+            roll_add=roll_add
+        ))
+    return tuple(orientations)
+
+
+def get_mirrored_name(name):
+    """
+    This function swaps the side suffix of a bone name, for example upperarm_l becomes upperarm_r.
+
+    :param str name: The bone name.
+    :return str: The bone name of the other side, or None if the name has no side suffix.
+    """
+    for left, right in MIRROR_SIDES:
+        if name.endswith(left):
+            return name[:-len(left)] + right
+        if name.endswith(right):
+            return name[:-len(right)] + left
+    return None
+
+
+def mirror_creation_entry(creation, index, file_name):
+    """
+    This function mirrors a creation entry to the other side of the skeleton. The bone names get the suffix of the
+    other side, and the head, tail and matrix are mirrored across the x axis.
+
+    :param dict creation: The creation entry.
+    :param int index: The position of the entry in the template file.
+    :param str file_name: The name of the template file.
+    :return dict: The mirrored creation entry.
+    """
+    mirrored_creation = dict(creation)
+    mirrored_creation['name'] = get_mirrored_name(creation['name'])
+    if not mirrored_creation['name']:
+        raise TemplateError('{} entry {} "name" must end with a side like _l or _r to be mirrored'.format(file_name, index))
+
+    for key in CREATION_BONE_KEYS:
+        if creation.get(key):
+            mirrored_creation[key] = get_mirrored_name(creation[key]) or creation[key]
+
+    for key in ('head', 'tail'):
+        if key in creation:
+            x, y, z = validate_value(creation[key], index, file_name, key, (int, float), 3)
+            mirrored_creation[key] = [-x, y, z]
+
+    if 'Matrix' in creation:
+        rows = validate_value(creation['Matrix'], index, file_name, 'Matrix', list, 4)
+        signs = (-1, 1, 1, 1)
+        mirrored_creation['Matrix'] = [
+            [value * signs[row_index] * signs[column_index] for column_index, value in enumerate(validate_value(row, index, file_name, 'Matrix', (int, float), 4))]
+            for row_index, row in enumerate(rows)
+        ]
+    return mirrored_creation
+
+
+def expand_creation_data(creation_data):
+    """
+    This function expands the creation entries that generate several bones into one entry per bone, and sorts the
+    entries so every bone is created after the created bones it copies, is parented to or is placed towards.
+
+    An entry with a "count" creates that many bones evenly spaced between the heads of its "source_bone" and its
+    "end_bone", for example twist bones, and formats its "name" with the one based "index" of every bone. An entry
+    with "mirror" also creates the same bones on the other side of the skeleton.
+
+    :param list creation_data: A list of dictionaries that are used to create ik.
+    :return list: The position in the template file and the expanded entry of every bone that is created.
+    """
+    file_name = 'creation.json'
+    creations = []
+    for index, creation in enumerate(creation_data):
+        validate_entry(creation, index, file_name, ('name',), (
+            'source_bone', 'parent_bone', 'parent_root', 'head', 'tail', 'Matrix', 'end_bone', 'fraction', 'length',
+            'count', 'mirror'
+        ))
+
+        generated_creations = [dict(creation)]
+        if 'count' in creation:
+            count = validate_value(creation['count'], index, file_name, 'count', int)
+            if count < 1:
+                raise TemplateError('{} entry {} "count" must be at least 1'.format(file_name, index))
+            if not creation.get('source_bone') or not creation.get('end_bone'):
+                raise TemplateError('{} entry {} needs a "source_bone" and an "end_bone" to place its bones between'.format(file_name, index))
+            if 'fraction' in creation or 'length' in creation:
+                raise TemplateError('{} entry {} can not set "fraction" or "length" together with "count"'.format(file_name, index))
+
+            generated_creations = []
+            for bone_index in range(1, count + 1):
+                generated_creation = {key: value for key, value in creation.items() if key != 'count'}
+                try:
+                    generated_creation['name'] = validate_value(creation['name'], index, file_name, 'name', str).format(index=bone_index)
+                except (KeyError, IndexError, ValueError):
+                    raise TemplateError('{} entry {} "name" must only use the {{index}} field'.format(file_name, index))
+                generated_creation['fraction'] = bone_index / (count + 1)
+                generated_creation['length'] = 1 / (count + 1)
+                generated_creations.append(generated_creation)
+
+        if 'mirror' in creation:
+            if creation['mirror'] is not True:
+                raise TemplateError('{} entry {} "mirror" must be true when it is set'.format(file_name, index))
+            generated_creations += [
+                mirror_creation_entry(generated_creation, index, file_name)
+                for generated_creation in generated_creations
+            ]
+
+        for generated_creation in generated_creations:
+            generated_creation.pop('mirror', None)
+            creations.append((index, generated_creation))
+
+    return sort_creation_data(creations, file_name)
+
+
+def sort_creation_data(creations, file_name):
+    """
+    This function sorts creation entries so every bone is created after the created bones it depends on. Entries
+    that do not depend on each other keep the order of the template file.
+
+    :param list creations: The position in the template file and the entry of every bone that is created.
+    :param str file_name: The name of the template file.
+    :return list: The position in the template file and the entry of every bone, in the order they are created.
+    """
+    positions = {}
+    for position, (index, creation) in enumerate(creations):
+        name = validate_value(creation['name'], index, file_name, 'name', str)
+        if name in positions:
+            raise TemplateError('{} entry {} creates the bone "{}" more than once'.format(file_name, index, name))
+        positions[name] = position
+
+    # an entry that names its own bone refers to the bone the armature already has
+    dependents = [[] for creation in creations]
+    dependency_counts = [0] * len(creations)
+    for position, (index, creation) in enumerate(creations):
+        dependencies = {
+            positions[creation[key]] for key in CREATION_BONE_KEYS
+            if creation.get(key) in positions and creation[key] != creation['name']
+        }
+        for dependency in dependencies:
+            dependents[dependency].append(position)
+        dependency_counts[position] = len(dependencies)
+
+    ready = [position for position, dependency_count in enumerate(dependency_counts) if not dependency_count]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        position = heapq.heappop(ready)
+        order.append(position)
+        for dependent in dependents[position]:
+            dependency_counts[dependent] -= 1
+            if not dependency_counts[dependent]:
+                heapq.heappush(ready, dependent)
+
+    if len(order) != len(creations):
+        names = [creation['name'] for position, (index, creation) in enumerate(creations) if dependency_counts[position]]
+        raise TemplateError('{} entries depend on each other in a cycle: {}'.format(file_name, ', '.join(names)))
+    return [creations[position] for position in order]
+
+
+def compile_creation_data(creation_data):
+    """
+    This function validates the creation template data and compiles it into creation rules with ready made
+    vectors and matrices. Entries that generate several bones are expanded first.
+
+    :param list creation_data: A list of dictionaries that are used to create ik.
+    :return tuple: The creation rules, in the order the bones have to be created.
+    """
+    file_name = 'creation.json'
+    if not creation_data:
+        return ()
+    if not isinstance(creation_data, list):
+        raise TemplateError('{} must contain an array'.format(file_name))
+
+    creations = []
+    for index, creation in expand_creation_data(creation_data):
+        head = tail = matrix = None
+        if 'head' in creation:
+            head = Vector(validate_value(creation['head'], index, file_name, 'head', (int, float), 3))
+        if 'tail' in creation:
+            tail = Vector(validate_value(creation['tail'], index, file_name, 'tail', (int, float), 3))
+        if 'Matrix' in creation:
+            rows = validate_value(creation['Matrix'], index, file_name, 'Matrix', list, 4)
+            matrix = Matrix([validate_value(row, index, file_name, 'Matrix', (int, float), 4) for row in rows])
+
+        end_bone = validate_value(creation.get('end_bone', ''), index, file_name, 'end_bone', str) or None
+        fraction = length = None
+        if end_bone:
+            if not creation.get('source_bone') or 'fraction' not in creation or 'length' not in creation:
+                raise TemplateError('{} entry {} needs a "source_bone", a "fraction" and a "length" with its "end_bone"'.format(file_name, index))
+            fraction = float(validate_value(creation['fraction'], index, file_name, 'fraction', (int, float)))
+            length = float(validate_value(creation['length'], index, file_name, 'length', (int, float)))
+        elif 'fraction' in creation or 'length' in creation:
+            raise TemplateError('{} entry {} needs an "end_bone" with its "fraction" and "length"'.format(file_name, index))
+
+        creations.append(CreationRule(
+            name=validate_value(creation['name'], index, file_name, 'name', str),
+            source_bone=validate_value(creation.get('source_bone', ''), index, file_name, 'source_bone', str) or None,
+            parent_bone=validate_value(creation.get('parent_bone', ''), index, file_name, 'parent_bone', str) or None,
+            parent_root='parent_root' in creation,
+            head=head,
+            tail=tail,
+            matrix=matrix,
+            end_bone=end_bone,
+            fraction=fraction,
+            length=length
+        ))
+    return tuple(creations)
+
+
+def compile_rename_data(rename_data):
+    """
+    This function validates the rename template data and compiles it into rename rules. Every rule names a target
+    bone and the source bones that are renamed to it or merged into it.
+
+    :param list rename_data: A list of dictionaries that are used to rename and merge bones.
+    :return tuple: The rename rules.
+    """
+    file_name = 'rename.json'
+    if not rename_data:
+        return ()
+    if not isinstance(rename_data, list):
+        raise TemplateError('{} must contain an array'.format(file_name))
+
+    renames = []
+    mapped_names = set()
+    for index, rename in enumerate(rename_data):
+        validate_entry(rename, index, file_name, ('name', 'source_bones'), ())
+
+        name = validate_value(rename['name'], index, file_name, 'name', str)
+        source_bones = rename['source_bones']
+        if not isinstance(source_bones, list) or not source_bones:
+            raise TemplateError('{} entry {} "source_bones" must be a non empty array'.format(file_name, index))
+        validate_value(source_bones, index, file_name, 'source_bones', str, len(source_bones))
+
+        # a target may list itself as a source, but no bone may be mapped by two entries
+        for bone_name in [name] + [bone_name for bone_name in source_bones if bone_name != name]:
+            if bone_name in mapped_names:
+                raise TemplateError('{} entry {} maps the bone "{}" more than once'.format(file_name, index, bone_name))
+            mapped_names.add(bone_name)
+
+        renames.append(RenameRule(name=name, source_bones=tuple(source_bones)))
+    return tuple(renames)
+
+
+def check_package_base(zip_file_path, skeleton_templates_path):
+    """
+    This function checks that the base template a template package inherits from is installed.
+
+    :param str zip_file_path: The full file path to where the zip file is located.
+    :param str skeleton_templates_path: The full path to the skeleton templates directory.
+    """
+    import zipfile
+    from . import packages
+
+    with zipfile.ZipFile(zip_file_path) as package:
+        try:
+            with package.open(TEMPLATE_INFO_FILE_NAME) as template_info_file:
+                template_info = json.loads(template_info_file.read().decode('utf-8'))
+        except KeyError:
+            return
+        except ValueError:
+            raise packages.PackageError('The package {} is not valid json'.format(TEMPLATE_INFO_FILE_NAME))
+
+    base = template_info.get('base') if isinstance(template_info, dict) else None
+    if not base:
+        return
+    if not isinstance(base, str) or base != os.path.basename(base) or base.startswith('.'):
+        raise packages.PackageError('The package {} "base" must be the name of a template folder'.format(TEMPLATE_INFO_FILE_NAME))
+    if not os.path.isdir(os.path.join(skeleton_templates_path, base)):
+        raise packages.PackageError('The package inherits from the template "{}", which is not installed'.format(base))
 
 
 def import_zip(zip_file_path, properties):
     """
-    This function gets a zip folder and unpacks it into the skeleton templates folder.
+    This function installs a template package into the skeleton templates folder. The files are checked against
+    the package manifest before anything is installed, and only the files that changed are written. A package that
+    inherits from a template that is not installed is refused.
 
     :param str zip_file_path: The full file path to where the zip file is located.
     :param object properties: The property group that contains variables that maintain the addon's correct state.
+    :return dict: The number of written, unchanged and removed files.
     """
+    from . import packages
+
     # get the template name and path from the zip file
-    template_name = os.path.basename(zip_file_path).replace('.zip', '')
+    template_name = get_template_folder_name(os.path.splitext(os.path.basename(zip_file_path))[0])
     template_folder_path = os.path.join(properties.skeleton_templates_path, template_name)
+    os.makedirs(properties.skeleton_templates_path, exist_ok=True)
+    check_package_base(zip_file_path, properties.skeleton_templates_path)
 
-    # create the template folder
-    create_template_folder(template_name, properties)
-
-    # unpack the zip file into the new template folder
-    shutil.unpack_archive(zip_file_path, template_folder_path, 'zip')
+    summary = packages.install_package(zip_file_path, template_folder_path)
+    invalidate_compiled_templates(template_folder_path)
+    invalidate_template_enumeration()
+    return summary
 
 
 def export_zip(zip_file_path, properties):
     """
-    This function packs the selected export template into a zip folder, and saves it to the provided path on disk.
+    This function packs the selected export template into a zip file with a manifest of the hash of every file, and
+    saves it to the provided path on disk. A template that inherits from a base template is packed with the rules of
+    its whole chain merged, so the package works without its base.
 
     :param str zip_file_path: The full file path to where the zip file will be saved on disk.
     :param object properties: The property group that contains variables that maintain the addon's correct state.
     """
-    # remove .zip extension if it exists
-    no_extension_file_path = zip_file_path.replace('.zip', '')
+    from . import packages
+
+    # add the .zip extension if it is missing
+    if not zip_file_path.lower().endswith('.zip'):
+        zip_file_path += '.zip'
 
     # zip up the folder and save it to the given path
     template_folder_path = os.path.join(properties.skeleton_templates_path, properties.selected_export_template)
-    shutil.make_archive(no_extension_file_path, 'zip', template_folder_path)
+    chain = get_template_chain(template_folder_path)
+    if len(chain) == 1:
+        packages.write_package(template_folder_path, zip_file_path)
+        return
+
+    staging_path = tempfile.mkdtemp(prefix='ueskeleton_export_')
+    try:
+        # the staged folder has the name of the template, since the package takes its name from the folder
+        staged_folder_path = os.path.join(staging_path, os.path.basename(os.path.normpath(template_folder_path)))
+        shutil.copytree(
+            template_folder_path,
+            staged_folder_path,
+            ignore=lambda directory, names: [
+                name for name in names
+                if directory == template_folder_path and name in TEMPLATE_FILE_NAMES + (TEMPLATE_INFO_FILE_NAME, packages.MANIFEST_FILE_NAME)
+            ]
+        )
+        for template_file_name, template_data in get_template_data(template_folder_path, chain).items():
+            if template_data:
+                with open(os.path.join(staged_folder_path, template_file_name), 'w') as template_file:
+                    json.dump(template_data, template_file, indent=4)
+        packages.write_package(staged_folder_path, zip_file_path)
+    finally:
+        shutil.rmtree(staging_path, ignore_errors=True)
 
 
 def safe_get_skeleton_templates(self, context):
@@ -1,8 +1,19 @@
 # Copyright Wuguyannian All Rights Reserved.
 import bpy
+from contextlib import contextmanager
+from collections import namedtuple
 from mathutils import Vector, Euler, Quaternion
 from math import radians
 
+from . import lazy
+from . import profiling
+
+numpy = lazy.import_module('numpy')
+
+EDIT_BONE_FLAG_NAMES = ('use_connect', 'use_deform', 'use_inherit_rotation', 'use_local_location')
+
+EditBoneSnapshot = namedtuple('EditBoneSnapshot', ['names', 'heads', 'tails', 'rolls', 'parents', 'flags'])
+
 def set_to_title(text):
     """
     This function takes text and converts it to titles.
@@ -13,6 +24,15 @@ def set_to_title(text):
     return ' '.join([word.capitalize() for word in text.lower().split('_')])
 
 
+def get_addon_preferences():
+    """
+    This function gets the preferences of this addon.
+
+    :return object: The addon preferences.
+    """
+    return bpy.context.preferences.addons[__package__.split('.')[0]].preferences
+
+
 def get_picker_object():
     """
     This function gets or creates a new picker object if needed.
@@ -176,6 +196,190 @@ def report_error(error_header, error_message, confirm_message=None, clean_up_act
 
 
 # -------------- functions that handle the bone editing --------------
+@contextmanager
+def edit_session(obj):
+    """
+    This context manager makes the given armature object active and keeps it in edit mode for the duration of the
+    block, so any number of bone edits only cost one mode switch in and one mode switch out.
+
+    :param object obj: The armature object to edit.
+    :return object: The edit bones of the armature.
+    """
+    bpy.context.view_layer.objects.active = obj
+    with profiling.record('mode_switch', 'EDIT'):
+        bpy.ops.object.mode_set(mode='EDIT')
+    try:
+        yield obj.data.edit_bones
+    finally:
+        with profiling.record('mode_switch', 'OBJECT'):
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+
+@contextmanager
+def edit_session_many(objects):
+    """
+    This context manager puts several armature objects in edit mode together, so editing all of them costs one mode
+    switch in and one mode switch out. The selection and the active object are restored afterwards.
+
+    :param list objects: The armature objects to edit. They must be visible and must not share armature data.
+    :return list: The edit bones of every armature, in the order of the objects.
+    """
+    view_layer = bpy.context.view_layer
+    active_object = view_layer.objects.active
+    selected_objects = [obj for obj in view_layer.objects if obj.select_get()]
+
+    for obj in selected_objects:
+        obj.select_set(False)
+    for obj in objects:
+        obj.select_set(True)
+    view_layer.objects.active = objects[0]
+
+    with profiling.record('mode_switch', 'EDIT'):
+        bpy.ops.object.mode_set(mode='EDIT')
+    try:
+        yield [obj.data.edit_bones for obj in objects]
+    finally:
+        with profiling.record('mode_switch', 'OBJECT'):
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        for obj in objects:
+            obj.select_set(False)
+        for obj in selected_objects:
+            obj.select_set(True)
+        view_layer.objects.active = active_object
+
+
+def copy_armature_object(obj):
+    """
+    This function creates a temporary copy of an armature object and its armature data in the active scene.
+
+    :param object obj: The armature object to copy.
+    :return object: The copied armature object.
+    """
+    copy_object = obj.copy()
+    copy_object.data = obj.data.copy()
+    bpy.context.scene.collection.objects.link(copy_object)
+    return copy_object
+
+
+def remove_armature_object(obj):
+    """
+    This function removes an armature object and its armature data.
+
+    :param object obj: The armature object to remove.
+    """
+    armature = obj.data
+    bpy.data.objects.remove(obj)
+    if armature.users == 0:
+        bpy.data.armatures.remove(armature)
+
+
+def get_edit_bone_arrays(edit_bones):
+    """
+    This function reads the rest data of all the edit bones into arrays with bulk access.
+
+    :param object edit_bones: The edit bones collection of an armature in edit mode.
+    :return BoneArrays: The bone names, heads, tails, rolls, parent indices and connected flags.
+    """
+    from . import kernel
+
+    names = [bone.name for bone in edit_bones]
+    name_indices = {name: index for index, name in enumerate(names)}
+    count = len(names)
+
+    heads = numpy.empty(count * 3, dtype=numpy.float32)
+    tails = numpy.empty(count * 3, dtype=numpy.float32)
+    rolls = numpy.empty(count, dtype=numpy.float32)
+    connected = numpy.empty(count, dtype=bool)
+    edit_bones.foreach_get('head', heads)
+    edit_bones.foreach_get('tail', tails)
+    edit_bones.foreach_get('roll', rolls)
+    edit_bones.foreach_get('use_connect', connected)
+
+    return kernel.BoneArrays(
+        names=names,
+        heads=heads.reshape(count, 3).astype(numpy.float64),
+        tails=tails.reshape(count, 3).astype(numpy.float64),
+        rolls=rolls.astype(numpy.float64),
+        parents=numpy.array([name_indices[bone.parent.name] if bone.parent else -1 for bone in edit_bones], dtype=numpy.int64),
+        connected=connected
+    )
+
+
+def set_edit_bone_arrays(edit_bones, bone_arrays):
+    """
+    This function writes the heads, tails and rolls from arrays back to the edit bones with bulk access.
+
+    :param object edit_bones: The edit bones collection of an armature in edit mode.
+    :param BoneArrays bone_arrays: The bone arrays that were read from the same edit bones.
+    """
+    edit_bones.foreach_set('head', bone_arrays.heads.astype(numpy.float32).ravel())
+    edit_bones.foreach_set('tail', bone_arrays.tails.astype(numpy.float32).ravel())
+    edit_bones.foreach_set('roll', bone_arrays.rolls.astype(numpy.float32))
+
+
+def get_edit_bone_snapshot(edit_bones):
+    """
+    This function reads everything a conversion changes about the edit bones into arrays with bulk access, so the
+    bones can be restored without the global undo.
+
+    :param object edit_bones: The edit bones collection of an armature in edit mode.
+    :return EditBoneSnapshot: The bone names, heads, tails, rolls, parent names and flags.
+    """
+    count = len(edit_bones)
+    heads = numpy.empty(count * 3, dtype=numpy.float32)
+    tails = numpy.empty(count * 3, dtype=numpy.float32)
+    rolls = numpy.empty(count, dtype=numpy.float32)
+    edit_bones.foreach_get('head', heads)
+    edit_bones.foreach_get('tail', tails)
+    edit_bones.foreach_get('roll', rolls)
+
+    flags = {}
+    for flag_name in EDIT_BONE_FLAG_NAMES:
+        flags[flag_name] = numpy.empty(count, dtype=bool)
+        edit_bones.foreach_get(flag_name, flags[flag_name])
+
+    return EditBoneSnapshot(
+        names=[bone.name for bone in edit_bones],
+        heads=heads.reshape(count, 3),
+        tails=tails.reshape(count, 3),
+        rolls=rolls,
+        parents=[bone.parent.name if bone.parent else '' for bone in edit_bones],
+        flags=flags
+    )
+
+
+def restore_edit_bone_snapshot(edit_bones, snapshot):
+    """
+    This function restores the edit bones to a snapshot. Bones that are not in the snapshot are removed and bones
+    that are missing are created again, then the rest data and flags are written back with bulk access.
+
+    :param object edit_bones: The edit bones collection of an armature in edit mode.
+    :param EditBoneSnapshot snapshot: The snapshot to restore.
+    """
+    snapshot_indices = {name: index for index, name in enumerate(snapshot.names)}
+    for bone in [bone for bone in edit_bones if bone.name not in snapshot_indices]:
+        edit_bones.remove(bone)
+
+    bones = {bone.name: bone for bone in edit_bones}
+    for name in snapshot.names:
+        if name not in bones:
+            bones[name] = edit_bones.new(name)
+
+    for name, parent_name in zip(snapshot.names, snapshot.parents):
+        parent = bones[parent_name] if parent_name else None
+        if bones[name].parent != parent:
+            bones[name].parent = parent
+
+    # the collection order can differ from the snapshot order once bones were removed or created
+    order = [snapshot_indices[bone.name] for bone in edit_bones]
+    for flag_name, values in snapshot.flags.items():
+        edit_bones.foreach_set(flag_name, values[order])
+    edit_bones.foreach_set('head', numpy.asarray(snapshot.heads, dtype=numpy.float32)[order].ravel())
+    edit_bones.foreach_set('tail', numpy.asarray(snapshot.tails, dtype=numpy.float32)[order].ravel())
+    edit_bones.foreach_set('roll', numpy.asarray(snapshot.rolls, dtype=numpy.float32)[order])
+
+
 def copy_bone(source_bone, target_bone):
     target_bone.parent = source_bone.parent
     target_bone.head = Vector(source_bone.head)
@@ -194,14 +398,21 @@ def copy_bone(source_bone, target_bone):
     target_bone.bbone_easeout = source_bone.bbone_easeout
 
 
-def change_bone_orientation(target_bone, axis_name, angle, recursive): 
-    if axis_name == 'x':
-        axis = target_bone.x_axis
-    if axis_name == 'y':
-        axis = target_bone.y_axis
-    if axis_name == 'z':
-        axis = target_bone.z_axis
-    quat = Quaternion(axis, radians(angle))
+def change_bone_orientation(target_bone, axis_name, angle, recursive):
+    rotate_bone(target_bone, ('x', 'y', 'z').index(axis_name), radians(angle), recursive)
+
+
+def rotate_bone(target_bone, axis_index, angle, recursive):
+    """
+    This function rotates the tail of a bone around one of its own axes, and optionally the tails of its children.
+
+    :param object target_bone: The edit bone to rotate.
+    :param int axis_index: The index of the bone axis to rotate around, 0 for x, 1 for y and 2 for z.
+    :param float angle: The rotation angle in radians.
+    :param int recursive: How many levels of children are rotated as well.
+    """
+    axis = (target_bone.x_axis, target_bone.y_axis, target_bone.z_axis)[axis_index]
+    quat = Quaternion(axis, angle)
     tail = Vector(target_bone.tail) - Vector(target_bone.head)
     tail.rotate(quat)
     target_bone.tail = target_bone.head + tail
@@ -209,4 +420,4 @@ def change_bone_orientation(target_bone, axis_name, angle, recursive):
     if recursive > 0:
         recursive = recursive - 1
         for child in target_bone.children:
-            change_bone_orientation(child, axis_name, angle, recursive)
\ No newline at end of file
+            rotate_bone(child, axis_index, angle, recursive)
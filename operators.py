@@ -3,9 +3,11 @@
 import bpy
 
 from .ui import exporter
-from .functions import scene
 from .functions import templates
-from bpy_extras.io_utils import ImportHelper
+from .functions import handlers
+from .functions import profiling
+from .settings import tool_tips
+from bpy_extras.io_utils import ImportHelper, ExportHelper
 
 class RemoveTemplateFolder(bpy.types.Operator):
     """Remove this template from the addon"""
@@ -14,7 +16,12 @@ class RemoveTemplateFolder(bpy.types.Operator):
 
     def execute(self, context):
         properties = bpy.context.window_manager.ueskeleton
-        templates.remove_template_folder(properties)
+        try:
+            templates.remove_template_folder(properties)
+        except templates.TemplateError as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+        handlers.invalidate_template_scores()
         return {'FINISHED'}
 
     def invoke(self, context, event):
@@ -26,10 +33,333 @@ class ConvertToEpicSkeleton(bpy.types.Operator):
     bl_idname = "ueskeleton.convert_to_epic_skeleton"
     bl_label = "Convert"
 
+    # the time each event loop tick may spend on the conversion
+    step_seconds = 0.02
+
+    # the status text of each stage of a conversion session
+    stage_labels = {
+        'solve': 'solving orientations',
+        'write': 'writing bones',
+        'rebake': 're-baking actions',
+        'rename': 'renaming bones',
+        'finished': 'finished'
+    }
+
+    def execute(self, context):
+        from .functions import scene
+
+        properties = bpy.context.window_manager.ueskeleton
+        try:
+            scene.convert_to_epic_skeleton(properties)
+        except (templates.TemplateError, KeyError) as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        from .functions import scene
+
+        properties = bpy.context.window_manager.ueskeleton
+        if properties.is_converting:
+            self.report({'WARNING'}, 'A conversion is already running')
+            return {'CANCELLED'}
+
+        obj = bpy.data.objects.get(properties.source_skeleton_name)
+        if not obj:
+            self.report({'ERROR'}, 'No source skeleton is selected')
+            return {'CANCELLED'}
+
+        try:
+            plan = templates.get_compiled_template(templates.get_template_folder_path(properties))
+            self.session = scene.ConversionSession(
+                obj,
+                plan,
+                properties.rebake_animation,
+                scene.get_cache_size(),
+                properties.selected_skeleton_template
+            )
+        except (templates.TemplateError, KeyError) as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(0.01, window=context.window)
+        wm.progress_begin(0, self.session.total_steps)
+        wm.modal_handler_add(self)
+
+        properties.is_converting = True
+        properties.conversion_progress = 0.0
+        self.update_progress(context)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.cancel(context)
+            self.report({'INFO'}, 'The conversion was cancelled')
+            return {'CANCELLED'}
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        # each step runs at most one stage, so an Esc that comes in between two stages is handled before the next
+        try:
+            self.session.step(self.step_seconds)
+        except Exception as error:
+            self.cancel(context)
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+
+        self.update_progress(context)
+        if not self.session.is_finished:
+            return {'PASS_THROUGH'}
+
+        self.finish(context)
+        return {'FINISHED'}
+
+    def cancel(self, context):
+        # puts the rest pose and the re-baked actions back if the bones were already written
+        try:
+            self.session.cancel()
+        except Exception as error:
+            self.report({'ERROR'}, 'The conversion could not be rolled back: {}'.format(error))
+        self.finish(context)
+
+    def update_progress(self, context):
+        properties = bpy.context.window_manager.ueskeleton
+        steps = self.session.done_steps
+        properties.conversion_progress = 100.0 * steps / self.session.total_steps
+
+        context.window_manager.progress_update(steps)
+        if context.workspace:
+            context.workspace.status_text_set('Converting "{}" ({}): {:.0f}%, press Esc to cancel'.format(
+                self.session.object_name,
+                self.stage_labels[self.session.stage],
+                properties.conversion_progress
+            ))
+        if context.screen:
+            for area in context.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.tag_redraw()
+
+    def finish(self, context):
+        properties = bpy.context.window_manager.ueskeleton
+        wm = context.window_manager
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+        if context.workspace:
+            context.workspace.status_text_set(None)
+
+        properties.is_converting = False
+        properties.conversion_progress = 0.0
+
+class ConvertSelectedSkeletons(bpy.types.Operator):
+    """Convert every selected skeleton, or every skeleton matching the filter, in one edit session"""
+    bl_idname = "ueskeleton.convert_selected_skeletons"
+    bl_label = "Convert All"
+
+    def execute(self, context):
+        from .functions import scene
+
+        properties = bpy.context.window_manager.ueskeleton
+        try:
+            results = scene.convert_selected_skeletons(properties)
+        except templates.TemplateError as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+
+        if not results:
+            self.report({'WARNING'}, 'No skeleton is selected or matches the filter')
+            return {'CANCELLED'}
+
+        failed_count = len([result for result in results if result['status'] == 'FAILED'])
+        self.report({'WARNING'} if failed_count else {'INFO'}, 'Converted {} of {} skeletons'.format(
+            len([result for result in results if result['status'] == 'FINISHED']),
+            len(results)
+        ))
+        return {'FINISHED'}
+
+class RestoreSkeleton(bpy.types.Operator):
+    """Restore the source skeleton to how it was before it was converted"""
+    bl_idname = "ueskeleton.restore_skeleton"
+    bl_label = "Restore"
+
+    def execute(self, context):
+        from .functions import scene
+
+        properties = bpy.context.window_manager.ueskeleton
+        obj = bpy.data.objects.get(properties.source_skeleton_name)
+        if not obj:
+            self.report({'ERROR'}, 'No source skeleton is selected')
+            return {'CANCELLED'}
+
+        try:
+            scene.restore_armature(obj, properties.rebake_animation)
+        except LookupError as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+        return {'FINISHED'}
+
+class ScanTemplateCompatibility(bpy.types.Operator):
+    """Find the best template for every skeleton in the scene and in the blend files of a folder"""
+    bl_idname = "ueskeleton.scan_template_compatibility"
+    bl_label = "Scan Templates"
+
+    directory: bpy.props.StringProperty(subtype='DIR_PATH')
+    include_libraries: bpy.props.BoolProperty(
+        name="Include Blend Files",
+        description=tool_tips.include_libraries_tool_tip,
+        default=False
+    )
+
+    def execute(self, context):
+        from .functions import compatibility
+
+        properties = bpy.context.window_manager.ueskeleton
+        results = compatibility.scan_armatures(properties, self.directory if self.include_libraries else '')
+        if not results:
+            self.report({'WARNING'}, 'No skeleton was found')
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, '{} of {} skeletons are fully covered by a template'.format(
+            len([result for result in results if result['coverage'] == 1.0]),
+            len(results)
+        ))
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        if not self.include_libraries:
+            return self.execute(context)
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+class GenerateTemplate(bpy.types.Operator):
+    """Write a new template for the source skeleton by matching its bones to the bones of the selected template"""
+    bl_idname = "ueskeleton.generate_template"
+    bl_label = "Generate Template"
+
+    template_name: bpy.props.StringProperty(
+        name="Name",
+        description=tool_tips.generated_template_name_tool_tip,
+        default=''
+    )
+
     def execute(self, context):
+        from .functions import matching
+
         properties = bpy.context.window_manager.ueskeleton
-        scene.convert_to_epic_skeleton(properties)
-        print("convert execute")
+        if not self.template_name.strip():
+            self.report({'ERROR'}, 'The template needs a name')
+            return {'CANCELLED'}
+
+        try:
+            template_name, matches, unmatched_names = matching.generate_template(properties, self.template_name)
+        except (templates.TemplateError, LookupError) as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+
+        handlers.invalidate_template_scores()
+        properties.selected_skeleton_template = template_name
+        if unmatched_names:
+            self.report({'WARNING'}, 'Matched {} bones, no match for: {}'.format(len(matches), ', '.join(unmatched_names)))
+        else:
+            self.report({'INFO'}, 'Matched {} bones'.format(len(matches)))
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        properties = bpy.context.window_manager.ueskeleton
+        self.template_name = properties.source_skeleton_name
+        return context.window_manager.invoke_props_dialog(self)
+
+class UseTemplate(bpy.types.Operator):
+    """Select this template"""
+    bl_idname = "ueskeleton.use_template"
+    bl_label = "Use Template"
+
+    template_name: bpy.props.StringProperty()
+
+    def execute(self, context):
+        properties = bpy.context.window_manager.ueskeleton
+        properties.selected_skeleton_template = self.template_name
+        return {'FINISHED'}
+
+class CompareConversionTimings(bpy.types.Operator):
+    """Time the single edit session conversion against the per entry conversion on copies of the source skeleton"""
+    bl_idname = "ueskeleton.compare_conversion_timings"
+    bl_label = "Compare Conversion Timings"
+
+    def execute(self, context):
+        from .functions import scene
+
+        properties = bpy.context.window_manager.ueskeleton
+        try:
+            timings = scene.compare_conversion_timings(properties)
+        except templates.TemplateError as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+
+        if not timings:
+            self.report({'ERROR'}, 'No source skeleton is selected')
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, 'per entry: {per_entry:.3f}s, single session: {single_session:.3f}s, speed up: {speed_up:.1f}x, max difference: {max_difference:.2e}'.format(
+            per_entry=timings['per_entry'],
+            single_session=timings['single_session'],
+            speed_up=timings.get('speed_up', 0.0),
+            max_difference=timings.get('max_difference', float('nan'))
+        ))
+        return {'FINISHED'}
+
+class DumpProfile(bpy.types.Operator, ExportHelper):
+    """Save the recorded conversion timings to a file"""
+    bl_idname = "ueskeleton.dump_profile"
+    bl_label = "Dump Profile"
+    filename_ext = ".json"
+
+    file_format: bpy.props.EnumProperty(
+        name="Format",
+        items=[
+            ('JSON', 'JSON', 'Every recorded timing and a summary per stage, rule, mode switch and file read'),
+            ('CHROME_TRACE', 'Chrome Trace', 'A trace that can be opened in chrome://tracing or perfetto')
+        ],
+        default='JSON'
+    )
+
+    def execute(self, context):
+        if self.file_format == 'CHROME_TRACE':
+            profiling.dump_chrome_trace(self.filepath)
+        else:
+            profiling.dump_json(self.filepath)
+        return {'FINISHED'}
+
+
+class ClearProfile(bpy.types.Operator):
+    """Remove the recorded conversion timings"""
+    bl_idname = "ueskeleton.clear_profile"
+    bl_label = "Clear Profile"
+
+    def execute(self, context):
+        profiling.clear()
+        return {'FINISHED'}
+
+class ClearConversionCache(bpy.types.Operator):
+    """Remove the cached results of earlier conversions"""
+    bl_idname = "ueskeleton.clear_conversion_cache"
+    bl_label = "Clear Conversion Cache"
+
+    def execute(self, context):
+        from .functions import conversion_cache
+
+        removed_count = conversion_cache.clear()
+        self.report({'INFO'}, 'Removed {} cached conversions'.format(removed_count))
+        return {'FINISHED'}
+
+class RefreshTemplateRepository(bpy.types.Operator):
+    """Copy the latest templates from the template repository in the background"""
+    bl_idname = "ueskeleton.refresh_template_repository"
+    bl_label = "Refresh Templates"
+
+    def execute(self, context):
+        handlers.restart_template_repository_refresh()
         return {'FINISHED'}
 
 class ExportSkeletonTemplate(bpy.types.Operator, exporter.ExportSkeletonTemplate):
@@ -39,7 +369,11 @@ class ExportSkeletonTemplate(bpy.types.Operator, exporter.ExportSkeletonTemplate
 
     def execute(self, context):
         properties = bpy.context.window_manager.ueskeleton
-        templates.export_zip(self.filepath, properties)
+        try:
+            templates.export_zip(self.filepath, properties)
+        except (templates.TemplateError, OSError) as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
         return {'FINISHED'}
 
 
@@ -50,6 +384,16 @@ class ImportSkeletonTemplate(bpy.types.Operator, ImportHelper):
     filename_ext = ".zip"
 
     def execute(self, context):
+        import zipfile
+        from .functions import packages
+
         properties = bpy.context.window_manager.ueskeleton
-        templates.import_zip(self.filepath, properties)
+        try:
+            summary = templates.import_zip(self.filepath, properties)
+        except (packages.PackageError, zipfile.BadZipFile, OSError) as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+
+        handlers.invalidate_template_scores()
+        self.report({'INFO'}, 'Imported the template, {written} files written, {unchanged} unchanged, {removed} removed'.format(**summary))
         return {'FINISHED'}
\ No newline at end of file
@@ -12,7 +12,6 @@ class UESKELETONProperties(bpy.types.PropertyGroup):
     module_name = __package__
 
     # template constants
-    skeleton_templates_path = templates.get_skeleton_templates_path()
     default_template = 'example'
 
      # utility constants
@@ -20,10 +19,40 @@ class UESKELETONProperties(bpy.types.PropertyGroup):
 
     context = {}
 
+    @property
+    def skeleton_templates_path(self):
+        return templates.get_skeleton_templates_path()
+
     # --------------------- read/write properties ---------------------
 
     # scene variables
     source_skeleton_name: bpy.props.StringProperty(default='', update=utilities.source_skeleton_picker_update)
+    reference_skeleton_name: bpy.props.StringProperty(
+        name="Reference",
+        description=tool_tips.reference_skeleton_tool_tip,
+        default=''
+    )
+
+    # conversion variables
+    rebake_animation: bpy.props.BoolProperty(
+        name="Re-bake Animation",
+        description=tool_tips.rebake_animation_tool_tip,
+        default=True
+    )
+    armature_filter: bpy.props.StringProperty(
+        name="Filter",
+        description=tool_tips.armature_filter_tool_tip,
+        default=''
+    )
+    is_converting: bpy.props.BoolProperty(default=False)
+    conversion_progress: bpy.props.FloatProperty(
+        name="Progress",
+        description=tool_tips.conversion_progress_tool_tip,
+        default=0.0,
+        min=0.0,
+        max=100.0,
+        subtype='PERCENTAGE'
+    )
 
 
     # --------------------- user interface properties ------------------
@@ -45,11 +74,42 @@ class UESKELETONProperties(bpy.types.PropertyGroup):
     )
 
 
+class UESKELETONRecordEntry(bpy.types.PropertyGroup):
+    """
+    This class defines a name and value pair of a conversion record.
+    """
+    value: bpy.props.StringProperty(default='')
+
+
+class UESKELETONConversionRecord(bpy.types.PropertyGroup):
+    """
+    This class defines what was applied to a converted armature. It is kept on the armature data, so it stays with
+    the armature when the object is renamed. Files saved before that have the records in the scene, named after
+    the armature object.
+    """
+    template_name: bpy.props.StringProperty(default='')
+    template_digest: bpy.props.StringProperty(default='')
+
+    # the digest of every applied orientation rule, in the order of the template
+    orientation_rules: bpy.props.CollectionProperty(type=UESKELETONRecordEntry)
+
+    # the created bones by name, with the digest of the rule that created them
+    created_bones: bpy.props.CollectionProperty(type=UESKELETONRecordEntry)
+
+    # the current name of every renamed bone, by the name it has in the template
+    renamed_bones: bpy.props.CollectionProperty(type=UESKELETONRecordEntry)
+
+    # the rest data of the armature before its first conversion
+    snapshot: bpy.props.StringProperty(default='')
+
+
 class UESKELETONSavedProperties(bpy.types.PropertyGroup):
     """
     This class defines a property group that will be stored in the blender scene. This
     data will get serialized into the blend file when it is saved.
     """
+    # the conversion records of files saved before the records were kept on the armature data
+    conversions: bpy.props.CollectionProperty(type=UESKELETONConversionRecord)
 
 
 def register():
@@ -58,10 +118,13 @@ def register():
     addon is enabled.
     """
     bpy.utils.register_class(UESKELETONProperties)
+    bpy.utils.register_class(UESKELETONRecordEntry)
+    bpy.utils.register_class(UESKELETONConversionRecord)
     bpy.utils.register_class(UESKELETONSavedProperties)
 
     bpy.types.WindowManager.ueskeleton = bpy.props.PointerProperty(type=UESKELETONProperties)
     bpy.types.Scene.ueskeleton = bpy.props.PointerProperty(type=UESKELETONSavedProperties)
+    bpy.types.Armature.ueskeleton_conversion = bpy.props.PointerProperty(type=UESKELETONConversionRecord)
 
 
 def unregister():
@@ -70,6 +133,10 @@ def unregister():
     addon is disabled.
     """
     bpy.utils.unregister_class(UESKELETONProperties)
+    bpy.utils.unregister_class(UESKELETONSavedProperties)
+    bpy.utils.unregister_class(UESKELETONConversionRecord)
+    bpy.utils.unregister_class(UESKELETONRecordEntry)
 
     del bpy.types.WindowManager.ueskeleton
     del bpy.types.Scene.ueskeleton
+    del bpy.types.Armature.ueskeleton_conversion
@@ -6,4 +6,29 @@ template_tool_tip = "This template contains the ik and orientation configuration
 # ---------- tool tips for the user interface properties ----------
 skeleton_template_tool_tip = "Select a skeleton template"
 
-export_template_tool_tip = "Select a skeleton template to export"
\ No newline at end of file
+export_template_tool_tip = "Select a skeleton template to export"
+
+rebake_animation_tool_tip = "Rewrite the actions of the skeleton so the animation looks the same on the converted rest pose"
+
+armature_filter_tool_tip = "Convert every armature whose name matches this pattern, for example SK_*. Leave it empty to convert the selected armatures"
+
+reference_skeleton_tool_tip = "A skeleton the selected template already works on. Its rest pose and hierarchy help to match the bones of the source skeleton when a template is generated"
+
+generated_template_name_tool_tip = "The name of the generated template folder"
+
+include_libraries_tool_tip = "Also scan the skeletons in every blend file of a folder, without opening the files"
+
+conversion_progress_tool_tip = "The progress of the running conversion, press Esc to cancel it"
+
+# ---------- tool tips for the addon preferences ----------
+enable_profiling_tool_tip = "Record the time spent in every conversion stage, template rule, mode switch and file read"
+
+profiling_top_count_tool_tip = "The number of the slowest recorded entries shown in the panel"
+
+use_conversion_cache_tool_tip = "Reuse the solved orientations of armatures with the same rest pose and template instead of solving them again"
+
+conversion_cache_size_tool_tip = "The size in megabytes the conversion cache may grow to before the least recently used results are removed"
+
+template_repository_tool_tip = "A shared folder or http url to read the skeleton templates from. The templates are copied to a local mirror in the background, leave it empty to use the templates of the addon"
+
+template_repository_cache_size_tool_tip = "The size in megabytes the cache of template repository files may grow to before the least recently used files are removed"
@@ -0,0 +1,9 @@
+# Copyright Wuguyannian All Rights Reserved.
+
+import os
+import sys
+
+# the tests import the addon modules the way the command line script does, through cli.get_addon_module
+ADDON_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ADDON_PATH not in sys.path:
+    sys.path.insert(0, ADDON_PATH)
@@ -0,0 +1,142 @@
+# Copyright Wuguyannian All Rights Reserved.
+"""
+Tests of writing converted bone arrays, with a stand-in for the edit bones collection of an armature.
+"""
+
+from types import SimpleNamespace
+
+import numpy
+
+import cli
+
+adapter = cli.get_addon_module('functions.adapter')
+kernel = cli.get_addon_module('functions.kernel')
+
+
+class FakeEditBone:
+    """
+    This class holds the edit bone settings the adapter reads and writes, with the defaults of a new bone.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.parent = None
+        self.use_connect = False
+        self.head = (0.0, 0.0, 0.0)
+        self.tail = (0.0, 0.0, 1.0)
+        self.roll = 0.0
+        self.layers = [index == 0 for index in range(32)]
+        self.use_deform = True
+        self.use_inherit_rotation = True
+        self.use_local_location = True
+        self.inherit_scale = 'FULL'
+        self.bbone_segments = 1
+        self.bbone_easein = 1.0
+        self.bbone_easeout = 1.0
+
+
+class FakeEditBones(list):
+    """
+    This class is a stand-in for the edit bones collection, with bulk access that works like foreach_get and
+    foreach_set on flat arrays.
+    """
+
+    def new(self, name):
+        bone = FakeEditBone(name)
+        self.append(bone)
+        return bone
+
+    def foreach_get(self, name, values):
+        values[:] = numpy.ravel([getattr(bone, name) for bone in self])
+
+    def foreach_set(self, name, values):
+        rows = numpy.reshape(values, (len(self), -1))
+        for bone, row in zip(self, rows):
+            value = row.tolist()
+            setattr(bone, name, value if len(value) > 1 or name == 'layers' else value[0])
+
+
+def create_edit_bones():
+    """
+    This function creates an arm of two bones, the hand having settings that differ from the new bone defaults.
+
+    :return tuple: The edit bones and their bone arrays.
+    """
+    edit_bones = FakeEditBones()
+    arm = edit_bones.new('arm')
+    hand = edit_bones.new('hand')
+    hand.parent = arm
+    hand.use_deform = False
+    hand.use_local_location = False
+    hand.inherit_scale = 'NONE'
+    hand.bbone_segments = 4
+    hand.bbone_easein = 0.5
+    hand.layers = [index == 3 for index in range(32)]
+
+    bone_arrays = kernel.BoneArrays(
+        names=['arm', 'hand'],
+        heads=numpy.array([[0.0, 0.0, 0.0], [0.0, 0.0, 1.0]]),
+        tails=numpy.array([[0.0, 0.0, 1.0], [0.0, 0.0, 2.0]]),
+        rolls=numpy.zeros(2),
+        parents=numpy.array([-1, 0]),
+        connected=numpy.array([False, True])
+    )
+    return edit_bones, bone_arrays
+
+
+def get_creation(name, source_bone=None, parent_bone=None):
+    """
+    This function creates a compiled creation rule with only a source and a parent bone.
+    """
+    return SimpleNamespace(
+        name=name, source_bone=source_bone, parent_bone=parent_bone, parent_root=False, head=None, tail=None,
+        matrix=None, end_bone=None, fraction=None, length=None
+    )
+
+
+def write(edit_bones, bone_arrays, creations):
+    """
+    This function converts the bone arrays with the creation rules and writes them to the edit bones.
+    """
+    converted_arrays = kernel.apply_creation_rules(bone_arrays, adapter.get_kernel_creations(creations))
+    return adapter.write_bone_arrays(edit_bones, converted_arrays, creations)
+
+
+def assert_copied_settings(bone, source_bone):
+    for name in ('layers', 'use_deform', 'use_inherit_rotation', 'use_local_location', 'inherit_scale', 'bbone_segments'):
+        assert getattr(bone, name) == getattr(source_bone, name), name
+    assert abs(bone.bbone_easein - source_bone.bbone_easein) < 1e-6
+
+
+def test_created_bone_copies_its_source_bone():
+    edit_bones, bone_arrays = create_edit_bones()
+    created_bone_names = write(edit_bones, bone_arrays, (get_creation('ik_hand', 'hand', 'arm'),))
+
+    bones = {bone.name: bone for bone in edit_bones}
+    assert created_bone_names == ['ik_hand']
+    assert bones['ik_hand'].parent is bones['arm']
+    assert_copied_settings(bones['ik_hand'], bones['hand'])
+    numpy.testing.assert_allclose(bones['ik_hand'].head, bones['hand'].head)
+
+
+def test_chained_source_copies_the_settings_its_source_copied():
+    edit_bones, bone_arrays = create_edit_bones()
+    creations = (
+        get_creation('twist_01', 'hand', 'hand'),
+        get_creation('twist_02', 'twist_01', 'hand'),
+        get_creation('twist_03', 'twist_02', 'hand')
+    )
+    write(edit_bones, bone_arrays, creations)
+
+    bones = {bone.name: bone for bone in edit_bones}
+    for name in ('twist_01', 'twist_02', 'twist_03'):
+        assert_copied_settings(bones[name], bones['hand'])
+        assert bones[name].parent is bones['hand']
+
+
+def test_chained_source_without_a_source_keeps_the_defaults():
+    edit_bones, bone_arrays = create_edit_bones()
+    write(edit_bones, bone_arrays, (get_creation('root'), get_creation('root_child', 'root')))
+
+    bones = {bone.name: bone for bone in edit_bones}
+    assert_copied_settings(bones['root_child'], FakeEditBone('default'))
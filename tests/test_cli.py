@@ -0,0 +1,175 @@
+# Copyright Wuguyannian All Rights Reserved.
+"""
+Smoke runs of the command line in background Blender processes. They are skipped when no Blender executable is
+found on the path or in the BLENDER environment variable.
+"""
+
+import os
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from conftest import ADDON_PATH
+
+BLENDER = os.environ.get('BLENDER') or shutil.which('blender')
+CLI_PATH = os.path.join(ADDON_PATH, 'cli.py')
+
+CREATE_ARMATURE_SCRIPT = '''
+import sys
+import bpy
+bpy.ops.object.armature_add()
+obj = bpy.context.object
+obj.name = 'SK_Test'
+bpy.ops.object.mode_set(mode='EDIT')
+child = obj.data.edit_bones.new('Child')
+child.head = (0.0, 0.0, 1.0)
+child.tail = (0.0, 0.0, 2.0)
+child.parent = obj.data.edit_bones['Bone']
+bpy.ops.object.mode_set(mode='OBJECT')
+bpy.ops.wm.save_as_mainfile(filepath=sys.argv[-1])
+'''
+
+COUNT_RECORDS_SCRIPT = '''
+import bpy
+print('RECORDS', len([armature for armature in bpy.data.armatures if 'ueskeleton_conversion' in armature]))
+'''
+
+# keys a rotation of the child bone, converts and exports the armature and prints how far the pose moved
+EXPORT_ANIMATION_SCRIPT = '''
+import sys
+import bpy
+sys.path.insert(0, sys.argv[-3])
+import cli
+cli.register_properties()
+fbx_export = cli.get_addon_module('functions.fbx_export')
+
+obj = bpy.data.objects['SK_Test']
+pose_bone = obj.pose.bones['Child']
+pose_bone.rotation_mode = 'XYZ'
+pose_bone.rotation_euler = (0.3, 0.2, -0.4)
+pose_bone.keyframe_insert('rotation_euler', frame=1)
+bpy.context.scene.frame_set(1)
+before = obj.pose.bones['Child'].matrix.copy()
+
+fbx_export.export_open_file('SK_*', sys.argv[-1], {}, sys.argv[-2], True, None)
+bpy.context.scene.frame_set(1)
+after = obj.pose.bones['Child'].matrix
+print('POSE_DIFFERENCE', max(abs(a - b) for row_a, row_b in zip(before, after) for a, b in zip(row_a, row_b)))
+'''
+
+# stops a conversion session after its actions were re-baked and prints how far the rest and the pose moved
+CANCEL_SESSION_SCRIPT = '''
+import sys
+import bpy
+sys.path.insert(0, sys.argv[-2])
+import cli
+cli.register_properties()
+scene = cli.get_addon_module('functions.scene')
+templates = cli.get_addon_module('functions.templates')
+
+obj = bpy.data.objects['SK_Test']
+pose_bone = obj.pose.bones['Child']
+pose_bone.rotation_mode = 'XYZ'
+pose_bone.rotation_euler = (0.3, 0.2, -0.4)
+pose_bone.keyframe_insert('rotation_euler', frame=1)
+bpy.context.scene.frame_set(1)
+rest_before = [bone.matrix_local.copy() for bone in obj.data.bones]
+pose_before = pose_bone.matrix.copy()
+
+session = scene.ConversionSession(obj, templates.get_compiled_template(sys.argv[-1]), True)
+while session.stage != 'rename':
+    session.step(1.0)
+session.cancel()
+
+bpy.context.scene.frame_set(1)
+matrices = list(zip(rest_before, [bone.matrix_local for bone in obj.data.bones])) + [(pose_before, pose_bone.matrix)]
+print('BONES', ','.join(bone.name for bone in obj.data.bones))
+print('DIFFERENCE', max(abs(a - b) for before, after in matrices for row_a, row_b in zip(before, after) for a, b in zip(row_a, row_b)))
+'''
+
+pytestmark = pytest.mark.skipif(not BLENDER, reason='needs a Blender executable')
+
+
+def run_blender(*arguments):
+    """
+    This function runs Blender in the background with factory settings.
+
+    :param str arguments: The command line arguments after the factory settings.
+    :return str: The output of Blender.
+    """
+    completed = subprocess.run(
+        [BLENDER, '--background', '--factory-startup'] + list(arguments),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+        timeout=300
+    )
+    assert completed.returncode == 0, completed.stdout
+    return completed.stdout
+
+
+@pytest.fixture
+def library(tmp_path):
+    """
+    This fixture writes a blend file with a small armature and a template that converts it.
+    """
+    blend_folder = tmp_path / 'files'
+    blend_folder.mkdir()
+    run_blender('--python-expr', CREATE_ARMATURE_SCRIPT, '--', str(blend_folder / 'character.blend'))
+
+    template_folder = tmp_path / 'templates' / 'tiny'
+    template_folder.mkdir(parents=True)
+    (template_folder / 'orientation.json').write_text(json.dumps([{'name': 'Child', 'axis': 'x', 'angle': 90}]))
+    (template_folder / 'creation.json').write_text(json.dumps([{'name': 'ik_child', 'source_bone': 'Child', 'parent_root': True}]))
+    return tmp_path
+
+
+def test_convert_records_the_conversion(library):
+    report_path = library / 'report.json'
+    run_blender(
+        '--python', CLI_PATH, '--', 'convert', str(library / 'files'), '--template', 'tiny',
+        '--templates-path', str(library / 'templates'), '--workers', '1', '--output-dir', str(library / 'converted'),
+        '--report', str(report_path)
+    )
+
+    report = json.loads(report_path.read_text())
+    assert report['succeeded'] == 1, report['failures']
+    output = run_blender(str(library / 'converted' / 'character.blend'), '--python-expr', COUNT_RECORDS_SCRIPT)
+    assert 'RECORDS 1' in output
+
+
+def test_export_converts_with_a_template(library):
+    report_path = library / 'report.json'
+    run_blender(
+        '--python', CLI_PATH, '--', 'export', str(library / 'files'), '--template', 'tiny',
+        '--templates-path', str(library / 'templates'), '--workers', '1', '--output-dir', str(library / 'fbx'),
+        '--report', str(report_path)
+    )
+
+    report = json.loads(report_path.read_text())
+    assert report['succeeded'] == 1, report['failures']
+    assert list((library / 'fbx').rglob('SK_Test.fbx'))
+
+
+def test_export_with_a_template_rebakes_the_actions(library):
+    output = run_blender(
+        str(library / 'files' / 'character.blend'), '--python-expr', EXPORT_ANIMATION_SCRIPT, '--',
+        ADDON_PATH, str(library / 'templates' / 'tiny'), str(library / 'fbx')
+    )
+
+    difference = float(output.split('POSE_DIFFERENCE ')[1].split()[0])
+    assert difference < 1e-4
+    assert list((library / 'fbx').rglob('SK_Test.fbx'))
+
+
+def test_cancelled_session_rolls_the_armature_back(library):
+    output = run_blender(
+        str(library / 'files' / 'character.blend'), '--python-expr', CANCEL_SESSION_SCRIPT, '--',
+        ADDON_PATH, str(library / 'templates' / 'tiny')
+    )
+
+    assert 'BONES Bone,Child\n' in output
+    difference = float(output.split('DIFFERENCE ')[1].split()[0])
+    assert difference < 1e-4
@@ -0,0 +1,245 @@
+# Copyright Wuguyannian All Rights Reserved.
+"""
+Tests of the conversion kernel, which only needs NumPy.
+"""
+
+import numpy
+
+import cli
+
+kernel = cli.get_addon_module('functions.kernel')
+
+
+def create_bone_arrays(bone_count=12, seed=0):
+    """
+    This function creates the rest data of a random chain of bones, with every other bone connected to its parent.
+
+    :param int bone_count: The number of bones.
+    :param int seed: The seed of the random generator.
+    :return BoneArrays: The rest data.
+    """
+    generator = numpy.random.default_rng(seed)
+    parents = numpy.arange(-1, bone_count - 1)
+    connected = numpy.arange(bone_count) % 2 == 1
+    heads = generator.normal(size=(bone_count, 3))
+    tails = heads + generator.normal(size=(bone_count, 3))
+    for index in range(1, bone_count):
+        if connected[index]:
+            heads[index] = tails[index - 1]
+            tails[index] = heads[index] + generator.normal(size=3)
+
+    return kernel.BoneArrays(
+        names=['bone_{:02d}'.format(index) for index in range(bone_count)],
+        heads=heads,
+        tails=tails,
+        rolls=generator.uniform(-numpy.pi, numpy.pi, bone_count),
+        parents=parents,
+        connected=connected
+    )
+
+
+def create_tree_arrays(seed=0):
+    """
+    This function creates the rest data of a random tree of bones four levels deep, where every bone has up to three
+    children and most of them are connected to their parent.
+
+    :param int seed: The seed of the random generator.
+    :return BoneArrays: The rest data.
+    """
+    generator = numpy.random.default_rng(seed)
+    parents = [-1]
+    for index in range(1, 40):
+        candidates = [parent for parent in range(index) if parents.count(parent) < 3]
+        parents.append(candidates[generator.integers(min(len(candidates), 6))])
+
+    count = len(parents)
+    connected = generator.random(count) < 0.7
+    connected[0] = False
+    heads = numpy.zeros((count, 3))
+    tails = numpy.zeros((count, 3))
+    for index, parent in enumerate(parents):
+        heads[index] = tails[parent] if connected[index] else heads[parent] + generator.normal(size=3)
+        tails[index] = heads[index] + generator.normal(size=3)
+
+    return kernel.BoneArrays(
+        names=['bone_{:02d}'.format(index) for index in range(count)],
+        heads=heads,
+        tails=tails,
+        rolls=generator.uniform(-numpy.pi, numpy.pi, count),
+        parents=numpy.array(parents),
+        connected=connected
+    )
+
+
+def get_reference_axes(vector, roll):
+    """
+    This function computes the axes of one bone the way blender does, as the columns of a matrix.
+    """
+    x, y, z = vector / numpy.linalg.norm(vector)
+    theta = 1.0 + y
+    theta_alt = x * x + z * z
+    if theta > kernel.SAFE_THRESHOLD or theta_alt > kernel.CRITICAL_THRESHOLD ** 2:
+        if theta <= kernel.SAFE_THRESHOLD:
+            theta = theta_alt * 0.5 + theta_alt * theta_alt * 0.125
+        bone_matrix = numpy.array([
+            [1.0 - x * x / theta, x, -x * z / theta],
+            [-x, y, -z],
+            [-x * z / theta, z, 1.0 - z * z / theta]
+        ])
+    else:
+        bone_matrix = numpy.diag([-1.0, -1.0, 1.0])
+    return numpy.dot(get_reference_rotation(numpy.array([x, y, z]), roll), bone_matrix)
+
+
+def get_reference_rotation(axis, angle):
+    """
+    This function builds the rotation matrix around a normalized axis, like a mathutils quaternion rotates.
+    """
+    cross = numpy.array([[0.0, -axis[2], axis[1]], [axis[2], 0.0, -axis[0]], [-axis[1], axis[0], 0.0]])
+    return numpy.eye(3) + numpy.sin(angle) * cross + (1.0 - numpy.cos(angle)) * numpy.dot(cross, cross)
+
+
+def rotate_reference_bone(bone_arrays, children, index, axis, angle, recursive):
+    """
+    This function is a port of utilities.rotate_bone. The quaternion normalizes the rotation axis, setting the tail
+    of an edit bone moves the heads of its connected children onto it, then the children are rotated one at a time.
+    """
+    heads, tails, rolls = bone_arrays.heads, bone_arrays.tails, bone_arrays.rolls
+    rotation_axis = get_reference_axes(tails[index] - heads[index], rolls[index])[:, axis]
+    rotation_axis = rotation_axis / numpy.linalg.norm(rotation_axis)
+    tails[index] = heads[index] + numpy.dot(get_reference_rotation(rotation_axis, angle), tails[index] - heads[index])
+    for child in children[index]:
+        if bone_arrays.connected[child]:
+            heads[child] = tails[index]
+
+    if recursive > 0:
+        for child in children[index]:
+            rotate_reference_bone(bone_arrays, children, child, axis, angle, recursive - 1)
+
+
+def get_creation(name, source_bone=None, parent_bone=None, end_bone=None, fraction=None, length=None):
+    """
+    This function creates a kernel creation rule without a head, tail or matrix.
+    """
+    return (name, source_bone, parent_bone, False, None, None, None, end_bone, fraction, length)
+
+
+def test_matrix_round_trip_keeps_the_direction_and_roll():
+    generator = numpy.random.default_rng(1)
+    vectors = generator.normal(size=(200, 3))
+    # bones along the negative y axis take the branch blender uses for precision
+    vectors[:3] = [[0.0, -1.0, 0.0], [3e-3, -1.0, 0.0], [0.0, -1.0, 5e-3]]
+    rolls = generator.uniform(-numpy.pi, numpy.pi, len(vectors))
+
+    # close to the negative y axis blender approximates theta, so the results there are only nearly exact
+    matrices = kernel.vec_roll_to_mat3(vectors, rolls)
+    identities = numpy.matmul(matrices, numpy.transpose(matrices, (0, 2, 1)))
+    numpy.testing.assert_allclose(identities, numpy.broadcast_to(numpy.eye(3), identities.shape), atol=1e-4)
+
+    result_vectors, result_rolls = kernel.mat3_to_vec_roll(matrices)
+    numpy.testing.assert_allclose(result_vectors, kernel.normalize(vectors), atol=1e-9)
+    numpy.testing.assert_allclose(kernel.vec_roll_to_mat3(result_vectors, result_rolls), matrices, atol=1e-4)
+
+    # the roll of a bone along the negative y axis is only defined up to the flip, so only the others are compared
+    roll_differences = numpy.angle(numpy.exp(1j * (result_rolls[1:] - rolls[1:])))
+    numpy.testing.assert_allclose(roll_differences, 0.0, atol=1e-4)
+
+
+def test_orientation_rules_match_the_per_bone_rotation():
+    bone_arrays = create_tree_arrays()
+    orientations = (
+        ('bone_00', 0, numpy.radians(90.0), 3, None),
+        ('bone_01', 2, numpy.radians(-45.0), 0, numpy.radians(30.0)),
+        ('bone_03', 1, numpy.radians(120.0), 10, None),
+        ('bone_00', 2, numpy.radians(15.0), 1, numpy.radians(-90.0)),
+        ('bone_07', 0, numpy.radians(-60.0), 2, None)
+    )
+
+    converted = kernel.copy_bone_arrays(bone_arrays)
+    hierarchy = kernel.build_hierarchy_index(converted.names, converted.parents)
+    kernel.apply_orientation_rules(
+        converted.heads,
+        converted.tails,
+        converted.rolls,
+        converted.connected,
+        hierarchy,
+        kernel.resolve_orientation_rules(hierarchy, orientations)
+    )
+
+    reference = kernel.copy_bone_arrays(bone_arrays)
+    children = [[child for child, parent in enumerate(reference.parents) if parent == index] for index in range(len(reference.names))]
+    for name, axis, angle, recursive, roll_add in orientations:
+        index = reference.names.index(name)
+        if roll_add is not None:
+            reference.rolls[index] += roll_add
+        rotate_reference_bone(reference, children, index, axis, angle, recursive)
+
+    numpy.testing.assert_allclose(converted.heads, reference.heads, atol=1e-9)
+    numpy.testing.assert_allclose(converted.tails, reference.tails, atol=1e-9)
+    numpy.testing.assert_allclose(converted.rolls, reference.rolls, atol=1e-12)
+    assert not numpy.allclose(converted.tails, bone_arrays.tails)
+
+
+def test_creation_rules_copy_the_source_and_set_the_parent():
+    bone_arrays = create_bone_arrays()
+    created = kernel.apply_creation_rules(bone_arrays, (
+        get_creation('ik_foot', 'bone_05', 'bone_00'),
+        get_creation('ik_foot_target', 'ik_foot', parent_bone='ik_foot'),
+        get_creation('root_target', parent_bone=None)
+    ))
+
+    assert created.names == bone_arrays.names + ['ik_foot', 'ik_foot_target', 'root_target']
+    for index in (12, 13):
+        numpy.testing.assert_allclose(created.heads[index], bone_arrays.heads[5])
+        numpy.testing.assert_allclose(created.tails[index], bone_arrays.tails[5])
+        assert created.rolls[index] == bone_arrays.rolls[5]
+    assert list(created.parents[12:]) == [0, 12, -1]
+    numpy.testing.assert_allclose(created.heads[:12], bone_arrays.heads)
+
+
+def test_creation_rules_place_bones_between_the_source_and_end_bone():
+    bone_arrays = create_bone_arrays()
+    count = 3
+    created = kernel.apply_creation_rules(bone_arrays, tuple(
+        get_creation('twist_{:02d}'.format(index), 'bone_02', 'bone_02', 'bone_03', index / (count + 1), 1 / (count + 1))
+        for index in range(1, count + 1)
+    ))
+
+    span = bone_arrays.heads[3] - bone_arrays.heads[2]
+    for index in range(1, count + 1):
+        position = len(bone_arrays.names) + index - 1
+        numpy.testing.assert_allclose(created.heads[position], bone_arrays.heads[2] + span * index / (count + 1))
+        numpy.testing.assert_allclose(created.tails[position] - created.heads[position], span / (count + 1))
+        assert created.parents[position] == 2
+        assert not created.connected[position]
+
+
+def test_creation_matrix_keeps_the_length_of_a_bone_between_the_source_and_end_bone():
+    bone_arrays = create_bone_arrays()
+    matrix = numpy.eye(4)
+    matrix[:3, 3] = (1.0, 2.0, 3.0)
+    created = kernel.apply_creation_rules(bone_arrays, (
+        ('twist_01', 'bone_02', 'bone_02', False, None, None, matrix, 'bone_03', 0.5, 0.25),
+    ))
+
+    span_length = numpy.linalg.norm(bone_arrays.heads[3] - bone_arrays.heads[2])
+    numpy.testing.assert_allclose(created.heads[-1], (1.0, 2.0, 3.0))
+    numpy.testing.assert_allclose(created.tails[-1], created.heads[-1] + (0.0, span_length * 0.25, 0.0))
+
+
+def test_convert_many_matches_in_process_and_in_a_pool():
+    bone_arrays_list = [create_bone_arrays(seed=seed) for seed in range(3)]
+    plan = kernel.KernelPlan(
+        orientations=(('bone_01', 0, numpy.pi / 2, 3, None), ('bone_06', 2, -numpy.pi / 4, 0, 0.5)),
+        creations=(get_creation('ik_hand', 'bone_08', 'bone_00'),)
+    )
+
+    serial = kernel.convert_many(bone_arrays_list, [plan] * len(bone_arrays_list), max_workers=1)
+    pool = kernel.convert_many(bone_arrays_list, [plan] * len(bone_arrays_list), max_workers=2)
+
+    assert len(serial) == len(pool) == len(bone_arrays_list)
+    for bone_arrays, serial_arrays, pool_arrays in zip(bone_arrays_list, serial, pool):
+        assert serial_arrays.names == pool_arrays.names == bone_arrays.names + ['ik_hand']
+        for field in ('heads', 'tails', 'rolls', 'parents', 'connected'):
+            numpy.testing.assert_array_equal(getattr(serial_arrays, field), getattr(pool_arrays, field))
+        assert not numpy.allclose(serial_arrays.heads[:len(bone_arrays.names)], bone_arrays.heads)
@@ -1,6 +1,29 @@
 # Copyright Wuguyannian All Rights Reserved.
 
 import bpy
+from ..functions import handlers
+from ..functions import profiling
+from ..settings import tool_tips
+
+
+def profiling_update(self=None, context=None):
+    """
+    This function is called every time profiling is turned on or off in the addon preferences.
+
+    :param object self: This is a reference to the class this functions in appended to.
+    :param object context: The context of the object this function is appended to.
+    """
+    profiling.set_enabled(self.enable_profiling)
+
+
+def template_repository_update(self=None, context=None):
+    """
+    This function is called every time the template repository is changed in the addon preferences.
+
+    :param object self: This is a reference to the class this functions in appended to.
+    :param object context: The context of the object this function is appended to.
+    """
+    handlers.restart_template_repository_refresh()
 
 
 class UESkeletonAddonPreferences(bpy.types.AddonPreferences):
@@ -9,6 +32,50 @@ class UESkeletonAddonPreferences(bpy.types.AddonPreferences):
     """
     bl_idname = __package__.split('.')[0]
 
+    enable_profiling: bpy.props.BoolProperty(
+        name="Profile Conversions",
+        description=tool_tips.enable_profiling_tool_tip,
+        default=False,
+        update=profiling_update
+    )
+
+    use_conversion_cache: bpy.props.BoolProperty(
+        name="Cache Conversions",
+        description=tool_tips.use_conversion_cache_tool_tip,
+        default=True
+    )
+
+    conversion_cache_size: bpy.props.IntProperty(
+        name="Cache Size (MB)",
+        description=tool_tips.conversion_cache_size_tool_tip,
+        default=64,
+        min=1,
+        max=4096
+    )
+
+    template_repository: bpy.props.StringProperty(
+        name="Template Repository",
+        description=tool_tips.template_repository_tool_tip,
+        default='',
+        update=template_repository_update
+    )
+
+    template_repository_cache_size: bpy.props.IntProperty(
+        name="Repository Cache Size (MB)",
+        description=tool_tips.template_repository_cache_size_tool_tip,
+        default=64,
+        min=1,
+        max=4096
+    )
+
+    profiling_top_count: bpy.props.IntProperty(
+        name="Top Entries",
+        description=tool_tips.profiling_top_count_tool_tip,
+        default=5,
+        min=1,
+        max=50
+    )
+
     def draw(self, context):
         """
         This function overrides the draw method in the AddonPreferences class. The draw method is the function
@@ -21,3 +88,21 @@ class UESkeletonAddonPreferences(bpy.types.AddonPreferences):
         row = layout.row()
         row.operator('ueskeleton.import_skeleton_template', icon='IMPORT')
         row.operator('ueskeleton.export_skeleton_template', icon='EXPORT')
+
+        row = layout.row()
+        row.prop(self, 'template_repository')
+        row.prop(self, 'template_repository_cache_size')
+        row.operator('ueskeleton.refresh_template_repository', icon='FILE_REFRESH')
+
+        row = layout.row()
+        row.prop(self, 'use_conversion_cache')
+        row.prop(self, 'conversion_cache_size')
+        row.operator('ueskeleton.clear_conversion_cache', icon='TRASH')
+
+        row = layout.row()
+        row.prop(self, 'enable_profiling')
+        row.prop(self, 'profiling_top_count')
+        row = layout.row()
+        row.enabled = self.enable_profiling
+        row.operator('ueskeleton.dump_profile', icon='FILE_TICK')
+        row.operator('ueskeleton.clear_profile', icon='TRASH')
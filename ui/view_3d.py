@@ -1,8 +1,13 @@
 # Copyright Wuguyannian All Rights Reserved.
 
 import bpy
+from ..functions import handlers
+from ..functions import profiling
 from ..functions import utilities
 
+MISSING_BONE_NAME_COUNT = 5
+SCAN_RESULT_COUNT = 20
+
 class UE_SKELETON_PT_Panel(bpy.types.Panel):
     """
     This class defines the user interface for the panel in the tab in the 3d view
@@ -21,36 +26,31 @@ class UE_SKELETON_PT_Panel(bpy.types.Panel):
         """
 
         properties = bpy.context.window_manager.ueskeleton
-
-        # set source skeleton name to the object picker
-        object_picker = utilities.get_picker_object().constraints[0]
-        if object_picker.target:
-            if properties.source_skeleton_name != object_picker.target.name:
-                properties.source_skeleton_name = object_picker.target.name
-        else:
-            if properties.source_skeleton_name != '':
-                properties.source_skeleton_name = ''
+        state = handlers.get_panel_state()
 
         layout = self.layout
 
-        # source skeleton selector
+        # source skeleton selector, the picker object is created by the handlers outside of draw
         box = layout.box()
         row = box.row()
         row = row.split(factor=0.90, align=True)
-        row.prop(object_picker, 'target', text='Source')
+        picker_object = bpy.data.objects.get(properties.picker_name)
+        if picker_object and picker_object.constraints:
+            row.prop(picker_object.constraints[0], 'target', text='Source')
+        else:
+            row.label(text='Source')
 
          # enable the layout if an armature is selected
-        validate_results = utilities.validate_source_skeleton_object(properties)
         layout = layout.column()
-        layout.enabled = validate_results[0]
+        layout.enabled = state['is_armature']
 
-        if validate_results[1] and not layout.enabled:
+        if state['is_object_selected'] and not layout.enabled:
             row = layout.row()
             row.alert = True
             row.label(text= 'It is not a skeleton object!')
 
          # apply the root rotation
-        if layout.enabled and not utilities.validate_source_skeleton_rotation(properties):
+        if layout.enabled and not state['is_rotation_applied']:
             row = layout.row()
             row.alert = True
             row.label(text= 'needed to applay the rotation!')
@@ -66,7 +66,86 @@ class UE_SKELETON_PT_Panel(bpy.types.Panel):
             row.prop(properties, 'selected_skeleton_template', text='')
             row.operator('ueskeleton.remove_template_folder', icon='PANEL_CLOSE')
 
+        # the template that covers the most bones and the bones the selected template is missing
+        template_scores = (state['template_scores'] or []) if layout.enabled else []
+        if template_scores:
+            template_name, coverage, missing_bone_names = template_scores[0]
+            if template_name != properties.selected_skeleton_template:
+                row = layout.row()
+                row.label(text='Suggested: {} ({:.0%})'.format(template_name, coverage), icon='LIGHT')
+                row.operator('ueskeleton.use_template', text='', icon='CHECKMARK').template_name = template_name
+
+            for template_name, coverage, missing_bone_names in template_scores:
+                if template_name == properties.selected_skeleton_template and missing_bone_names:
+                    row = layout.row()
+                    row.alert = True
+                    row.label(text='Missing {} bones: {}'.format(
+                        len(missing_bone_names),
+                        ', '.join(missing_bone_names[:MISSING_BONE_NAME_COUNT]) + ('...' if len(missing_bone_names) > MISSING_BONE_NAME_COUNT else '')
+                    ))
+
+        # generate a template for the source skeleton from the selected template
+        row = layout.split(factor=0.90, align=True)
+        row.prop_search(properties, 'reference_skeleton_name', bpy.data, 'objects', text='', icon='ARMATURE_DATA')
+        row.operator('ueskeleton.generate_template', text='', icon='FILE_NEW')
+
         box = layout.box()
+        if properties.is_converting:
+            row = box.row()
+            row.enabled = False
+            row.prop(properties, 'conversion_progress', slider=True)
+            row = box.row()
+            row.label(text='Press Esc to cancel', icon='INFO')
+        else:
+            from ..functions import history
+
+            source_skeleton_object = bpy.data.objects.get(state['source_skeleton_name'])
+            record = history.get_conversion_record(source_skeleton_object) if state['is_armature'] and source_skeleton_object else None
+            if record:
+                row = box.row()
+                row.label(text='Converted with {} ({} rules)'.format(record.template_name, len(record.orientation_rules)), icon='CHECKMARK')
+                row.operator('ueskeleton.restore_skeleton', text='', icon='LOOP_BACK')
+            row = box.row()
+            row.prop(properties, 'rebake_animation')
+            row = box.row()
+            row.scale_y = 2.0
+            row.operator('ueskeleton.convert_to_epic_skeleton', text='Convert')
+
+        # convert many skeletons at once
+        box = self.layout.box()
+        box.enabled = not properties.is_converting
         row = box.row()
-        row.scale_y = 2.0
-        row.operator('ueskeleton.convert_to_epic_skeleton', text='Convert')
\ No newline at end of file
+        row.label(text='Multiple Skeletons:')
+        row = box.row(align=True)
+        row.prop(properties, 'armature_filter', text='', icon='FILTER')
+        row.operator('ueskeleton.convert_selected_skeletons')
+        for result in properties.context.get('conversion_results', []):
+            row = box.row()
+            row.alert = result['status'] == 'FAILED'
+            row.label(text=result['name'], icon={'FINISHED': 'CHECKMARK', 'FAILED': 'ERROR'}.get(result['status'], 'INFO'))
+            row.label(text=result['message'])
+
+        # the best template for every scanned skeleton
+        box = self.layout.box()
+        row = box.row()
+        row.label(text='Template Compatibility:')
+        row = box.row(align=True)
+        row.operator('ueskeleton.scan_template_compatibility', text='Scan Scene').include_libraries = False
+        row.operator('ueskeleton.scan_template_compatibility', text='Scan Folder').include_libraries = True
+        for result in properties.context.get('compatibility_results', [])[:SCAN_RESULT_COUNT]:
+            row = box.row()
+            row.alert = bool(result['missing_bone_names'])
+            row.label(text=result['name'])
+            row.label(text='{} ({:.0%})'.format(result['template_name'], result['coverage']))
+
+        # the slowest recorded timings
+        if profiling.is_enabled():
+            box = self.layout.box()
+            row = box.row()
+            row.label(text='Profile:', icon='TIME')
+            row.operator('ueskeleton.clear_profile', text='', icon='TRASH')
+            for category, name, seconds, calls in profiling.get_summary(utilities.get_addon_preferences().profiling_top_count):
+                row = box.row()
+                row.label(text='{:.1f} ms'.format(seconds * 1000.0))
+                row.label(text='{} x{}'.format(category, calls))
+                row.label(text=name)
\ No newline at end of file